@@ -0,0 +1,102 @@
+from collections import deque
+import numpy as np
+
+
+# --- Bases planas (flat base) ---
+MIN_CANDLES_BASE = 14
+MAX_CANDLES_BASE = 90
+AMPLITUDE_MAX_BASE = 20.0
+
+
+def _amplitude(maxima, minima):
+    return (maxima - minima) / maxima * 100
+
+
+def detectar_bases_planas(high, low, min_candles=MIN_CANDLES_BASE, max_candles=MAX_CANDLES_BASE,
+                          amplitude_max=AMPLITUDE_MAX_BASE):
+    # Mesmas zonas do laço antigo do plot_ativo (janela [i, j) crescendo até
+    # max_candles, nunca incluindo o último candle, e recomeçando em j + 1 depois
+    # de uma base), mas com máxima/mínima correntes em deques monotônicos:
+    # cada candle entra e sai das filas uma vez, O(n) no total.
+    # Devolve (pos_inicio, pos_fim, resistencia, suporte, duracao) com posições inclusivas.
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    n = len(high)
+
+    zonas = []
+    maximos = deque()
+    minimos = deque()
+    i = j = 0
+
+    def entrar(k):
+        while maximos and high[maximos[-1]] <= high[k]:
+            maximos.pop()
+        maximos.append(k)
+        while minimos and low[minimos[-1]] >= low[k]:
+            minimos.pop()
+        minimos.append(k)
+
+    while i < n - min_candles:
+        if j < i:
+            maximos.clear()
+            minimos.clear()
+            j = i
+        while maximos and maximos[0] < i:
+            maximos.popleft()
+        while minimos and minimos[0] < i:
+            minimos.popleft()
+        while j < i + min_candles:
+            entrar(j)
+            j += 1
+
+        if _amplitude(high[maximos[0]], low[minimos[0]]) > amplitude_max:
+            i += 1
+            continue
+
+        resistencia, suporte = high[maximos[0]], low[minimos[0]]
+        while j + 1 < n and j + 1 - i <= max_candles:
+            entrar(j)
+            if _amplitude(high[maximos[0]], low[minimos[0]]) > amplitude_max:
+                break
+            resistencia, suporte = high[maximos[0]], low[minimos[0]]
+            j += 1
+
+        zonas.append((i, j - 1, resistencia, suporte, j - i))
+        i = j + 1
+
+    return zonas
+
+
+def base_plana_atual(high, low, amplitude_max=AMPLITUDE_MAX_BASE, min_candles=MIN_CANDLES_BASE,
+                     max_candles=MAX_CANDLES_BASE):
+    # Maior base que termina no último candle: a amplitude só cresce voltando no
+    # tempo, então basta acumular máxima/mínima de trás para frente.
+    # Devolve None se o ativo não está numa base de pelo menos min_candles.
+    high = np.asarray(high, dtype=float)[-max_candles:][::-1]
+    low = np.asarray(low, dtype=float)[-max_candles:][::-1]
+    if len(high) < min_candles:
+        return None
+
+    maximas = np.maximum.accumulate(high)
+    minimas = np.minimum.accumulate(low)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dentro = _amplitude(maximas, minimas) <= amplitude_max
+    duracao = len(dentro) if dentro.all() else int(np.argmin(dentro))
+    if duracao < min_candles:
+        return None
+
+    return {
+        "duracao": duracao,
+        "resistencia": maximas[duracao - 1],
+        "suporte": minimas[duracao - 1],
+        "amplitude": _amplitude(maximas[duracao - 1], minimas[duracao - 1]),
+    }
+
+
+__all__ = [
+    "detectar_bases_planas",
+    "base_plana_atual",
+    "MIN_CANDLES_BASE",
+    "MAX_CANDLES_BASE",
+    "AMPLITUDE_MAX_BASE",
+]
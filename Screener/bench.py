@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import pickle
+import statistics
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from . import core
+from .data import COLUNAS_OHLCV, baixar_lote
+from .panel import alinhar_painel, calcular_indicadores_painel, montar_painel
+from .pipeline import filtrar_painel, montar_etapas
+from .rs import score_rs, scores_rs_painel
+from .vcp import sinal_vcp
+
+
+# --- Benchmarks dos caminhos quentes (sem rede) ---
+#   python -m Screener.bench                      # 1, 500 e 5.000 tickers
+#   python -m Screener.bench --salvar base.json   # grava a linha de base
+#   python -m Screener.bench --comparar base.json # falha se algo ficou mais lento
+# A fixture usa OHLCV real de TICKERS_FIXTURE, baixado pelo provedor de dados
+# (Screener.provider). Para gravar uma vez e reproduzir depois sem rede:
+#   SCREENER_PROVEDOR=gravar     SCREENER_PROVEDOR_DIR=bench/gravacoes python -m Screener.bench --tamanhos 1
+#   SCREENER_PROVEDOR=reproduzir SCREENER_PROVEDOR_DIR=bench/gravacoes python -m Screener.bench
+# Os tamanhos maiores repetem os históricos reais com preços reescalados. Sem
+# nenhum histórico real, a fixture é sintética e os resultados saem marcados com
+# essa origem: --comparar não compara origens diferentes.
+DIRETORIO_BENCH = os.environ.get("SCREENER_BENCH_DIR", os.path.join(".cache", "bench"))
+TAMANHOS_PADRAO = (1, 500, 5000)
+BARRAS_18_MESES = 378
+TICKERS_FIXTURE = [
+    "AAPL", "MSFT", "NVDA", "AMZN", "GOOGL", "META", "TSLA", "AVGO", "JPM", "V",
+    "UNH", "XOM", "LLY", "JNJ", "WMT", "MA", "PG", "HD", "COST", "ORCL",
+    "ABBV", "MRK", "CVX", "KO", "PEP", "ADBE", "CRM", "AMD", "NFLX", "TMO",
+    "INTC", "CSCO", "QCOM", "TXN", "AMAT", "MU", "CAT", "DE", "BA", "GE",
+    "NKE", "SBUX", "MCD", "DIS", "PFE", "GS", "MS", "BAC", "PLTR", "SMCI",
+]
+SIMBOLO_BENCHMARK_FIXTURE = "^GSPC"
+# plot_ativo é caro e só roda para os ativos abertos na tela
+LIMITE_PLOT = 20
+TOLERANCIA_PADRAO = 0.25
+# Abaixo disso a diferença é ruído do relógio, não regressão
+FOLGA_SEGUNDOS = 0.002
+
+
+def _serie_sintetica(semente, barras=BARRAS_18_MESES):
+    rng = np.random.default_rng(semente)
+    datas = pd.bdate_range(end="2024-12-31", periods=barras)
+    retornos = rng.normal(0.0005, 0.02, barras)
+    close = 50 * np.exp(np.cumsum(retornos))
+    abertura = close * (1 + rng.normal(0, 0.005, barras))
+    amplitude = np.abs(rng.normal(0, 0.015, barras)) * close
+    high = np.maximum(abertura, close) + amplitude
+    low = np.minimum(abertura, close) - amplitude
+    volume = rng.integers(300_000, 5_000_000, barras).astype(float)
+    return pd.DataFrame({"Open": abertura, "High": high, "Low": low, "Close": close, "Volume": volume},
+                        index=pd.DatetimeIndex(datas, name="Date"))
+
+
+def _historicos_reais():
+    # OHLCV real pelo provedor (ao vivo, gravando ou reproduzindo a gravação)
+    try:
+        baixados = baixar_lote(TICKERS_FIXTURE + [SIMBOLO_BENCHMARK_FIXTURE], period="2y")
+    except Exception as e:
+        print(f"Erro ao obter os históricos reais da fixture: {e}")
+        return {}
+    return {
+        ticker: df[COLUNAS_OHLCV].tail(BARRAS_18_MESES)
+        for ticker, df in baixados.items()
+        if len(df) >= 252 and all(c in df.columns for c in COLUNAS_OHLCV)
+    }
+
+
+def _replicar(historicos, tamanho):
+    # Cópias dos históricos reais com preços reescalados (volume igual) até o tamanho pedido
+    tickers = list(historicos)
+    fixture = {}
+    for i in range(tamanho):
+        ticker = tickers[i % len(tickers)]
+        copia = i // len(tickers)
+        df = historicos[ticker]
+        if copia:
+            df = df.copy()
+            df[["Open", "High", "Low", "Close"]] *= 1 + 0.01 * copia
+            ticker = f"{ticker}_{copia}"
+        fixture[ticker] = df
+    return fixture
+
+
+def carregar_fixture(tamanho):
+    caminho = os.path.join(DIRETORIO_BENCH, f"fixture_real_{tamanho}.pkl")
+    if os.path.exists(caminho):
+        with open(caminho, "rb") as f:
+            return pickle.load(f)
+
+    reais = _historicos_reais()
+    benchmark = reais.pop(SIMBOLO_BENCHMARK_FIXTURE, None)
+    if not reais or benchmark is None:
+        print("Sem OHLCV real para a fixture: usando séries sintéticas (resultados marcados como 'sintetica').")
+        historicos = {f"SINT{i:05d}": _serie_sintetica(i) for i in range(tamanho)}
+        return {"historicos": historicos, "benchmark": _serie_sintetica(10**6), "origem": "sintetica"}
+
+    fixture = {"historicos": _replicar(reais, tamanho), "benchmark": benchmark, "origem": "real"}
+    # Só a fixture real é guardada: a sintética é determinística e não deve
+    # impedir que uma execução com rede (ou gravação) monte a real depois
+    os.makedirs(DIRETORIO_BENCH, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        pickle.dump(fixture, f)
+    os.replace(temporario, caminho)
+    return fixture
+
+
+def _casos(fixture):
+    historicos = fixture["historicos"]
+    rs_ref = score_rs(fixture["benchmark"]["Close"])
+    indicadores = {t: core.calcular_indicadores(df) for t, df in historicos.items()}
+    for df in indicadores.values():
+        df["VCP"] = sinal_vcp(df)
+    painel = calcular_indicadores_painel(montar_painel(historicos))
+    etapas = montar_etapas(ordenamento_mm=True, sma200_crescente=True, sinal="Momentum", mostrar_vcp=True, candles_vcp=20)
+    amostra_plot = list(indicadores.items())[:LIMITE_PLOT]
+    # Sem rede: o plot recebe o financeiro trimestral (vazio) em vez de buscá-lo
+    sem_financeiro = pd.DataFrame()
+
+    # (nome, função, nº de itens processados)
+    return [
+        ("calcular_indicadores", lambda: [core.calcular_indicadores(df) for df in historicos.values()], len(historicos)),
+        ("calcular_indicadores_painel", lambda: calcular_indicadores_painel(montar_painel(historicos)), len(historicos)),
+        ("detectar_vcp", lambda: [core.detectar_vcp(df) for df in indicadores.values()], len(historicos)),
+        ("sinal_vcp (painel)", lambda: sinal_vcp(painel), len(historicos)),
+        ("avaliar_risco", lambda: [core.avaliar_risco(df.copy()) for df in indicadores.values()], len(historicos)),
+        ("calcular_rs_rating", lambda: [core.calcular_rs_rating(df, rs_ref=rs_ref) for df in indicadores.values()], len(historicos)),
+        ("scores_rs_painel", lambda: scores_rs_painel(painel), len(historicos)),
+        ("filtrar_painel", lambda: filtrar_painel(alinhar_painel(montar_painel(historicos)), etapas), len(historicos)),
+        ("plot_ativo", lambda: [core.plot_ativo(df, t, t, True, sem_financeiro) for t, df in amostra_plot],
+         len(amostra_plot)),
+    ]
+
+
+def medir(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    # Memória numa execução à parte: o tracemalloc distorce o tempo
+    tracemalloc.start()
+    try:
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(tempos), pico
+
+
+def rodar(tamanhos=TAMANHOS_PADRAO, filtro=None, informar=print):
+    resultados = []
+    for tamanho in tamanhos:
+        fixture = carregar_fixture(tamanho)
+        casos = _casos(fixture)
+        repeticoes = max(1, min(5, 500 // tamanho))
+        for nome, funcao, itens in casos:
+            if filtro and filtro not in nome:
+                continue
+            segundos, pico = medir(funcao, repeticoes)
+            resultado = {
+                "caso": nome,
+                "tamanho": tamanho,
+                "origem": fixture["origem"],
+                "segundos": segundos,
+                "ms_por_item": segundos * 1000 / max(itens, 1),
+                "pico_mb": pico / 1024 ** 2,
+            }
+            resultados.append(resultado)
+            informar(f"{nome:<30} {tamanho:>6} {segundos:>10.4f}s {resultado['ms_por_item']:>10.3f} ms/item {resultado['pico_mb']:>9.1f} MB")
+    return resultados
+
+
+def comparar(resultados, linha_de_base, tolerancia=TOLERANCIA_PADRAO, informar=print):
+    # Devolve as regressões: casos mais lentos que a linha de base além da tolerância
+    base = {(r["caso"], r["tamanho"]): r for r in linha_de_base}
+    regressoes = []
+    for r in resultados:
+        anterior = base.get((r["caso"], r["tamanho"]))
+        if anterior is None or not anterior["segundos"]:
+            continue
+        if anterior.get("origem") != r["origem"]:
+            informar(f"{r['caso']:<30} {r['tamanho']:>6} fixture {r['origem']} x linha de base {anterior.get('origem')}: não comparado")
+            continue
+        razao = r["segundos"] / anterior["segundos"]
+        regrediu = razao > 1 + tolerancia and r["segundos"] - anterior["segundos"] > FOLGA_SEGUNDOS
+        marca = "  <-- REGRESSÃO" if regrediu else ""
+        informar(f"{r['caso']:<30} {r['tamanho']:>6} {anterior['segundos']:>10.4f}s -> {r['segundos']:>10.4f}s ({razao:.2f}x){marca}")
+        if marca:
+            regressoes.append({**r, "razao": razao})
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Screener.bench", description="Benchmarks dos indicadores e do scan.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=list(TAMANHOS_PADRAO))
+    parser.add_argument("--caso", help="roda só os casos cujo nome contém este texto")
+    parser.add_argument("--salvar", help="grava os resultados (JSON) como linha de base")
+    parser.add_argument("--comparar", help="linha de base (JSON) para comparar")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    args = parser.parse_args(argv)
+
+    resultados = rodar(args.tamanhos, args.caso)
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            linha_de_base = json.load(f)
+        print()
+        if comparar(resultados, linha_de_base, args.tolerancia):
+            return 1
+    return 0
+
+
+__all__ = [
+    "carregar_fixture",
+    "medir",
+    "rodar",
+    "comparar",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
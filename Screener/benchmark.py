@@ -0,0 +1,125 @@
+import threading
+import numpy as np
+import pandas as pd
+from .data import carregar_historico
+
+
+# --- Benchmarks compartilhados pelo processo ---
+BENCHMARKS = {
+    "S&P 500": "^GSPC",
+    "Nasdaq 100": "^NDX",
+    "Nasdaq Composite": "^IXIC",
+    "Russell 2000": "^RUT",
+    "Dow Jones": "^DJI",
+    "Tecnologia (XLK)": "XLK",
+    "Financeiro (XLF)": "XLF",
+    "Saúde (XLV)": "XLV",
+    "Energia (XLE)": "XLE",
+    "Industrial (XLI)": "XLI",
+    "Consumo Discricionário (XLY)": "XLY",
+    "Consumo Básico (XLP)": "XLP",
+    "Materiais (XLB)": "XLB",
+    "Utilidades (XLU)": "XLU",
+    "Imobiliário (XLRE)": "XLRE",
+    "Comunicação (XLC)": "XLC",
+    "Semicondutores (SMH)": "SMH",
+}
+BENCHMARK_PADRAO = "S&P 500"
+JANELAS_RS = [63, 126, 189, 252]
+FUSO_MERCADO = "America/New_York"
+HORA_FECHAMENTO = pd.Timedelta(hours=16, minutes=15)
+
+# Depois de uma busca que falhou, espera este tempo antes de tentar de novo
+ESPERA_APOS_FALHA_SEG = 60
+
+_benchmarks = {}
+_falhas = {}
+_trava = threading.Lock()
+_travas_por_simbolo = {}
+
+
+def _perf(close, dias):
+    if len(close) > dias:
+        return close.iloc[-1] / close.iloc[-dias]
+    return np.nan
+
+
+def _precisa_atualizar(entrada, agora):
+    if entrada is None:
+        return True
+    carregado_em = entrada["carregado_em"]
+    if carregado_em.date() != agora.date():
+        return True
+    # Carregado durante o pregão: busca de novo uma vez depois do fechamento
+    fechamento = agora.normalize() + HORA_FECHAMENTO
+    return carregado_em < fechamento <= agora
+
+
+def _vigente(simbolo, agora):
+    # (entrada atual, se ainda vale ou se a última busca falhou há pouco); chamar com _trava
+    entrada = _benchmarks.get(simbolo)
+    falhou_em = _falhas.get(simbolo)
+    recente = falhou_em is not None and (agora - falhou_em).total_seconds() < ESPERA_APOS_FALHA_SEG
+    return entrada, recente or not _precisa_atualizar(entrada, agora)
+
+
+def obter_benchmark(simbolo=BENCHMARKS[BENCHMARK_PADRAO]):
+    agora = pd.Timestamp.now(tz=FUSO_MERCADO)
+    with _trava:
+        entrada, vale = _vigente(simbolo, agora)
+        if vale:
+            return entrada
+        trava_simbolo = _travas_por_simbolo.setdefault(simbolo, threading.Lock())
+
+    # A busca roda fora da trava global: uma só por símbolo, e quem já tem um
+    # benchmark anterior usa ele enquanto outra sessão atualiza
+    if not trava_simbolo.acquire(blocking=entrada is None):
+        return entrada
+    try:
+        with _trava:
+            entrada, vale = _vigente(simbolo, agora)
+        if vale:
+            return entrada
+
+        try:
+            df = carregar_historico([simbolo], validade_seg=0).get(simbolo)
+        except Exception as e:
+            print(f"Erro ao buscar o benchmark {simbolo}: {e}")
+            df = None
+        if df is None or df.empty:
+            # Mantém o último benchmark bom se o Yahoo falhar
+            with _trava:
+                _falhas[simbolo] = agora
+            return entrada
+
+        df = df.sort_index()
+        perf = {dias: _perf(df["Close"], dias) for dias in JANELAS_RS}
+        rs_ref = np.nan
+        if not any(np.isnan(list(perf.values()))):
+            rs_ref = 0.4 * perf[63] + 0.2 * perf[126] + 0.2 * perf[189] + 0.2 * perf[252]
+
+        entrada = {
+            "simbolo": simbolo,
+            "df": df,
+            "perf": perf,
+            "rs_ref": rs_ref,
+            "carregado_em": agora,
+        }
+        with _trava:
+            _benchmarks[simbolo] = entrada
+            _falhas.pop(simbolo, None)
+        return entrada
+    finally:
+        trava_simbolo.release()
+
+
+def obter_benchmark_por_nome(nome):
+    return obter_benchmark(BENCHMARKS.get(nome, BENCHMARKS[BENCHMARK_PADRAO]))
+
+
+__all__ = [
+    "BENCHMARKS",
+    "BENCHMARK_PADRAO",
+    "obter_benchmark",
+    "obter_benchmark_por_nome",
+]
@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from .colunas import COLUNAS_INDICADORES, garantir_colunas, limpar_ohlc
+from .panel import COLUNAS_PAINEL
+
+
+# --- Cache LRU de indicadores por ticker ---
+# Chave: (ticker, última barra, último fechamento, nº de barras, length, threshold).
+# O fechamento entra na chave porque a barra do dia muda durante o pregão sem
+# mudar a data. O limite é em bytes (memory_usage dos DataFrames guardados).
+LIMITE_CACHE_BYTES = int(os.environ.get("SCREENER_CACHE_INDICADORES_MB", "256")) * 1024 * 1024
+COLUNAS_CACHE = COLUNAS_INDICADORES + ["VCP"]
+
+_cache = OrderedDict()
+_trava = threading.Lock()
+_estado = {"bytes": 0, "acertos": 0, "faltas": 0}
+
+
+def _chave(ticker, df, length, momentum_threshold):
+    if df.empty:
+        return None
+    return (ticker, pd.Timestamp(df.index[-1]), float(df["Close"].iloc[-1]), len(df), length, momentum_threshold)
+
+
+def _colunas_guardadas(df):
+    return df[[c for c in COLUNAS_PAINEL if c in df.columns] + COLUNAS_CACHE]
+
+
+def _guardar(chave, df):
+    tamanho = int(df.memory_usage(index=True).sum())
+    if tamanho > LIMITE_CACHE_BYTES:
+        return
+    with _trava:
+        if chave in _cache:
+            _estado["bytes"] -= _cache.pop(chave)[1]
+        _cache[chave] = (df, tamanho)
+        _estado["bytes"] += tamanho
+        while _estado["bytes"] > LIMITE_CACHE_BYTES:
+            _, (_, tamanho_antigo) = _cache.popitem(last=False)
+            _estado["bytes"] -= tamanho_antigo
+
+
+def obter_indicadores(ticker, df_bruto, length=20, momentum_threshold=0.07):
+    # Equivale a calcular_indicadores + coluna VCP. Devolve cópia: quem chama
+    # costuma acrescentar colunas (RS_Rating, TR...) no DataFrame
+    df = limpar_ohlc(df_bruto)
+    chave = _chave(ticker, df, length, momentum_threshold)
+    with _trava:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            _estado["acertos"] += 1
+            return _cache[chave][0].copy()
+        _estado["faltas"] += 1
+
+    garantir_colunas(df, COLUNAS_CACHE, length, momentum_threshold)
+    df = _colunas_guardadas(df).copy()
+    if chave is not None:
+        _guardar(chave, df.copy())
+    return df
+
+
+def guardar_indicadores(ticker, df, length=20, momentum_threshold=0.07):
+    # Para DataFrames já calculados em outro caminho (ex.: visão do painel do scan),
+    # que assim ficam disponíveis para Favoritos e Gráficos Individuais
+    garantir_colunas(df, COLUNAS_CACHE, length, momentum_threshold)
+    chave = _chave(ticker, df, length, momentum_threshold)
+    if chave is not None:
+        _guardar(chave, _colunas_guardadas(df).copy())
+    return df
+
+
+def estatisticas_cache():
+    with _trava:
+        return {"itens": len(_cache), **_estado}
+
+
+def limpar_cache():
+    with _trava:
+        _cache.clear()
+        _estado.update(bytes=0, acertos=0, faltas=0)
+
+
+__all__ = [
+    "obter_indicadores",
+    "guardar_indicadores",
+    "estatisticas_cache",
+    "limpar_cache",
+    "LIMITE_CACHE_BYTES",
+]
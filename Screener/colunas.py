@@ -0,0 +1,57 @@
+from .rolling import pine_linreg
+from .vcp import sinal_vcp
+
+
+# --- Colunas de indicadores calculadas sob demanda ---
+# Cada coluna declara de quais outras depende; garantir_colunas calcula só o que
+# falta. Funciona com o DataFrame de um ticker e com o painel alinhado
+# (dict campo -> DataFrame datas × tickers), já que as fórmulas são as mesmas.
+
+def _centro(d, length):
+    return ((d["High20"] + d["Low20"]) / 2 + d["Close"].rolling(length).mean()) / 2
+
+
+CALCULOS = {
+    "High20": ([], lambda d, length, thr: d["High"].rolling(length).max().shift(1)),
+    "Low20": ([], lambda d, length, thr: d["Low"].rolling(length).min()),
+    "SMA20": ([], lambda d, length, thr: d["Close"].rolling(20).mean()),
+    "SMA50": ([], lambda d, length, thr: d["Close"].rolling(50).mean()),
+    "SMA150": ([], lambda d, length, thr: d["Close"].rolling(150).mean()),
+    "SMA200": ([], lambda d, length, thr: d["Close"].rolling(200).mean()),
+    "EMA20": ([], lambda d, length, thr: d["Close"].ewm(span=20, adjust=False).mean()),
+    "linreg_close": ([], lambda d, length, thr: pine_linreg(d["Close"], length)),
+    "momentum": (["High20", "Low20", "linreg_close"], lambda d, length, thr: d["linreg_close"] - _centro(d, length)),
+    "momentum_up": (["momentum"], lambda d, length, thr: (d["momentum"].shift(1) <= 0) & (d["momentum"] > thr)),
+    "rompe_resistencia": (["High20"], lambda d, length, thr: d["Close"] > d["High20"]),
+    "suporte": ([], lambda d, length, thr: d["Low"].rolling(length).min()),
+    "VCP": ([], lambda d, length, thr: sinal_vcp(d)),
+}
+
+COLUNAS_INDICADORES = [
+    "High20", "Low20", "SMA20", "SMA50", "SMA150", "SMA200", "EMA20",
+    "linreg_close", "momentum", "momentum_up", "rompe_resistencia", "suporte",
+]
+
+
+def limpar_ohlc(df):
+    # Mesma limpeza de calcular_indicadores
+    df = df.dropna(subset=["Open", "High", "Low", "Close"])
+    return df[(df["High"] > df["Low"]) & (df["Open"] != df["Close"])].copy()
+
+
+def garantir_colunas(dados, colunas, length=20, momentum_threshold=0.07):
+    for coluna in colunas:
+        if coluna in dados:
+            continue
+        dependencias, calcular = CALCULOS[coluna]
+        garantir_colunas(dados, dependencias, length, momentum_threshold)
+        dados[coluna] = calcular(dados, length, momentum_threshold)
+    return dados
+
+
+__all__ = [
+    "CALCULOS",
+    "COLUNAS_INDICADORES",
+    "limpar_ohlc",
+    "garantir_colunas",
+]
@@ -0,0 +1,428 @@
+import datetime
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from .bases import detectar_bases_planas
+from .colunas import COLUNAS_INDICADORES, garantir_colunas, limpar_ohlc
+from .metadata import obter_calendario, obter_financeiro_trimestral
+from .profiling import cronometrar
+
+
+# --- Núcleo de análise compartilhado pelas páginas ---
+# Uma única implementação de indicadores, RS, VCP, risco, níveis e gráfico;
+# as páginas importam daqui em vez de redefinir as funções a cada rerun.
+
+def calcular_rs_rating(df_ativo, df_bench=None, rs_ref=None):
+    df_ativo = df_ativo.sort_index()
+
+    def calc_perf(df, dias):
+        if len(df) > dias:
+            return df['Close'].iloc[-1] / df['Close'].iloc[-dias]
+        else:
+            return np.nan
+
+    perf_ativo = {
+        "63": calc_perf(df_ativo, 63),
+        "126": calc_perf(df_ativo, 126),
+        "189": calc_perf(df_ativo, 189),
+        "252": calc_perf(df_ativo, 252),
+    }
+
+    # rs_ref já vem pronto do serviço de benchmark (Screener.benchmark);
+    # df_bench só é usado por quem ainda passa o DataFrame do índice
+    if rs_ref is None:
+        df_bench = df_bench.sort_index()
+        perf_bench = {
+            "63": calc_perf(df_bench, 63),
+            "126": calc_perf(df_bench, 126),
+            "189": calc_perf(df_bench, 189),
+            "252": calc_perf(df_bench, 252),
+        }
+        if any(np.isnan(list(perf_bench.values()))):
+            return None
+        rs_ref = 0.4 * perf_bench["63"] + 0.2 * perf_bench["126"] + 0.2 * perf_bench["189"] + 0.2 * perf_bench["252"]
+
+    if any(np.isnan(list(perf_ativo.values()))) or pd.isna(rs_ref):
+        return None
+
+    rs_stock = 0.4 * perf_ativo["63"] + 0.2 * perf_ativo["126"] + 0.2 * perf_ativo["189"] + 0.2 * perf_ativo["252"]
+    total_rs_score = (rs_stock / rs_ref) * 100
+
+    # Tabela de faixas baseada na curva do script original
+    thresholds = [
+        (198.0, 99),
+        (120.0, 90),
+        (100.0, 70),
+        (91.5, 50),
+        (81.0, 30),
+        (53.5, 10),
+        (25.0, 1),
+    ]
+
+    for i in range(len(thresholds) - 1):
+        upper, rating_upper = thresholds[i]
+        lower, rating_lower = thresholds[i + 1]
+        if lower <= total_rs_score < upper:
+            return round(rating_lower + (rating_upper - rating_lower) * (total_rs_score - lower) / (upper - lower))
+
+    return 99 if total_rs_score >= thresholds[0][0] else 1
+
+
+def get_earnings_info_detalhado(ticker):
+    try:
+        calendar = obter_calendario(ticker)
+        if isinstance(calendar, dict) or isinstance(calendar, pd.Series):
+            earnings = calendar.get("Earnings Date", None)
+            if isinstance(earnings, list) and earnings:
+                earnings = earnings[0]
+            if isinstance(earnings, (pd.Timestamp, datetime.datetime, datetime.date)):
+                earnings_date = pd.to_datetime(earnings).tz_localize("America/New_York") if pd.to_datetime(earnings).tzinfo is None else pd.to_datetime(earnings)
+                now = pd.Timestamp.now(tz="America/New_York")
+                delta = (earnings_date - now).days
+                data_str = earnings_date.strftime('%d %b %Y')
+                if delta >= 0:
+                    return f" {data_str} (em {delta}d)", earnings_date, delta
+                else:
+                    return f"Último: {data_str} (há {-delta}d)", earnings_date, delta
+        return "Indisponível", None, None
+    except Exception as e:
+        return f"Erro: {e}", None, None
+
+
+def calcular_indicadores(df, length=20, momentum_threshold=0.07):
+    # Mesmas colunas de sempre, calculadas pelas fórmulas de Screener.colunas
+    # (as mesmas do painel do scan e do cache de indicadores)
+    return garantir_colunas(limpar_ohlc(df), COLUNAS_INDICADORES, length, momentum_threshold)
+
+
+def detectar_vcp(df):
+    if 'Volume' not in df.columns or len(df) < 40:
+        return False
+    closes = df['Close']
+    highs = df['High']
+    lows = df['Low']
+    volumes = df['Volume']
+    sma50 = closes.rolling(50).mean()
+    max1 = highs[-40:-20].max()
+    max2 = highs[-20:].max()
+    if pd.isna(max1) or pd.isna(max2) or not (max1 > max2):
+        return False
+    min1 = lows[-40:-20].min()
+    min2 = lows[-20:].min()
+    if pd.isna(min1) or pd.isna(min2) or not (min1 < min2):
+        return False
+    vol_ant = volumes[-40:-20].mean()
+    vol_rec = volumes[-20:].mean()
+    if pd.isna(vol_ant) or pd.isna(vol_rec) or not (vol_ant > vol_rec):
+        return False
+    range_ant = (highs[-40:-20] - lows[-40:-20]).mean()
+    range_rec = (highs[-20:] - lows[-20:]).mean()
+    if pd.isna(range_ant) or pd.isna(range_rec) or not (range_ant > range_rec):
+        return False
+    if pd.isna(sma50.iloc[-1]) or closes.iloc[-1] < sma50.iloc[-1] * 0.97:
+        return False
+    return True
+
+
+def avaliar_risco(df):
+    preco_atual = df['Close'].iloc[-1]
+    suporte = df['Low'].rolling(20).min().iloc[-1]
+    resistencia = df['High'].rolling(20).max().iloc[-1]
+    risco = 5
+    df['TR'] = np.maximum(df['High'] - df['Low'], np.maximum(abs(df['High'] - df['Close'].shift(1)), abs(df['Low'] - df['Close'].shift(1))))
+    atr = df['TR'].rolling(14).mean().iloc[-1]
+    if atr / preco_atual > 0.05:
+        risco += 1
+    else:
+        risco -= 1
+    if (preco_atual - suporte) / preco_atual > 0.05:
+        risco += 1
+    if (resistencia - preco_atual) / preco_atual < 0.03:
+        risco += 1
+    if preco_atual < df['SMA200'].iloc[-1]:
+        risco += 1
+    quedas = sum(df['Close'].tail(30).diff() < 0)
+    if quedas >= 3:
+        risco += 1
+    recent_df = df.tail(30)
+    media_volume = recent_df['Volume'].mean()
+    dias_queda_volume_alto = recent_df[(recent_df['Close'] < recent_df['Close'].shift(1)) & (recent_df['Volume'] > media_volume)]
+    if not dias_queda_volume_alto.empty:
+        risco += 1
+    if df['rompe_resistencia'].iloc[-1] and df['Volume'].iloc[-1] > df['Volume'].rolling(20).mean().iloc[-1]:
+        risco -= 1
+    if df['EMA20'].iloc[-1] > df['SMA50'].iloc[-1] > df['SMA150'].iloc[-1] > df['SMA200'].iloc[-1]:
+        risco -= 1
+    return int(min(max(round(risco), 1), 10))
+
+
+def classificar_tendencia(close):
+    # Inclinação da reta de mínimos quadrados (mesmo valor de np.polyfit grau 1)
+    y = np.asarray(close, dtype=float)
+    x = np.arange(len(y)) - (len(y) - 1) / 2
+    slope = (x * (y - y.mean())).sum() / (x ** 2).sum()
+    if slope > 0.05:
+        return "Alta"
+    elif slope < -0.05:
+        return "Baixa"
+    return "Lateral"
+
+
+def gerar_comentario(df, tendencia, vcp):
+    comentario = "📊 Ativo em zona de observação técnica"
+    sinais = []
+    if df['momentum_up'].iloc[-1]:
+        sinais.append("Momentum")
+    if df['rompe_resistencia'].iloc[-1]:
+        sinais.append("Rompimento")
+    if vcp:
+        sinais.append("Padrão VCP")
+    if sinais:
+        comentario += f"\n📈 Sinais técnicos: {', '.join(sinais)}"
+    return comentario
+
+
+def calcular_pivot_points(df):
+    high = df['High'].iloc[-2]
+    low = df['Low'].iloc[-2]
+    close = df['Close'].iloc[-2]
+    PP = (high + low + close) / 3
+    R1 = 2 * PP - low
+    S1 = 2 * PP - high
+    R2 = PP + (R1 - S1)
+    S2 = PP - (R1 - S1)
+    R3 = high + 2 * (PP - low)
+    S3 = low - 2 * (high - PP)
+    return PP, [S1, S2, S3], [R1, R2, R3]
+
+
+def get_quarterly_growth_table_yfinance(ticker):
+    df = obter_financeiro_trimestral(ticker).T
+
+    if df.empty or "Total Revenue" not in df.columns or "Net Income" not in df.columns:
+        return None
+
+    df = df[["Total Revenue", "Net Income"]].dropna()
+    df.sort_index(ascending=False, inplace=True)
+
+    rows = []
+    for i in range(5):  # agora inclui 5 trimestres
+        try:
+            atual = df.iloc[i]
+            trimestre_data = df.index[i].date()
+            receita_atual = atual["Total Revenue"]
+            lucro_atual = atual["Net Income"]
+
+            receita_pct = None
+            lucro_pct = None
+            if i + 4 < len(df):
+                receita_ant = df.iloc[i + 4]["Total Revenue"]
+                lucro_ant = df.iloc[i + 4]["Net Income"]
+                if receita_ant:
+                    receita_pct = (receita_atual - receita_ant) / receita_ant * 100
+                if lucro_ant:
+                    lucro_pct = (lucro_atual - lucro_ant) / abs(lucro_ant) * 100
+
+            margem = (lucro_atual / receita_atual) * 100 if receita_atual else None
+
+            def fmt_pct(val):
+                if val is None:
+                    return ""
+                emoji = " 🚀" if val > 18 else ""
+                return f"{val:+.1f}%{emoji}"
+
+            rows.append({
+                "Trimestre": trimestre_data.strftime("%b %Y"),
+                "Receita (B)": f"${receita_atual / 1e9:.2f}B",
+                "Receita YoY": fmt_pct(receita_pct),
+                "Lucro (B)": f"${lucro_atual / 1e9:.2f}B",
+                "Lucro YoY": fmt_pct(lucro_pct),
+                "Margem (%)": f"{margem:.1f}%" if margem is not None else ""
+            })
+        except Exception:
+            continue
+
+    df_final = pd.DataFrame(rows).set_index("Trimestre")
+    return df_final
+
+
+def highlight_niveis(row):
+    nivel = row.name
+    if "Preço Atual" in nivel:
+        return ["background-color: #fff3b0; font-weight: bold;"] * len(row)
+    elif "🔺" in nivel:
+        return ["color: #1f77b4; font-weight: bold;"] * len(row)
+    elif "🔻" in nivel:
+        return ["color: #2ca02c; font-weight: bold;"] * len(row)
+    elif any(tag in nivel for tag in ["🟣", "📏", "📈", "📉"]):
+        return ["color: #9467bd; font-style: italic;"] * len(row)
+    return [""] * len(row)
+
+
+def inserir_preco_no_meio(niveis: list, preco: float) -> pd.DataFrame:
+    df = pd.DataFrame(niveis)
+    df["Valor"] = df["Valor"].map(lambda x: float(f"{x:.2f}"))
+    df["DistânciaReal"] = (df["Valor"] - preco) / preco
+    df["Distância"] = (df["DistânciaReal"] * 100).map("{:+.2f}%".format)
+    df["Valor"] = df["Valor"].map("{:.2f}".format)
+    df.drop(columns=["DistânciaReal"], inplace=True)
+    df = df.dropna(how="any")
+
+    df_temp = df.copy()
+    df_temp["Valor_float"] = df_temp["Valor"].astype(float)
+
+    inserido = False
+    linhas_ordenadas = []
+
+    for _, row in df_temp.sort_values(by="Valor_float", ascending=False).iterrows():
+        if not inserido and float(row["Valor"]) < preco:
+            linhas_ordenadas.append({
+                "Nível": "💰 Preço Atual",
+                "Valor": f"{preco:.2f}",
+                "Distância": "{:+.2f}%".format(0)
+            })
+            inserido = True
+        linhas_ordenadas.append(row[["Nível", "Valor", "Distância"]].to_dict())
+
+    if not inserido:
+        linhas_ordenadas.append({
+            "Nível": "💰 Preço Atual",
+            "Valor": f"{preco:.2f}",
+            "Distância": "{:+.2f}%".format(0)
+        })
+
+    df_final = pd.DataFrame(linhas_ordenadas).set_index("Nível")
+    return df_final
+
+
+@cronometrar("Gráfico (plot_ativo)")
+def plot_ativo(df, ticker, nome_empresa, vcp_detectado=False, financeiro_trimestral=None):
+    # financeiro_trimestral: marca os resultados no gráfico; None busca em Screener.metadata
+    df = df.tail(150).copy()
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.to_datetime(df.index)
+    df['index_str'] = df.index.strftime('%Y-%m-%d')
+
+    df['pct_change'] = df['Close'].pct_change() * 100
+    df['DataStr'] = df.index.strftime("%d %b")
+    df["previousClose"] = df["Close"].shift(1)
+    df["color"] = np.where(df["Close"] > df["previousClose"], "#2736e9", "#de32ae")
+    df["Percentage"] = df["Volume"] * 100 / df['Volume'].sum()
+
+    fig = make_subplots(
+        rows=3, cols=1,
+        row_heights=[0.6, 0.2, 0.2],
+        specs=[[{"type": "xy"}], [{"type": "xy"}], [{"type": "xy"}]],
+        vertical_spacing=0.02,
+        shared_xaxes=True
+    )
+
+    hovertext = df.apply(lambda row: f"{row['DataStr']}<br>Open: {row['Open']:.2f}<br>High: {row['High']:.2f}<br>Low: {row['Low']:.2f}<br>Close: {row['Close']:.2f}<br>Variação: {row['pct_change']:.2f}%" if pd.notna(row['pct_change']) else row['DataStr'], axis=1)
+
+   # Médias móveis (primeiro, para ficarem atrás)
+    fig.add_trace(go.Scatter(x=df['index_str'], y=df['SMA50'], mode='lines',
+                            line=dict(color='rgba(0, 153, 255, 0.42)', width=1), name='SMA50'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df['index_str'], y=df['EMA20'], mode='lines',
+                            line=dict(color='rgba(0,255,0,0.4)', width=1), name='EMA20'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df['index_str'], y=df['SMA150'], mode='lines',
+                            line=dict(color='rgba(255,165,0,0.4)', width=1), name='SMA150'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df['index_str'], y=df['SMA200'], mode='lines',
+                            line=dict(color='rgba(253, 76, 76, 0.4)', width=1), name='SMA200'), row=1, col=1)
+
+    # OHLC (candles) por último para ficar por cima
+    fig.add_trace(go.Ohlc(
+        x=df['index_str'], open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'],
+        increasing_line_color="#2736e9", decreasing_line_color="#de32ae", line_width=2.5,
+        showlegend=False, text=hovertext, hoverinfo='text'), row=1, col=1)
+
+    
+
+    df_up = df[df['momentum_up']]
+    df_rompe = df[df['rompe_resistencia']]
+    fig.add_trace(go.Scatter(x=df_up['index_str'], y=df_up['High'] * 1.03, mode='markers', marker=dict(symbol='diamond', color='violet', size=6), name='Momentum Up'), row=1, col=1)
+    fig.add_trace(go.Scatter(x=df_rompe['index_str'], y=df_rompe['High'] * 1.03, mode='markers', marker=dict(symbol='triangle-up', color='lime', size=6), name='Rompimento'), row=1, col=1)
+
+    if vcp_detectado:
+        last_index = df['index_str'].iloc[-1]
+        last_price = df['Close'].iloc[-1]
+        fig.add_trace(go.Scatter(x=[last_index], y=[last_price * 1.06], mode='markers', marker=dict(symbol='star-diamond', color='magenta', size=8), name='Padrão VCP', text=hovertext, hoverinfo='x+text'), row=1, col=1)
+
+    # Início de cada sequência de VCP no histórico (coluna de sinal_vcp, se houver)
+    if 'VCP' in df.columns:
+        df_vcp = df[df['VCP'] & ~df['VCP'].shift(1, fill_value=False)]
+        fig.add_trace(go.Scatter(x=df_vcp['index_str'], y=df_vcp['High'] * 1.06, mode='markers', marker=dict(symbol='star-diamond-open', color='magenta', size=7), name='VCP'), row=1, col=1)
+
+    fig.add_trace(go.Bar(x=df['index_str'], y=df['Volume'], text=df['Percentage'], marker_line_color=df['color'], marker_color=df['color'], name="Volume", texttemplate="%{text:.2f}%", hoverinfo="x+y", textfont=dict(color="white")), row=2, col=1)
+    fig.add_trace(go.Bar(x=df['index_str'], y=df['momentum'], marker=dict(color=['rgba(23, 36, 131, 0.5)' if m > 0 else 'rgba(84, 14, 77, 0.50)' for m in df['momentum']], line=dict(width=0)), name='Momentum'), row=3, col=1)
+    fig.update_xaxes(showticklabels=False, row=2, col=1)
+    fig.update_xaxes(showticklabels=False, row=3, col=1)
+
+    pct_text = f" ({df['pct_change'].iloc[-1]:+.2f}%)"
+    fig.add_hline(y=df['Close'].iloc[-1], line=dict(color='rgba(128,128,128,0.5)', width=1, dash='dot'), row=1, col=1)
+    pct_price = df['Close'].iloc[-1]
+
+    fig.update_layout(
+    xaxis=dict(type='category'),
+    xaxis2=dict(type='category'),
+    xaxis3=dict(type='category'),
+    title=f"{ticker} - {nome_empresa} - {pct_price:.2f}{pct_text}",
+    template='plotly_dark',
+    height=900,
+    hovermode='x unified',
+    xaxis_rangeslider_visible=False,
+    yaxis=dict(title='', side='right', type='linear', showgrid=False, zeroline=False),
+    yaxis2=dict(side='right', showgrid=False, zeroline=False),
+    yaxis3=dict(side='right', showgrid=False, zeroline=False),
+    showlegend=False,  # ❌ desabilita a legenda
+    bargap=0.1
+)
+
+
+    # --- FLAT BASE (mesmas zonas, detector linear em Screener.bases) ---
+    zonas_flat = [
+        (df['index_str'].iloc[inicio], df['index_str'].iloc[fim], round(resistencia, 2), round(suporte, 2), duracao)
+        for inicio, fim, resistencia, suporte, duracao in detectar_bases_planas(df['High'], df['Low'])
+    ]
+
+    for inicio, fim, resistencia, suporte, duracao in zonas_flat:
+        fig.add_trace(go.Scatter(x=[inicio, inicio, fim, fim], y=[suporte, resistencia, resistencia, suporte], fill="toself", fillcolor="rgba(255, 255, 255, 0)", line=dict(color="rgba(0,0,0,0)"), hoverinfo="skip", showlegend=False), row=1, col=1)
+        fig.add_trace(go.Scatter(x=[inicio, fim], y=[resistencia, resistencia], mode="lines", line=dict(color="green", width=2, dash="dot"), hoverinfo="skip", showlegend=False), row=1, col=1)
+        fig.add_trace(go.Scatter(x=[inicio, fim], y=[suporte, suporte], mode="lines", line=dict(color="green", width=2, dash="dot"), hoverinfo="skip", showlegend=False), row=1, col=1)
+        variacao_pct = ((resistencia - suporte) / resistencia) * 100
+        fig.add_annotation(x=inicio, y=resistencia, text=f"{resistencia:.2f} | {variacao_pct:.1f}% | {duracao} d ", showarrow=False, font=dict(color="green", size=10), bgcolor="rgba(255, 255, 255, 0)", yanchor="bottom", xanchor="left")
+        # Anotação inferior: suporte
+        fig.add_annotation(x=inicio, y=suporte,text=f"{suporte:.2f}",showarrow=False,font=dict(color="green", size=10),bgcolor="rgba(255, 255, 255, 0)",yanchor="top", xanchor="left")
+
+    try:
+        if financeiro_trimestral is None:
+            financeiro_trimestral = obter_financeiro_trimestral(ticker)
+        earnings_df = financeiro_trimestral.T
+        earnings_dates = {d.strftime('%Y-%m-%d') for d in earnings_df.index}
+        for date in sorted(earnings_dates & set(df['index_str'])):
+            fig.add_shape(
+                type="line",
+                x0=date, x1=date,
+                yref="paper", y0=0, y1=1,
+                line=dict(color="rgba(128,128,128,0.5)", dash="dot", width=1),
+            )
+    except Exception as e:
+        print("Erro ao adicionar marcações de earnings:", e)
+
+    return fig
+
+
+__all__ = [
+    "calcular_rs_rating",
+    "get_earnings_info_detalhado",
+    "calcular_indicadores",
+    "detectar_vcp",
+    "avaliar_risco",
+    "classificar_tendencia",
+    "gerar_comentario",
+    "calcular_pivot_points",
+    "get_quarterly_growth_table_yfinance",
+    "highlight_niveis",
+    "inserir_preco_no_meio",
+    "plot_ativo",
+]
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+import pandas as pd
+from .provider import obter_provedor
+from .workers import aguardar_limitador
+
+
+# --- Download em lote de OHLCV ---
+TAMANHO_LOTE_PADRAO = 100
+
+
+def _normalizar_colunas(df):
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.droplevel(1)
+    return df
+
+
+def separar_por_ticker(df_lote, tickers):
+    resultado = {}
+    if df_lote is None or df_lote.empty:
+        return resultado
+
+    # group_by="ticker" devolve colunas (ticker, campo); versões antigas do
+    # yfinance devolvem colunas simples quando o lote tem um único ticker
+    if not isinstance(df_lote.columns, pd.MultiIndex):
+        if len(tickers) == 1:
+            resultado[tickers[0]] = df_lote.dropna(how="all").copy()
+        return resultado
+
+    disponiveis = set(df_lote.columns.get_level_values(0))
+    for ticker in tickers:
+        if ticker not in disponiveis:
+            continue
+        df = df_lote[ticker].dropna(how="all")
+        if not df.empty:
+            resultado[ticker] = df.copy()
+    return resultado
+
+
+def baixar_lote(tickers, period="18mo", interval="1d", tamanho_lote=TAMANHO_LOTE_PADRAO):
+    tickers = list(dict.fromkeys(tickers))
+    resultado = {}
+
+    for inicio in range(0, len(tickers), tamanho_lote):
+        grupo = tickers[inicio:inicio + tamanho_lote]
+        try:
+            aguardar_limitador()
+            df_lote = obter_provedor().download(
+                grupo, period=period, interval=interval, group_by="ticker",
+                threads=True, progress=False
+            )
+        except Exception as e:
+            print(f"Erro ao baixar lote {grupo[0]}..{grupo[-1]}: {e}")
+            continue
+        resultado.update(separar_por_ticker(df_lote, grupo))
+
+    return resultado
+
+
+def baixar_ticker(ticker, period="18mo", interval="1d"):
+    aguardar_limitador()
+    df = obter_provedor().download(ticker, period=period, interval=interval, progress=False)
+    return _normalizar_colunas(df)
+
+
+# --- Armazenamento local de OHLCV (um arquivo por ticker) ---
+DIRETORIO_HISTORICO = os.environ.get("SCREENER_HISTORICO_DIR", os.path.join(".cache", "ohlcv"))
+VALIDADE_HISTORICO_SEG = 15 * 60
+COLUNAS_OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+# Primeira barra até este tempo depois do início do período (fim de semana,
+# feriado) ainda conta como histórico completo
+FOLGA_INICIO_PERIODO = pd.Timedelta(days=7)
+
+# ticker -> início de período já pedido ao Yahoo sem vir nada antes da primeira
+# barra salva (ativo novo): não adianta baixar de novo para esse período
+_sem_dados_antes = {}
+_trava_sem_dados = threading.Lock()
+
+try:
+    import pyarrow  # noqa: F401
+    _EXTENSAO = ".parquet"
+except ImportError:
+    _EXTENSAO = ".pkl"
+
+
+def _caminho_historico(ticker):
+    nome = "".join(c if c.isalnum() or c in "-_" else "_" for c in ticker)
+    return os.path.join(DIRETORIO_HISTORICO, f"{nome}{_EXTENSAO}")
+
+
+def _ler_historico(ticker):
+    caminho = _caminho_historico(ticker)
+    if not os.path.exists(caminho):
+        return None, 0
+    try:
+        if _EXTENSAO == ".parquet":
+            df = pd.read_parquet(caminho)
+        else:
+            df = pd.read_pickle(caminho)
+        return df, os.path.getmtime(caminho)
+    except Exception as e:
+        print(f"Histórico local de {ticker} ilegível, baixando novamente: {e}")
+        return None, 0
+
+
+def _gravar_historico(ticker, df):
+    # Falha ao gravar só deixa o histórico local desatualizado: os dados seguem em memória
+    try:
+        os.makedirs(DIRETORIO_HISTORICO, exist_ok=True)
+        caminho = _caminho_historico(ticker)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if _EXTENSAO == ".parquet":
+            df.to_parquet(temporario)
+        else:
+            df.to_pickle(temporario)
+        # os.replace é atômico: outra sessão nunca lê um arquivo pela metade
+        os.replace(temporario, caminho)
+    except Exception as e:
+        print(f"Erro ao salvar o histórico local de {ticker}: {e}")
+
+
+def _inicio_periodo(period):
+    hoje = pd.Timestamp.today().normalize()
+    if period.endswith("mo"):
+        return hoje - pd.DateOffset(months=int(period[:-2]))
+    if period.endswith("y"):
+        return hoje - pd.DateOffset(years=int(period[:-1]))
+    if period.endswith("d"):
+        return hoje - pd.Timedelta(days=int(period[:-1]))
+    return None
+
+
+def _mesclar(df_antigo, df_novo):
+    df = pd.concat([df_antigo, df_novo])
+    # A última barra salva pode ter sido gravada durante o pregão
+    df = df[~df.index.duplicated(keep="last")]
+    return df.sort_index()
+
+
+def _historico_curto(ticker, df, inicio_periodo):
+    # O arquivo começa depois do período pedido (salvo antes com um period menor)
+    if inicio_periodo is None or df.index[0] <= inicio_periodo + FOLGA_INICIO_PERIODO:
+        return False
+    with _trava_sem_dados:
+        pedido = _sem_dados_antes.get(ticker)
+    return pedido is None or inicio_periodo < pedido
+
+
+def carregar_historico(tickers, period="18mo", validade_seg=VALIDADE_HISTORICO_SEG):
+    tickers = list(dict.fromkeys(tickers))
+    agora = time.time()
+    inicio_periodo = _inicio_periodo(period)
+    resultado = {}
+    sem_historico = []
+    salvos = {}
+    atualizacoes = {}
+
+    for ticker in tickers:
+        df, modificado_em = _ler_historico(ticker)
+        if df is None or df.empty:
+            sem_historico.append(ticker)
+        elif _historico_curto(ticker, df, inicio_periodo):
+            # Baixa o período inteiro e estende o que está salvo
+            sem_historico.append(ticker)
+            salvos[ticker] = df
+        elif agora - modificado_em < validade_seg:
+            resultado[ticker] = df
+        else:
+            # Rebaixa a partir da última barra salva para corrigir um fechamento parcial
+            inicio = df.index[-1].strftime("%Y-%m-%d")
+            atualizacoes.setdefault(inicio, []).append((ticker, df))
+
+    if sem_historico:
+        baixados = baixar_lote(sem_historico, period=period)
+        for ticker in sem_historico:
+            df = baixados.get(ticker)
+            if df is None:
+                if ticker in salvos:
+                    resultado[ticker] = salvos[ticker]
+                continue
+            df = df[[c for c in COLUNAS_OHLCV if c in df.columns]]
+            if ticker in salvos:
+                df = _mesclar(salvos[ticker], df)
+            _gravar_historico(ticker, df)
+            if inicio_periodo is not None and df.index[0] > inicio_periodo + FOLGA_INICIO_PERIODO:
+                with _trava_sem_dados:
+                    _sem_dados_antes[ticker] = min(inicio_periodo, _sem_dados_antes.get(ticker, inicio_periodo))
+            resultado[ticker] = df
+
+    for inicio, itens in atualizacoes.items():
+        grupo = [ticker for ticker, _ in itens]
+        novos = {}
+        for pos in range(0, len(grupo), TAMANHO_LOTE_PADRAO):
+            sub = grupo[pos:pos + TAMANHO_LOTE_PADRAO]
+            try:
+                aguardar_limitador()
+                df_lote = obter_provedor().download(sub, start=inicio, interval="1d", group_by="ticker", threads=True, progress=False)
+                novos.update(separar_por_ticker(df_lote, sub))
+            except Exception as e:
+                print(f"Erro ao atualizar histórico a partir de {inicio}: {e}")
+        for ticker, df_antigo in itens:
+            df_novo = novos.get(ticker)
+            if df_novo is not None and not df_novo.empty:
+                df = _mesclar(df_antigo, df_novo[[c for c in COLUNAS_OHLCV if c in df_novo.columns]])
+                _gravar_historico(ticker, df)
+            else:
+                df = df_antigo
+            resultado[ticker] = df
+
+    if inicio_periodo is not None:
+        resultado = {t: df[df.index >= inicio_periodo] for t, df in resultado.items()}
+    return resultado
+
+
+def carregar_ticker(ticker, period="18mo"):
+    df = carregar_historico([ticker], period=period).get(ticker)
+    if df is None:
+        df = baixar_ticker(ticker, period=period)
+    return df.copy()
+
+
+__all__ = [
+    "baixar_lote",
+    "baixar_ticker",
+    "carregar_historico",
+    "carregar_ticker",
+    "separar_por_ticker",
+]
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import pandas as pd
+from .profiling import trecho
+from .provider import obter_provedor
+
+
+# --- Cache do resultado do screener do Finviz ---
+DIRETORIO_FINVIZ = os.environ.get("SCREENER_FINVIZ_DIR", os.path.join(".cache", "finviz"))
+VALIDADE_FINVIZ_SEG = 600
+
+_resultados = {}
+_trava = threading.Lock()
+_travas_por_chave = {}
+
+
+def chave_filtros(filters_dict):
+    # "Any" equivale a não filtrar; a ordem das chaves não importa
+    canonico = {str(k): str(v) for k, v in filters_dict.items() if v not in (None, "", "Any")}
+    texto = json.dumps(canonico, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def _caminho_resultado(chave):
+    return os.path.join(DIRETORIO_FINVIZ, f"{chave}.pkl")
+
+
+def _ler_resultado(chave, validade_seg):
+    agora = time.time()
+    with _trava:
+        if chave in _resultados and agora - _resultados[chave][1] < validade_seg:
+            return _resultados[chave][0]
+    # Outro processo/instância do app pode já ter buscado o mesmo filtro
+    caminho = _caminho_resultado(chave)
+    try:
+        if agora - os.path.getmtime(caminho) < validade_seg:
+            df = pd.read_pickle(caminho)
+            with _trava:
+                _resultados[chave] = (df, os.path.getmtime(caminho))
+            return df
+    except (OSError, ValueError, EOFError):
+        pass
+    return None
+
+
+def _gravar_resultado(chave, df):
+    with _trava:
+        _resultados[chave] = (df, time.time())
+    try:
+        os.makedirs(DIRETORIO_FINVIZ, exist_ok=True)
+        temporario = f"{_caminho_resultado(chave)}.{os.getpid()}.tmp"
+        df.to_pickle(temporario)
+        os.replace(temporario, _caminho_resultado(chave))
+    except OSError as e:
+        print(f"Erro ao salvar resultado do Finviz: {e}")
+
+
+def buscar_screener(filters_dict, validade_seg=VALIDADE_FINVIZ_SEG):
+    # Devolve (DataFrame, veio_do_cache). O resultado é compartilhado entre usuários:
+    # o mesmo filtro consulta o Finviz no máximo uma vez por intervalo, e cliques
+    # simultâneos no mesmo filtro esperam a primeira busca em vez de repeti-la.
+    chave = chave_filtros(filters_dict)
+    df = _ler_resultado(chave, validade_seg)
+    if df is not None:
+        return df.copy(), True
+
+    with _trava:
+        trava_chave = _travas_por_chave.setdefault(chave, threading.Lock())
+    with trava_chave:
+        df = _ler_resultado(chave, validade_seg)
+        if df is not None:
+            return df.copy(), True
+
+        with trecho("Finviz"):
+            df = obter_provedor().screener(filters_dict)
+        # Resultado vazio/erro não vai para o cache
+        if df is not None and not df.empty:
+            _gravar_resultado(chave, df)
+        return df, False
+
+
+__all__ = [
+    "chave_filtros",
+    "buscar_screener",
+    "VALIDADE_FINVIZ_SEG",
+]
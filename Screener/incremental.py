@@ -0,0 +1,176 @@
+import math
+from collections import deque
+import pandas as pd
+from .colunas import limpar_ohlc
+
+
+# --- Indicadores incrementais (uma barra por vez) ---
+# Guarda os acumuladores das janelas móveis das barras já fechadas; a barra em
+# aberto (pregão corrente) é calculada por cima deles sem alterá-los, então
+# atualizações intradiárias da mesma barra custam O(1) e não acumulam erro.
+# Reproduz garantir_colunas(limpar_ohlc(df), COLUNAS_INDICADORES) linha a linha
+# (sem VCP). Barras que limpar_ohlc descartaria são ignoradas.
+PERIODOS_SMA = (20, 50, 150, 200)
+ALPHA_EMA20 = 2 / (20 + 1)
+# Refaz as somas a partir das janelas de tempos em tempos para não acumular erro de ponto flutuante
+RESSINCRONIZAR_A_CADA = 1000
+
+
+def _barra_valida(barra):
+    o, h, l, c = (barra.get(campo) for campo in ("Open", "High", "Low", "Close"))
+    if any(v is None or (isinstance(v, float) and math.isnan(v)) for v in (o, h, l, c)):
+        return False
+    return h > l and o != c
+
+
+class EstadoIndicadores:
+    def __init__(self, length=20, momentum_threshold=0.07):
+        # A regressão usa as length-1 barras fechadas mais a aberta: com menos de 2 não há reta
+        if length < 2:
+            raise ValueError(f"length inválido para EstadoIndicadores: {length} (mínimo 2)")
+        self.length = length
+        self.momentum_threshold = momentum_threshold
+        self.periodos = sorted(set(PERIODOS_SMA) | {length})
+        self.barras_fechadas = 0
+        # Últimos fechamentos fechados: bastam k-1 para a média de k com a barra em aberto
+        self._closes = deque(maxlen=max(self.periodos) - 1)
+        self._somas = {k: 0.0 for k in self.periodos}
+        # Regressão: soma de y e de i*y (i = 0..length-2) nas últimas length-1 barras fechadas
+        self._soma_y = 0.0
+        self._soma_iy = 0.0
+        # Deques monotônicos (posição, valor): máximas das últimas `length` barras
+        # fechadas (High20 é deslocada de 1) e mínimas das últimas length-1
+        self._maximas = deque()
+        self._minimas = deque()
+        self._ema = None
+        self._momentum_anterior = math.nan
+        self.data_aberta = None
+        self.barra_aberta = None
+
+    @classmethod
+    def a_partir_de(cls, df, length=20, momentum_threshold=0.07):
+        # Fecha todo o histórico menos a última barra, que fica em aberto
+        estado = cls(length, momentum_threshold)
+        df = limpar_ohlc(df)
+        registros = df[["Open", "High", "Low", "Close", "Volume"]].to_dict("records")
+        for barra in registros[:-1]:
+            estado._fechar(barra)
+        if registros:
+            estado.data_aberta, estado.barra_aberta = df.index[-1], registros[-1]
+        return estado
+
+    # --- Atualização ---
+    def atualizar(self, data, barra):
+        # Mesma data da barra em aberto: atualização intradiária (substitui);
+        # data nova: fecha a barra em aberto e abre esta. Devolve a linha de
+        # indicadores da barra (pd.Series) ou None se ela seria descartada.
+        if self.data_aberta is not None and data != self.data_aberta:
+            self._fechar(self.barra_aberta)
+        if not _barra_valida(barra):
+            self.data_aberta = self.barra_aberta = None
+            return None
+        self.data_aberta, self.barra_aberta = data, dict(barra)
+        return self.linha_atual()
+
+    def linha_atual(self):
+        if self.barra_aberta is None:
+            return None
+        return pd.Series(self._calcular(self.barra_aberta), name=self.data_aberta)
+
+    def _fechar(self, barra):
+        valores = self._calcular(barra)
+        n, posicao, c = self.length, self.barras_fechadas, float(barra["Close"])
+
+        # Janela da regressão (length-1 barras): sai a mais antiga, todas descem uma posição
+        if len(self._closes) >= n - 1:
+            saindo = self._closes[-(n - 1)]
+            self._soma_iy += -(self._soma_y - saindo) + (n - 2) * c
+            self._soma_y += c - saindo
+        else:
+            self._soma_iy += len(self._closes) * c
+            self._soma_y += c
+        for k in self.periodos:
+            if len(self._closes) >= k - 1:
+                self._somas[k] -= self._closes[-(k - 1)]
+            self._somas[k] += c
+        self._closes.append(c)
+
+        while self._maximas and self._maximas[-1][1] <= barra["High"]:
+            self._maximas.pop()
+        self._maximas.append((posicao, float(barra["High"])))
+        while self._maximas[0][0] <= posicao - n:
+            self._maximas.popleft()
+        while self._minimas and self._minimas[-1][1] >= barra["Low"]:
+            self._minimas.pop()
+        self._minimas.append((posicao, float(barra["Low"])))
+        while self._minimas[0][0] <= posicao - (n - 1):
+            self._minimas.popleft()
+
+        self._ema = valores["EMA20"]
+        self._momentum_anterior = valores["momentum"]
+        self.barras_fechadas += 1
+        if self.barras_fechadas % RESSINCRONIZAR_A_CADA == 0:
+            self._ressincronizar()
+
+    def _ressincronizar(self):
+        closes = list(self._closes)
+        n = self.length
+        for k in self.periodos:
+            self._somas[k] = float(sum(closes[-(k - 1):]))
+        janela = closes[-(n - 1):]
+        self._soma_y = float(sum(janela))
+        self._soma_iy = float(sum(i * y for i, y in enumerate(janela)))
+
+    # --- Cálculo da barra em aberto (não altera o estado) ---
+    def _sma(self, k, c):
+        if self.barras_fechadas < k - 1:
+            return math.nan
+        return (self._somas[k] + c) / k
+
+    def _linreg(self, c):
+        n = self.length
+        if self.barras_fechadas < n - 1:
+            return math.nan
+        soma_y = self._soma_y + c
+        soma_xy = self._soma_iy + (n - 1) * c
+        soma_x = n * (n - 1) / 2
+        soma_xx = (n - 1) * n * (2 * n - 1) / 6
+        denominador = n * soma_xx - soma_x ** 2
+        if denominador == 0:
+            return soma_y / n
+        slope = (n * soma_xy - soma_x * soma_y) / denominador
+        intercept = (soma_y - slope * soma_x) / n
+        return intercept + slope * (n - 1)
+
+    def _calcular(self, barra):
+        n = self.length
+        c, h, l = float(barra["Close"]), float(barra["High"]), float(barra["Low"])
+        high20 = self._maximas[0][1] if self.barras_fechadas >= n else math.nan
+        if self.barras_fechadas >= n - 1:
+            low20 = min(self._minimas[0][1], l) if self._minimas else l
+        else:
+            low20 = math.nan
+        ema20 = c if self._ema is None else ALPHA_EMA20 * c + (1 - ALPHA_EMA20) * self._ema
+        linreg = self._linreg(c)
+        centro = ((high20 + low20) / 2 + self._sma(n, c)) / 2
+        momentum = linreg - centro
+        return {
+            "Open": float(barra["Open"]), "High": h, "Low": l, "Close": c, "Volume": barra.get("Volume"),
+            "High20": high20,
+            "Low20": low20,
+            "SMA20": self._sma(20, c),
+            "SMA50": self._sma(50, c),
+            "SMA150": self._sma(150, c),
+            "SMA200": self._sma(200, c),
+            "EMA20": ema20,
+            "linreg_close": linreg,
+            "momentum": momentum,
+            "momentum_up": bool(self._momentum_anterior <= 0 and momentum > self.momentum_threshold),
+            "rompe_resistencia": bool(c > high20),
+            "suporte": low20,
+        }
+
+
+__all__ = [
+    "EstadoIndicadores",
+]
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+import uuid
+from .profiling import PerfilScan, ativar_perfil, trecho
+
+
+# --- Jobs de scan em segundo plano (por processo) ---
+# O job vive fora da sessão do Streamlit: reruns e quedas de conexão não o
+# interrompem, e a página só consulta o estado/resultados parciais.
+ESTADOS_ATIVOS = ("fila", "rodando")
+RETENCAO_JOBS_SEG = 6 * 3600
+MAX_JOBS_POR_DONO = 5
+# Scans rodando ao mesmo tempo no processo (todos dividem o limite do Yahoo);
+# os demais esperam na fila
+MAX_JOBS_RODANDO = int(os.environ.get("SCREENER_MAX_JOBS_RODANDO", "2"))
+# De quanto em quanto tempo um job na fila confere se foi cancelado
+INTERVALO_FILA_SEG = 0.5
+
+_jobs = {}
+_trava = threading.Lock()
+_vagas = threading.BoundedSemaphore(MAX_JOBS_RODANDO)
+
+
+class CancelamentoSolicitado(Exception):
+    pass
+
+
+class JobScan:
+    def __init__(self, dono, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.dono = dono
+        self.params = params
+        self.estado = "fila"
+        self.etapa = "Na fila..."
+        self.concluidos = 0
+        self.total = 0
+        self.criado_em = time.time()
+        self.finalizado_em = None
+        self.erro = None
+        self.mensagens = []
+        self.avisos = []
+        self.resultados = []
+        self.analises = {}
+        # Marcadores livres para a página (ex.: histórico já salvo)
+        self.extras = {}
+        # Tempos por etapa e por ticker (Screener.profiling)
+        self.perfil = PerfilScan()
+        self._cancelar = threading.Event()
+        self._trava = threading.Lock()
+
+    # Chamados pela thread do job
+    def definir_etapa(self, etapa, total=None):
+        with self._trava:
+            self.etapa = etapa
+            if total is not None:
+                self.total = total
+                self.concluidos = 0
+
+    def avancar(self, ultimo=None):
+        with self._trava:
+            self.concluidos += 1
+            if ultimo is not None:
+                self.etapa = f"Analisando... {self.concluidos}/{self.total} (último: {ultimo})"
+
+    def informar(self, mensagem):
+        with self._trava:
+            self.mensagens.append(mensagem)
+
+    def avisar(self, aviso):
+        with self._trava:
+            self.avisos.append(aviso)
+
+    def adicionar_resultado(self, ticker, linha, analise):
+        with self._trava:
+            self.resultados.append(linha)
+            self.analises[ticker] = analise
+
+    def verificar_cancelamento(self):
+        if self._cancelar.is_set():
+            raise CancelamentoSolicitado()
+
+    # Chamados pela página
+    @property
+    def ativo(self):
+        return self.estado in ESTADOS_ATIVOS
+
+    @property
+    def cancelado(self):
+        return self._cancelar.is_set()
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    def progresso(self):
+        with self._trava:
+            return min(self.concluidos / self.total, 1.0) if self.total else 0.0
+
+    def instantaneo(self):
+        # Cópia consistente para desenhar sem segurar a trava durante o render
+        with self._trava:
+            return {
+                "estado": self.estado,
+                "etapa": self.etapa,
+                "concluidos": self.concluidos,
+                "total": self.total,
+                "erro": self.erro,
+                "mensagens": list(self.mensagens),
+                "avisos": list(self.avisos),
+                "resultados": list(self.resultados),
+                "analises": dict(self.analises),
+            }
+
+
+def _executar(job, funcao):
+    job.definir_etapa(f"Na fila (até {MAX_JOBS_RODANDO} scans por vez)...")
+    while not _vagas.acquire(timeout=INTERVALO_FILA_SEG):
+        if job.cancelado:
+            job.estado = "cancelado"
+            job.finalizado_em = time.time()
+            return
+
+    job.estado = "rodando"
+    try:
+        with ativar_perfil(job.perfil), trecho("Scan (total)"):
+            funcao(job, job.params)
+        job.estado = "cancelado" if job.cancelado else "concluido"
+    except CancelamentoSolicitado:
+        job.estado = "cancelado"
+    except Exception as e:
+        job.erro = str(e)
+        job.estado = "erro"
+    finally:
+        job.finalizado_em = time.time()
+        _vagas.release()
+
+
+def _limpar_antigos():
+    # Chamar com _trava adquirida
+    agora = time.time()
+    for job_id in [j.id for j in _jobs.values() if j.finalizado_em and agora - j.finalizado_em > RETENCAO_JOBS_SEG]:
+        del _jobs[job_id]
+
+
+def submeter_job(funcao, params, dono=None):
+    # funcao(job, params) roda numa thread daemon e não pode chamar st.*
+    with _trava:
+        _limpar_antigos()
+        ativos = [j for j in _jobs.values() if j.dono == dono and j.ativo]
+        if len(ativos) >= MAX_JOBS_POR_DONO:
+            raise RuntimeError(f"Limite de {MAX_JOBS_POR_DONO} scans simultâneos atingido.")
+        job = JobScan(dono, params)
+        _jobs[job.id] = job
+    threading.Thread(target=_executar, args=(job, funcao), name=f"scan-{job.id}", daemon=True).start()
+    return job.id
+
+
+def obter_job(job_id):
+    if not job_id:
+        return None
+    with _trava:
+        return _jobs.get(job_id)
+
+
+def jobs_do_dono(dono):
+    with _trava:
+        return sorted((j for j in _jobs.values() if j.dono == dono), key=lambda j: j.criado_em, reverse=True)
+
+
+def cancelar_job(job_id):
+    job = obter_job(job_id)
+    if job is not None:
+        job.cancelar()
+    return job
+
+
+__all__ = [
+    "JobScan",
+    "MAX_JOBS_RODANDO",
+    "CancelamentoSolicitado",
+    "submeter_job",
+    "obter_job",
+    "jobs_do_dono",
+    "cancelar_job",
+]
@@ -0,0 +1,136 @@
+import os
+import pickle
+import threading
+import time
+import pandas as pd
+from .profiling import trecho
+from .provider import obter_provedor
+from .workers import aguardar_limitador
+
+
+# --- Cache de metadados por ticker (nome, calendário, financeiro trimestral) ---
+DIRETORIO_METADADOS = os.environ.get("SCREENER_METADADOS_DIR", os.path.join(".cache", "meta"))
+VALIDADE_NOME_SEG = 21 * 24 * 3600
+VALIDADE_CALENDARIO_SEG = 24 * 3600
+# Sem data de resultado conhecida, o financeiro é revisto uma vez por semana
+VALIDADE_FINANCEIRO_SEG = 7 * 24 * 3600
+# Resultado já divulgado mas ainda não refletido no Yahoo: tenta de novo no dia seguinte
+VALIDADE_FINANCEIRO_PENDENTE_SEG = 24 * 3600
+# Resposta vazia (comum quando o Yahoo limita as requisições): tenta de novo em pouco tempo
+VALIDADE_VAZIO_SEG = 15 * 60
+
+_metadados = {}
+_trava = threading.Lock()
+
+
+def _caminho_metadados(ticker):
+    return os.path.join(DIRETORIO_METADADOS, f"{ticker.replace('/', '_')}.pkl")
+
+
+def _ler_metadados(ticker):
+    try:
+        with open(_caminho_metadados(ticker), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return {}
+
+
+def _gravar_metadados(ticker, entrada):
+    try:
+        os.makedirs(DIRETORIO_METADADOS, exist_ok=True)
+        caminho = _caminho_metadados(ticker)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as f:
+            pickle.dump(entrada, f)
+        os.replace(temporario, caminho)
+    except (OSError, pickle.PicklingError) as e:
+        print(f"Erro ao salvar metadados de {ticker}: {e}")
+
+
+def _entrada(ticker):
+    # Chamar com _trava adquirida
+    if ticker not in _metadados:
+        _metadados[ticker] = _ler_metadados(ticker)
+    return _metadados[ticker]
+
+
+def _vazio(valor):
+    if valor is None:
+        return True
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.empty
+    return isinstance(valor, dict) and not valor
+
+
+def _obter(ticker, campo, buscar, validade_seg):
+    # validade_seg: número fixo ou função do valor buscado
+    agora = time.time()
+    with _trava:
+        valor, expira_em = _entrada(ticker).get(campo, (None, 0))
+    if agora < expira_em:
+        return valor
+
+    # A busca roda fora da trava para não serializar os workers do scan;
+    # só ela (e não o acerto de cache acima) espera o limitador do Yahoo
+    aguardar_limitador()
+    with trecho(f"Metadados: {campo}"):
+        valor = buscar()
+    if _vazio(valor):
+        validade = VALIDADE_VAZIO_SEG
+    else:
+        validade = validade_seg(valor) if callable(validade_seg) else validade_seg
+    with _trava:
+        entrada = _entrada(ticker)
+        entrada[campo] = (valor, agora + validade)
+        copia = dict(entrada)
+    _gravar_metadados(ticker, copia)
+    return valor
+
+
+def proxima_data_resultado(calendar):
+    if not isinstance(calendar, (dict, pd.Series)):
+        return None
+    earnings = calendar.get("Earnings Date", None)
+    if isinstance(earnings, list):
+        earnings = earnings[0] if earnings else None
+    if earnings is None:
+        return None
+    try:
+        data = pd.Timestamp(earnings)
+    except (TypeError, ValueError):
+        return None
+    return data.tz_localize("America/New_York") if data.tzinfo is None else data
+
+
+def obter_nome(ticker):
+    return _obter(ticker, "nome", lambda: obter_provedor().ticker(ticker).info.get("shortName", ticker), VALIDADE_NOME_SEG)
+
+
+def obter_calendario(ticker):
+    return _obter(ticker, "calendario", lambda: obter_provedor().ticker(ticker).calendar, VALIDADE_CALENDARIO_SEG)
+
+
+def _validade_financeiro(ticker):
+    # Válido até o próximo resultado (mais um dia para o Yahoo atualizar)
+    def validade(_):
+        data = proxima_data_resultado(obter_calendario(ticker))
+        if data is None:
+            return VALIDADE_FINANCEIRO_SEG
+        restante = (data + pd.Timedelta(days=1) - pd.Timestamp.now(tz=data.tz)).total_seconds()
+        return restante if restante > 0 else VALIDADE_FINANCEIRO_PENDENTE_SEG
+    return validade
+
+
+def obter_financeiro_trimestral(ticker):
+    # Devolve cópia: quem chama costuma transpor/ordenar in-place
+    df = _obter(ticker, "financeiro_trimestral", lambda: obter_provedor().ticker(ticker).quarterly_financials,
+                _validade_financeiro(ticker))
+    return df.copy() if df is not None else pd.DataFrame()
+
+
+__all__ = [
+    "obter_nome",
+    "obter_calendario",
+    "obter_financeiro_trimestral",
+    "proxima_data_resultado",
+]
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from .colunas import COLUNAS_INDICADORES, garantir_colunas
+
+
+# --- Painel datas × tickers ---
+COLUNAS_PAINEL = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def montar_painel(historicos):
+    # historicos: {ticker: DataFrame OHLCV} -> {campo: DataFrame datas × tickers}
+    painel = {}
+    for campo in COLUNAS_PAINEL:
+        colunas = {t: df[campo] for t, df in historicos.items() if campo in df.columns}
+        painel[campo] = pd.DataFrame(colunas).sort_index()
+    return painel
+
+
+def _alinhar_pelo_fim(painel):
+    # calcular_indicadores descarta, por ticker, barras sem OHLC, com High <= Low
+    # ou com Open == Close, e as janelas móveis contam só as barras que sobram.
+    # Para reproduzir isso no painel, as barras válidas de cada ticker são
+    # empilhadas no fim da coluna (mesma ordem), e as inválidas viram NaN no topo.
+    o = painel["Open"].to_numpy(dtype=float)
+    h = painel["High"].to_numpy(dtype=float)
+    l = painel["Low"].to_numpy(dtype=float)
+    c = painel["Close"].to_numpy(dtype=float)
+    validos = ~(np.isnan(o) | np.isnan(h) | np.isnan(l) | np.isnan(c)) & (h > l) & (o != c)
+
+    ordem = np.argsort(validos, axis=0, kind="stable")
+    validos_alinhados = np.take_along_axis(validos, ordem, axis=0)
+
+    alinhado = {}
+    for campo in COLUNAS_PAINEL:
+        valores = painel[campo].reindex(columns=painel["Close"].columns).to_numpy(dtype=float)
+        valores = np.take_along_axis(valores, ordem, axis=0)
+        valores[~validos_alinhados] = np.nan
+        alinhado[campo] = pd.DataFrame(valores, columns=painel["Close"].columns)
+
+    datas = painel["Close"].index.to_numpy()[ordem]
+    return alinhado, datas, validos_alinhados
+
+
+def alinhar_painel(painel):
+    # Só o OHLCV alinhado; indicadores entram depois via garantir_colunas
+    alinhado, datas, validos = _alinhar_pelo_fim(painel)
+    resultado = dict(alinhado)
+    resultado["_datas"] = datas
+    resultado["_validos"] = validos
+    return resultado
+
+
+def calcular_indicadores_painel(painel, length=20, momentum_threshold=0.07):
+    resultado = alinhar_painel(painel)
+    return garantir_colunas(resultado, COLUNAS_INDICADORES, length, momentum_threshold)
+
+
+def selecionar_tickers(resultado, tickers):
+    # Subpainel só com as colunas de `tickers` (mesmo alinhamento)
+    colunas = resultado["Close"].columns
+    posicoes = [colunas.get_loc(t) for t in tickers]
+    sub = {}
+    for campo, valor in resultado.items():
+        if campo in ("_datas", "_validos"):
+            sub[campo] = valor[:, posicoes]
+        else:
+            sub[campo] = valor.iloc[:, posicoes]
+    return sub
+
+
+def visao_ticker(resultado, ticker):
+    # DataFrame no mesmo formato devolvido por calcular_indicadores
+    pos = resultado["Close"].columns.get_loc(ticker)
+    linhas = resultado["_validos"][:, pos]
+    dados = {campo: resultado[campo].iloc[linhas, pos].to_numpy() for campo in COLUNAS_PAINEL + COLUNAS_INDICADORES}
+    indice = pd.DatetimeIndex(resultado["_datas"][linhas, pos], name="Date")
+    return pd.DataFrame(dados, index=indice)
+
+
+def tickers_do_painel(resultado):
+    return [t for t, n in zip(resultado["Close"].columns, resultado["_validos"].sum(axis=0)) if n > 0]
+
+
+__all__ = [
+    "montar_painel",
+    "alinhar_painel",
+    "calcular_indicadores_painel",
+    "selecionar_tickers",
+    "visao_ticker",
+    "tickers_do_painel",
+]
@@ -0,0 +1,127 @@
+import numpy as np
+from .bases import base_plana_atual
+from .colunas import garantir_colunas
+from .panel import selecionar_tickers
+
+
+# --- Pipeline de filtros em etapas, das mais baratas para as mais caras ---
+# Os testes usam só .iloc[-k] e .any(): no DataFrame de um ticker devolvem um
+# booleano, no painel alinhado pelo fim devolvem uma Series (um valor por ticker).
+
+class Etapa:
+    def __init__(self, nome, custo, colunas, teste, vetorizada=True, teste_snapshot=None):
+        self.nome = nome
+        # Custo relativo estimado por ticker (colunas a calcular + o teste em si)
+        self.custo = custo
+        self.colunas = colunas
+        self.teste = teste
+        # False: o teste só roda no DataFrame de um ticker
+        self.vetorizada = vetorizada
+        # Mesmo teste sobre a tabela do snapshot diário (Screener.snapshot); None: sem equivalente
+        self.teste_snapshot = teste_snapshot
+
+    def __repr__(self):
+        return f"Etapa({self.nome!r}, custo={self.custo})"
+
+
+def _n_barras(dados):
+    return dados["_validos"].sum(axis=0) if "_validos" in dados else len(dados["Close"])
+
+
+def _teste_ordenamento(d):
+    ema20, sma50 = d["EMA20"].iloc[-1], d["SMA50"].iloc[-1]
+    sma150, sma200 = d["SMA150"].iloc[-1], d["SMA200"].iloc[-1]
+    return (ema20 > sma50) & (sma50 > sma150) & (sma150 > sma200)
+
+
+def _teste_sma200_crescente(d):
+    if len(d["SMA200"]) < 30:
+        return np.zeros(d["Close"].shape[1:], dtype=bool)
+    # Como no filtro original: só reprova se SMA200 atual <= a de 30 candles atrás
+    return (_n_barras(d) >= 30) & ~(d["SMA200"].iloc[-1] <= d["SMA200"].iloc[-30])
+
+
+def _teste_sinal(sinal, lookback):
+    def teste(d):
+        momentum = d["momentum_up"].iloc[-lookback:].any()
+        breakout = d["rompe_resistencia"].iloc[-lookback:].any()
+        if sinal == "Momentum":
+            return momentum
+        if sinal == "Breakout":
+            return breakout
+        return momentum & breakout
+    return teste
+
+
+def _teste_vcp(candles_vcp):
+    return lambda d: d["VCP"].iloc[-candles_vcp:].any()
+
+
+def _snapshot_sinal(sinal, lookback):
+    def teste(s):
+        momentum = s["Barras desde momentum"] < lookback
+        breakout = s["Barras desde rompimento"] < lookback
+        if sinal == "Momentum":
+            return momentum
+        if sinal == "Breakout":
+            return breakout
+        return momentum & breakout
+    return teste
+
+
+def _teste_base_plana(amplitude_base):
+    return lambda d: base_plana_atual(d["High"], d["Low"], amplitude_base) is not None
+
+
+def montar_etapas(ordenamento_mm=False, sma200_crescente=False, sinal="Nenhum", lookback=5,
+                  mostrar_vcp=False, candles_vcp=1, base_plana=False, amplitude_base=20):
+    etapas = []
+    if sma200_crescente:
+        etapas.append(Etapa("SMA200 crescente", 1, ["SMA200"], _teste_sma200_crescente,
+                             teste_snapshot=lambda s: s["SMA200 crescente"]))
+    if ordenamento_mm:
+        etapas.append(Etapa("Médias ordenadas", 2, ["EMA20", "SMA50", "SMA150", "SMA200"], _teste_ordenamento,
+                             teste_snapshot=lambda s: s["Médias ordenadas"]))
+    if base_plana:
+        etapas.append(Etapa("Base plana", 3, [], _teste_base_plana(amplitude_base), vetorizada=False))
+    if sinal != "Nenhum":
+        etapas.append(Etapa(f"Sinal: {sinal}", 5, ["momentum_up", "rompe_resistencia"], _teste_sinal(sinal, lookback),
+                             teste_snapshot=_snapshot_sinal(sinal, lookback)))
+    if mostrar_vcp:
+        etapas.append(Etapa("VCP", 6, ["VCP"], _teste_vcp(candles_vcp),
+                             teste_snapshot=lambda s: s["Barras desde VCP"] < candles_vcp))
+    return sorted(etapas, key=lambda e: e.custo)
+
+
+def filtrar_painel(resultado, etapas, length=20, momentum_threshold=0.07):
+    # Roda as etapas vetorizadas no universo inteiro; a cada etapa o painel
+    # encolhe para os aprovados, então as colunas das etapas seguintes são
+    # calculadas só para quem sobrou. Devolve (subpainel, descartes por etapa).
+    descartes = {}
+    for etapa in etapas:
+        if not etapa.vetorizada or resultado["Close"].shape[1] == 0:
+            continue
+        garantir_colunas(resultado, etapa.colunas, length, momentum_threshold)
+        aprovados = np.asarray(etapa.teste(resultado), dtype=bool)
+        descartes[etapa.nome] = int((~aprovados).sum())
+        resultado = selecionar_tickers(resultado, resultado["Close"].columns[aprovados])
+    return resultado, descartes
+
+
+def aplicar_etapas(df, etapas, length=20, momentum_threshold=0.07, so_nao_vetorizadas=False):
+    # Versão por ticker: devolve o nome da primeira etapa reprovada, ou None
+    for etapa in etapas:
+        if so_nao_vetorizadas and etapa.vetorizada:
+            continue
+        garantir_colunas(df, etapa.colunas, length, momentum_threshold)
+        if not bool(etapa.teste(df)):
+            return etapa.nome
+    return None
+
+
+__all__ = [
+    "Etapa",
+    "montar_etapas",
+    "filtrar_painel",
+    "aplicar_etapas",
+]
@@ -0,0 +1,199 @@
+import re
+import numpy as np
+import pandas as pd
+
+
+# --- Modelo numérico da carteira ---
+# O plano de cada simulação (sim["tabela"]) guarda números: preço, %, quantidade.
+# A formatação ("$ 12.34", "8.00%", "100 UN") só acontece no render, em
+# formatar_plano. Planos antigos, salvos como texto, são lidos por plano_numerico.
+COLUNAS_PLANO = [
+    "Etapa", "ADD", "% PARA COMPRA", "COMPRA PL", "% PL COMPRA",
+    "QTD", "STOP", "$ STOP", "RISCO", "$ RISCO",
+]
+COLUNAS_NUMERICAS = COLUNAS_PLANO[1:] + ["ACUM. RISCO"]
+FORMATOS_PLANO = {
+    "ADD": "${:.2f}",
+    "% PARA COMPRA": "{:.2f}%",
+    "COMPRA PL": "${:,.2f}",
+    "% PL COMPRA": "{:.2f}%",
+    "QTD": "{:.0f} UN",
+    "STOP": "{:.2f}%",
+    "$ STOP": "$ {:.2f}",
+    "RISCO": "{:.2f}% PL",
+    "$ RISCO": "$ {:.2f}",
+    "ACUM. RISCO": "{:.2f}% PL",
+}
+# Stop usado quando a etapa da compra não tem stop no plano
+STOP_PADRAO_PCT = 8.0
+
+
+def _valor(valor):
+    # Número ou texto numérico ("1e-05", "12.5") direto; só o resto é texto formatado
+    # dos planos antigos: "$1,234.56", "R$ 1.234,56", "8.00%", "100 UN", "-0.80% PL",
+    # "Compra Inicial" (-> NaN)
+    if valor is None:
+        return np.nan
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        pass
+    texto = re.sub(r"[^0-9.,\-]", "", str(valor))
+    decimal = texto.rsplit(",", 1)[-1] if "," in texto else ""
+    if "," in texto and texto.rfind(",") > texto.rfind(".") and len(decimal) != 3:
+        texto = texto.replace(".", "").replace(",", ".")  # 1.234,56
+    else:
+        texto = texto.replace(",", "")  # 1,234.56
+    try:
+        return float(texto)
+    except ValueError:
+        return np.nan
+
+
+def _numero(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    return serie.map(_valor).astype(float)
+
+
+def plano_numerico(tabela):
+    plano = pd.DataFrame(tabela).reset_index(drop=True)
+    plano["Etapa"] = plano["Etapa"].astype(str) if "Etapa" in plano.columns else ""
+    for coluna in COLUNAS_NUMERICAS:
+        plano[coluna] = _numero(plano[coluna]) if coluna in plano.columns else np.nan
+    return plano[["Etapa"] + COLUNAS_NUMERICAS]
+
+
+def recalcular_plano(plano, pl_total):
+    # $ STOP, $ RISCO, RISCO e ACUM. RISCO a partir de ADD, QTD e STOP
+    plano = plano.copy()
+    plano["$ STOP"] = plano["ADD"] * (1 - plano["STOP"] / 100)
+    risco = (plano["ADD"] - plano["$ STOP"]) * plano["QTD"]
+    plano["$ RISCO"] = -risco
+    plano["RISCO"] = -risco / pl_total * 100 if pl_total else 0.0
+    plano["ACUM. RISCO"] = -risco.fillna(0).cumsum() / pl_total * 100 if pl_total else 0.0
+    return plano
+
+
+def montar_plano(cotacao, pl_total, etapas):
+    # etapas: [{"nome", "subida_pct", "pct_pl", "stop_pct"}] na ordem das compras
+    etapas = pd.DataFrame(etapas)
+    preco = cotacao * (1 + etapas["subida_pct"] / 100)
+    valor = pl_total * (etapas["pct_pl"] / 100)
+    qtd = (valor / preco).where(preco != 0, 0.0)
+    plano = pd.DataFrame({
+        "Etapa": etapas["nome"],
+        "ADD": preco,
+        "% PARA COMPRA": etapas["subida_pct"],
+        "COMPRA PL": valor,
+        "% PL COMPRA": etapas["pct_pl"],
+        "QTD": np.floor(qtd),
+        "STOP": etapas["stop_pct"],
+    })
+    return recalcular_plano(plano.reindex(columns=["Etapa"] + COLUNAS_NUMERICAS), pl_total)
+
+
+def aplicar_compra_real(plano, etapa_nome, preco, qtd, pl_total, cotacao_inicial, atualizar_stop=True):
+    # Troca a linha planejada da etapa pelos valores da compra executada
+    plano = plano.copy()
+    linhas = plano.index[plano["Etapa"].str.startswith(etapa_nome)]
+    if linhas.empty:
+        return plano
+    i = linhas[0]
+    stop_pct = plano.at[i, "STOP"]
+    if pd.isna(stop_pct):
+        stop_pct = STOP_PADRAO_PCT
+    plano.at[i, "Etapa"] = f"{etapa_nome} - Real"
+    plano.at[i, "ADD"] = preco
+    plano.at[i, "QTD"] = float(int(qtd))
+    plano.at[i, "COMPRA PL"] = preco * qtd
+    plano.at[i, "% PL COMPRA"] = preco * qtd / pl_total * 100 if pl_total else 0.0
+    plano.at[i, "% PARA COMPRA"] = (preco / cotacao_inicial - 1) * 100 if cotacao_inicial else 0.0
+    if atualizar_stop:
+        plano.at[i, "STOP"] = stop_pct
+        plano.at[i, "$ STOP"] = preco * (1 - stop_pct / 100)
+    return plano
+
+
+def plano_para_registro(plano):
+    # Firebase: listas de números, sem NaN (o Realtime Database não aceita).
+    # Etapa sem stop fica com o padrão (e não 0%, que zeraria o risco dela);
+    # RISCO e ACUM. RISCO, que dependem do PL, o recalcular_plano da carga refaz
+    registro = plano.copy()
+    sem_stop = registro["STOP"].isna()
+    registro.loc[sem_stop, "STOP"] = STOP_PADRAO_PCT
+    registro.loc[sem_stop, "$ STOP"] = registro["ADD"] * (1 - STOP_PADRAO_PCT / 100)
+    registro.loc[sem_stop, "$ RISCO"] = -(registro["ADD"] - registro["$ STOP"]) * registro["QTD"]
+    registro[COLUNAS_NUMERICAS] = registro[COLUNAS_NUMERICAS].fillna(0.0).round(6)
+    return registro.to_dict(orient="list")
+
+
+def formatar_plano(plano):
+    tabela = pd.DataFrame({"Etapa": plano["Etapa"]})
+    for coluna, formato in FORMATOS_PLANO.items():
+        tabela[coluna] = [formato.format(v) if pd.notna(v) else "" for v in plano[coluna]]
+    tabela.loc[plano["Etapa"] == "COMPRA INICIAL", "% PARA COMPRA"] = "Compra Inicial"
+    return tabela
+
+
+# --- Carteira inteira: posições, tranches (linhas dos planos) e compras reais ---
+def montar_carteira(simulacoes):
+    posicoes = pd.DataFrame([
+        {
+            "nome": sim["nome"],
+            "pl_total": float(sim.get("pl_total", 0) or 0),
+            "lucro": float(sim.get("lucro", 0) or 0),
+            "preco_medio": float(sim.get("preco_medio", 0) or 0),
+            "preco_final": float(sim.get("preco_final", 0) or 0),
+            "quantidade_real": float(sim.get("quantidade_real", 0) or 0),
+        }
+        for sim in simulacoes
+    ], columns=["nome", "pl_total", "lucro", "preco_medio", "preco_final", "quantidade_real"])
+
+    planos = [plano_numerico(sim["tabela"]).assign(sim=i) for i, sim in enumerate(simulacoes) if sim.get("tabela")]
+    tranches = pd.concat(planos, ignore_index=True) if planos else pd.DataFrame(columns=["Etapa"] + COLUNAS_NUMERICAS + ["sim"])
+
+    compras = pd.DataFrame([
+        {"sim": i, "etapa": str(c.get("etapa", "Inicial")), "preco": float(c["preco"]), "qtd": float(c["qtd"])}
+        for i, sim in enumerate(simulacoes) for c in sim.get("compras_reais", []) or []
+    ], columns=["sim", "etapa", "preco", "qtd"])
+    return {"posicoes": posicoes, "tranches": tranches, "compras": compras}
+
+
+def agregados_carteira(carteira):
+    # Risco e exposição da carteira numa passada vetorizada
+    posicoes, tranches, compras = carteira["posicoes"], carteira["tranches"], carteira["compras"]
+
+    # Stop de cada compra real: linha "- Real" da etapa, senão a planejada, senão o padrão
+    etapa_base = tranches["Etapa"].astype(str).str.replace(" - Real", "", regex=False)
+    stops = (
+        tranches.assign(etapa_nome=etapa_base, real=tranches["Etapa"].astype(str).str.endswith(" - Real"))
+        .sort_values("real", ascending=False)
+        .drop_duplicates(["sim", "etapa_nome"])[["sim", "etapa_nome", "STOP"]]
+    )
+    etapa_nome = np.where(compras["etapa"].isin(["2", "3"]), "COMPRA " + compras["etapa"], "COMPRA INICIAL")
+    compras = compras.assign(etapa_nome=etapa_nome).merge(stops, on=["sim", "etapa_nome"], how="left")
+    stop_pct = compras["STOP"].fillna(STOP_PADRAO_PCT)
+    pl_compra = compras["sim"].map(posicoes["pl_total"]).replace(0, np.nan)
+
+    return {
+        "lucro_estimado_total": float(posicoes["lucro"].sum()),
+        "risco_compras_reais": float((compras["preco"] * stop_pct / 100 * compras["qtd"]).sum()),
+        "risco_operacao": float((tranches["ADD"] * tranches["STOP"] / 100 * tranches["QTD"]).sum()),
+        "pct_pl_executado": float((compras["preco"] * compras["qtd"] / pl_compra * 100).sum()),
+        "pct_pl_planejado": float(tranches["% PL COMPRA"].sum()),
+    }
+
+
+__all__ = [
+    "COLUNAS_PLANO",
+    "STOP_PADRAO_PCT",
+    "plano_numerico",
+    "recalcular_plano",
+    "montar_plano",
+    "aplicar_compra_real",
+    "plano_para_registro",
+    "formatar_plano",
+    "montar_carteira",
+    "agregados_carteira",
+]
@@ -0,0 +1,120 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+
+
+# --- Perfil de tempo por scan ---
+# Trechos cronometrados (Finviz, histórico, indicadores, metadados, gráfico,
+# render) são somados ao perfil ativo no contexto; sem perfil ativo, trecho()
+# não faz nada. O perfil e o ticker em análise seguem para as threads do pool
+# porque executar_em_paralelo roda cada item numa cópia do contexto.
+# Os tempos são inclusivos: "Análise do ticker" contém os trechos internos.
+ETAPA_TICKER = "Análise do ticker"
+# Limite de trechos por perfil (reruns da página também registram o render)
+MAX_TRECHOS = 200_000
+
+_perfil_atual = contextvars.ContextVar("perfil_scan", default=None)
+_ticker_atual = contextvars.ContextVar("ticker_perfil", default=None)
+
+
+class PerfilScan:
+    def __init__(self):
+        self.iniciado_em = time.time()
+        self._trechos = []
+        self._trava = threading.Lock()
+
+    def registrar(self, etapa, segundos, ticker=None):
+        with self._trava:
+            if len(self._trechos) < MAX_TRECHOS:
+                self._trechos.append((etapa, ticker, segundos))
+
+    def resumo(self, n_lentos=10):
+        with self._trava:
+            trechos = list(self._trechos)
+
+        etapas, por_ticker = {}, {}
+        for etapa, ticker, segundos in trechos:
+            info = etapas.setdefault(etapa, {"chamadas": 0, "total_s": 0.0})
+            info["chamadas"] += 1
+            info["total_s"] += segundos
+            if ticker is not None:
+                soma = por_ticker.setdefault(ticker, {})
+                soma[etapa] = soma.get(etapa, 0.0) + segundos
+
+        for etapa, info in etapas.items():
+            tempos = [soma[etapa] for soma in por_ticker.values() if etapa in soma]
+            info["tickers"] = len(tempos)
+            info["p50_ms"] = float(np.percentile(tempos, 50) * 1000) if tempos else None
+            info["p95_ms"] = float(np.percentile(tempos, 95) * 1000) if tempos else None
+
+        def tempo_ticker(soma):
+            return soma.get(ETAPA_TICKER, sum(soma.values()))
+
+        lentos = sorted(por_ticker.items(), key=lambda item: tempo_ticker(item[1]), reverse=True)[:n_lentos]
+        return {
+            "iniciado_em": self.iniciado_em,
+            "trechos": len(trechos),
+            "etapas": dict(sorted(etapas.items(), key=lambda item: item[1]["total_s"], reverse=True)),
+            "mais_lentos": [
+                {"ticker": ticker, "total_s": tempo_ticker(soma), "etapas": soma}
+                for ticker, soma in lentos
+            ],
+        }
+
+    def exportar_json(self, n_lentos=10):
+        return json.dumps(self.resumo(n_lentos), indent=2, ensure_ascii=False)
+
+
+@contextmanager
+def ativar_perfil(perfil):
+    token = _perfil_atual.set(perfil)
+    try:
+        yield perfil
+    finally:
+        _perfil_atual.reset(token)
+
+
+@contextmanager
+def trecho(etapa, ticker=None):
+    # ticker vale também para os trechos internos (ex.: metadados dentro da análise)
+    perfil = _perfil_atual.get()
+    if perfil is None:
+        yield
+        return
+    token = _ticker_atual.set(ticker) if ticker is not None else None
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        perfil.registrar(etapa, time.perf_counter() - inicio, _ticker_atual.get())
+        if token is not None:
+            _ticker_atual.reset(token)
+
+
+def cronometrar(etapa):
+    # Decorador: cada chamada da função vira um trecho
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with trecho(etapa):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def perfil_atual():
+    return _perfil_atual.get()
+
+
+__all__ = [
+    "PerfilScan",
+    "ativar_perfil",
+    "trecho",
+    "cronometrar",
+    "perfil_atual",
+    "ETAPA_TICKER",
+]
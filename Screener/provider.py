@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+import threading
+import time
+import pandas as pd
+
+
+# --- Provedor de dados externos (Yahoo e Finviz) ---
+# Todo acesso a yf.download, yf.Ticker(...) e Overview() passa por aqui, o que
+# permite gravar as respostas em disco e reproduzi-las sem rede:
+#   SCREENER_PROVEDOR=gravar      streamlit run app.py   # usa a rede e grava
+#   SCREENER_PROVEDOR=reproduzir  streamlit run app.py   # só o que foi gravado
+# Na reprodução, SCREENER_PROVEDOR_LATENCIA_MS (e _VARIACAO_MS) simula a rede.
+MODO_PROVEDOR = os.environ.get("SCREENER_PROVEDOR", "ao_vivo")
+DIRETORIO_GRAVACOES = os.environ.get("SCREENER_PROVEDOR_DIR", os.path.join(".cache", "gravacoes"))
+LATENCIA_MS = float(os.environ.get("SCREENER_PROVEDOR_LATENCIA_MS", "0"))
+VARIACAO_MS = float(os.environ.get("SCREENER_PROVEDOR_VARIACAO_MS", "0"))
+
+
+class RespostaNaoGravada(LookupError):
+    pass
+
+
+def _chave(*partes):
+    texto = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def _tickers_download(tickers):
+    if isinstance(tickers, str):
+        tickers = tickers.replace(",", " ").split()
+    return sorted(tickers)
+
+
+def _chaves_download(tickers, kwargs):
+    # Exata (mesmos parâmetros) e solta (mesmos tickers e intervalo): a solta guarda
+    # o maior histórico completo gravado e atende, cortado no start=, pedidos com
+    # start= relativo à data de hoje em reproduções posteriores
+    tickers = _tickers_download(tickers)
+    exata = _chave("download", tickers, {k: v for k, v in kwargs.items() if k not in ("progress", "threads")})
+    solta = _chave("download", tickers, kwargs.get("interval", "1d"), kwargs.get("group_by", "column"))
+    return exata, solta
+
+
+class ProvedorAoVivo:
+    # yfinance e finvizfinance só são importados aqui: a reprodução roda sem eles
+    def download(self, tickers, **kwargs):
+        import yfinance as yf
+        return yf.download(tickers, **kwargs)
+
+    def ticker(self, simbolo):
+        import yfinance as yf
+        return yf.Ticker(simbolo)
+
+    def screener(self, filters_dict):
+        from finvizfinance.screener.overview import Overview
+        screener = Overview()
+        screener.set_filter(filters_dict=filters_dict)
+        return screener.screener_view()
+
+
+class _Arquivo:
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.pkl")
+
+    def ler(self, chave):
+        try:
+            with open(self._caminho(chave), "rb") as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            raise RespostaNaoGravada(chave) from None
+
+    def gravar(self, chave, valor):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporario, "wb") as f:
+            pickle.dump(valor, f)
+        os.replace(temporario, caminho)
+
+
+class _TickerGravado:
+    # Fachada de yf.Ticker: atributos (info, calendar...) e métodos (history...)
+    # são gravados pela chave (símbolo, nome[, argumentos])
+    def __init__(self, provedor, simbolo):
+        self._provedor = provedor
+        self._simbolo = simbolo
+
+    def __getattr__(self, nome):
+        if nome.startswith("_"):
+            raise AttributeError(nome)
+        return self._provedor._atributo(self._simbolo, nome)
+
+
+class ProvedorGravador:
+    # Usa a rede (ProvedorAoVivo) e grava cada resposta para a reprodução
+    def __init__(self, diretorio=DIRETORIO_GRAVACOES, base=None):
+        self.arquivo = _Arquivo(diretorio)
+        self.base = base or ProvedorAoVivo()
+        self._tickers = {}
+
+    def download(self, tickers, **kwargs):
+        df = self.base.download(tickers, **kwargs)
+        exata, solta = _chaves_download(tickers, kwargs)
+        self.arquivo.gravar(exata, df)
+        # Só pedidos sem start/end entram na solta, e sem encolher a já gravada:
+        # uma atualização incremental (start= ontem) não pode virar o histórico servido
+        if "start" not in kwargs and "end" not in kwargs and len(df) >= self._linhas_gravadas(solta):
+            self.arquivo.gravar(solta, df)
+        return df
+
+    def _linhas_gravadas(self, chave):
+        try:
+            return len(self.arquivo.ler(chave))
+        except RespostaNaoGravada:
+            return 0
+
+    def screener(self, filters_dict):
+        df = self.base.screener(filters_dict)
+        self.arquivo.gravar(_chave("screener", filters_dict), df)
+        return df
+
+    def ticker(self, simbolo):
+        return _TickerGravado(self, simbolo)
+
+    def _atributo(self, simbolo, nome):
+        if simbolo not in self._tickers:
+            self._tickers[simbolo] = self.base.ticker(simbolo)
+        valor = getattr(self._tickers[simbolo], nome)
+        if not callable(valor):
+            self.arquivo.gravar(_chave("ticker", simbolo, nome), {"valor": valor})
+            return valor
+        self.arquivo.gravar(_chave("ticker", simbolo, nome), {"metodo": True})
+
+        def chamar(*args, **kwargs):
+            resultado = valor(*args, **kwargs)
+            self.arquivo.gravar(_chave("ticker", simbolo, nome, args, kwargs), resultado)
+            return resultado
+        return chamar
+
+
+class ProvedorReproducao:
+    # Serve só o que foi gravado; o que faltar levanta RespostaNaoGravada, que
+    # os chamadores tratam como erro de rede
+    def __init__(self, diretorio=DIRETORIO_GRAVACOES, latencia_ms=LATENCIA_MS, variacao_ms=VARIACAO_MS, semente=0):
+        self.arquivo = _Arquivo(diretorio)
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self._aleatorio = random.Random(semente)
+        self._trava = threading.Lock()
+
+    def _esperar(self):
+        if not self.latencia_ms and not self.variacao_ms:
+            return
+        with self._trava:
+            variacao = self._aleatorio.uniform(-self.variacao_ms, self.variacao_ms)
+        time.sleep(max(0.0, self.latencia_ms + variacao) / 1000)
+
+    def download(self, tickers, **kwargs):
+        self._esperar()
+        exata, solta = _chaves_download(tickers, kwargs)
+        try:
+            return self.arquivo.ler(exata)
+        except RespostaNaoGravada:
+            df = self.arquivo.ler(solta)
+        inicio = kwargs.get("start")
+        if inicio is not None and isinstance(df, pd.DataFrame):
+            df = df[df.index >= pd.Timestamp(inicio)]
+        return df
+
+    def screener(self, filters_dict):
+        self._esperar()
+        return self.arquivo.ler(_chave("screener", filters_dict))
+
+    def ticker(self, simbolo):
+        return _TickerGravado(self, simbolo)
+
+    def _atributo(self, simbolo, nome):
+        entrada = self.arquivo.ler(_chave("ticker", simbolo, nome))
+        if "valor" in entrada:
+            self._esperar()
+            return entrada["valor"]
+
+        def chamar(*args, **kwargs):
+            self._esperar()
+            return self.arquivo.ler(_chave("ticker", simbolo, nome, args, kwargs))
+        return chamar
+
+
+_PROVEDORES = {"ao_vivo": ProvedorAoVivo, "gravar": ProvedorGravador, "reproduzir": ProvedorReproducao}
+_provedor = {}
+_trava = threading.Lock()
+
+
+def obter_provedor():
+    with _trava:
+        if "atual" not in _provedor:
+            if MODO_PROVEDOR not in _PROVEDORES:
+                raise ValueError(f"SCREENER_PROVEDOR inválido: {MODO_PROVEDOR} (use {', '.join(_PROVEDORES)})")
+            _provedor["atual"] = _PROVEDORES[MODO_PROVEDOR]()
+        return _provedor["atual"]
+
+
+def definir_provedor(provedor):
+    # Troca o provedor do processo (ex.: benchmarks e testes de carga)
+    with _trava:
+        _provedor["atual"] = provedor
+
+
+__all__ = [
+    "RespostaNaoGravada",
+    "ProvedorAoVivo",
+    "ProvedorGravador",
+    "ProvedorReproducao",
+    "obter_provedor",
+    "definir_provedor",
+]
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+import pandas as pd
+from .data import separar_por_ticker
+from .provider import obter_provedor
+
+
+# --- Cotações das posições abertas (um download em lote por intervalo) ---
+# Compartilhado entre sessões: cotação é dado público, e várias carteiras com
+# o mesmo ticker reaproveitam o mesmo preço dentro do intervalo.
+VALIDADE_COTACOES_SEG = int(os.environ.get("SCREENER_COTACOES_SEG", "15"))
+
+_cotacoes = {}
+_trava = threading.Lock()
+# Serializa as buscas: quem chega durante um download espera e reaproveita o resultado
+_trava_busca = threading.Lock()
+
+
+def _vencidos(tickers, validade_seg):
+    agora = time.time()
+    with _trava:
+        return [t for t in tickers if t not in _cotacoes or agora - _cotacoes[t][1] >= validade_seg]
+
+
+def _baixar_cotacoes(tickers):
+    # period="5d" cobre fins de semana e feriados: vale o último fechamento/negócio
+    df_lote = obter_provedor().download(tickers, period="5d", interval="1d", group_by="ticker",
+                                        threads=True, progress=False)
+    precos = {}
+    for ticker, df in separar_por_ticker(df_lote, tickers).items():
+        closes = df["Close"].dropna() if "Close" in df.columns else pd.Series(dtype=float)
+        if not closes.empty:
+            precos[ticker] = float(closes.iloc[-1])
+    return precos
+
+
+def obter_cotacoes(tickers, validade_seg=VALIDADE_COTACOES_SEG):
+    # {ticker: último preço}; tickers sem cotação ficam de fora do dicionário
+    tickers = list(dict.fromkeys(t for t in tickers if t))
+    if _vencidos(tickers, validade_seg):
+        with _trava_busca:
+            vencidos = _vencidos(tickers, validade_seg)
+            if vencidos:
+                try:
+                    precos = _baixar_cotacoes(vencidos)
+                except Exception as e:
+                    print(f"Erro ao buscar cotações de {len(vencidos)} ativos: {e}")
+                    precos = {}
+                agora = time.time()
+                with _trava:
+                    for ticker, preco in precos.items():
+                        _cotacoes[ticker] = (preco, agora)
+    with _trava:
+        return {t: _cotacoes[t][0] for t in tickers if t in _cotacoes}
+
+
+# --- Modo ao vivo: uma thread consulta as cotações dos tickers acompanhados ---
+# As páginas renovam o interesse a cada rerun (st_autorefresh) e leem só o que
+# mudou desde a versão que já viram. Sem interesse renovado, a thread encerra.
+INTERVALO_AO_VIVO_SEG = 15
+# Interesse expira depois de alguns intervalos sem rerun da página (aba fechada)
+INTERVALOS_ATE_EXPIRAR = 4
+
+_interesse = {}  # ticker -> (intervalo_seg, expira_em)
+_publicadas = {}  # ticker -> (preco, versao)
+_monitor = {"thread": None, "versao": 0}
+
+
+def _ciclo_monitor():
+    try:
+        while True:
+            agora = time.time()
+            with _trava:
+                for ticker in [t for t, (_, expira_em) in _interesse.items() if expira_em < agora]:
+                    del _interesse[ticker]
+                if not _interesse:
+                    _monitor["thread"] = None
+                    return
+                intervalo = min(i for i, _ in _interesse.values())
+                tickers = list(_interesse)
+
+            # Uma falha do Yahoo não derruba o modo ao vivo: tenta de novo no próximo ciclo
+            try:
+                precos = obter_cotacoes(tickers, validade_seg=intervalo)
+            except Exception as e:
+                print(f"Erro ao atualizar cotações ao vivo: {e}")
+                precos = {}
+            with _trava:
+                for ticker, preco in precos.items():
+                    if ticker not in _publicadas or _publicadas[ticker][0] != preco:
+                        _monitor["versao"] += 1
+                        _publicadas[ticker] = (preco, _monitor["versao"])
+            time.sleep(max(intervalo - (time.time() - agora), 1))
+    finally:
+        # Se a thread morrer por qualquer motivo, acompanhar_cotacoes sobe outra
+        with _trava:
+            if _monitor["thread"] is threading.current_thread():
+                _monitor["thread"] = None
+
+
+def acompanhar_cotacoes(tickers, intervalo_seg=INTERVALO_AO_VIVO_SEG):
+    # Registra (ou renova) o interesse nos tickers e garante a thread rodando
+    expira_em = time.time() + INTERVALOS_ATE_EXPIRAR * intervalo_seg
+    with _trava:
+        for ticker in tickers:
+            if ticker:
+                _interesse[ticker] = (intervalo_seg, expira_em)
+        if _interesse and _monitor["thread"] is None:
+            _monitor["thread"] = threading.Thread(target=_ciclo_monitor, name="cotacoes-ao-vivo", daemon=True)
+            _monitor["thread"].start()
+
+
+def cotacoes_desde(versao, tickers=None):
+    # (versão atual, {ticker: preço} publicados depois de `versao`); versao=0 traz tudo
+    with _trava:
+        mudancas = {
+            t: preco for t, (preco, v) in _publicadas.items()
+            if v > versao and (tickers is None or t in tickers)
+        }
+        return _monitor["versao"], mudancas
+
+
+__all__ = [
+    "obter_cotacoes",
+    "acompanhar_cotacoes",
+    "cotacoes_desde",
+    "VALIDADE_COTACOES_SEG",
+    "INTERVALO_AO_VIVO_SEG",
+]
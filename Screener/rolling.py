@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+
+# --- Regressão linear móvel (equivalente ao ta.linreg do Pine, offset 0) ---
+def pine_linreg(series, length):
+    # Mínimos quadrados em forma fechada com x = 0..length-1 em cada janela:
+    # só as somas móveis de y e de k*y variam, o resto é constante.
+    # Aceita Series ou DataFrame (uma coluna por ticker).
+    y = series.astype(float)
+    k = pd.Series(np.arange(len(y), dtype=float), index=y.index)
+
+    soma_y = y.rolling(length).sum()
+    soma_ky = y.mul(k, axis=0).rolling(length).sum()
+    inicio = k - (length - 1)
+    soma_xy = soma_ky - soma_y.mul(inicio, axis=0)
+
+    soma_x = length * (length - 1) / 2
+    soma_xx = (length - 1) * length * (2 * length - 1) / 6
+    denominador = length * soma_xx - soma_x ** 2
+    if denominador == 0:
+        return soma_y / length
+
+    slope = (length * soma_xy - soma_x * soma_y) / denominador
+    intercept = (soma_y - slope * soma_x) / length
+    return intercept + slope * (length - 1)
+
+
+__all__ = [
+    "pine_linreg",
+]
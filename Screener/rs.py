@@ -0,0 +1,130 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+
+# --- RS Rating por percentil do universo ---
+PESOS_RS = {63: 0.4, 126: 0.2, 189: 0.2, 252: 0.2}
+DIRETORIO_RS = os.environ.get("SCREENER_RS_DIR", os.path.join(".cache", "rs"))
+# Universos pequenos (filtros muito restritivos do Finviz) distorcem o percentil
+MIN_TICKERS_DISTRIBUICAO = 300
+# Distribuição de até tantos pregões antes ainda vale (o scan do universo pode não ter rodado hoje)
+MAX_SESSOES_DISTRIBUICAO = 2
+
+_distribuicoes = {}
+_trava = threading.Lock()
+
+
+def score_rs(close):
+    # Mesmo desempenho ponderado de calcular_rs_rating, sem dividir pelo benchmark
+    # (dividir todos pelo mesmo número não muda a ordem do ranking)
+    close = close.dropna()
+    score = 0.0
+    for dias, peso in PESOS_RS.items():
+        if len(close) <= dias:
+            return np.nan
+        score += peso * close.iloc[-1] / close.iloc[-dias]
+    return score
+
+
+def scores_rs_painel(resultado_painel):
+    # resultado_painel: saída de calcular_indicadores_painel (barras alinhadas pelo fim)
+    colunas = resultado_painel["Close"].columns
+    close = resultado_painel["Close"].to_numpy(dtype=float)
+    if close.shape[0] < max(PESOS_RS):
+        return pd.Series(np.nan, index=colunas)
+
+    scores = np.zeros(close.shape[1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for dias, peso in PESOS_RS.items():
+            scores += peso * close[-1] / close[-dias]
+    scores[resultado_painel["_validos"].sum(axis=0) <= max(PESOS_RS)] = np.nan
+    return pd.Series(scores, index=colunas)
+
+
+def _rating_de_percentil(percentil):
+    return np.clip(np.round(percentil * 99), 1, 99).astype(int)
+
+
+def ratings_contra_distribuicao(scores, ordenados):
+    # Ratings de vários scores contra uma distribuição de referência (ordenada)
+    validos = pd.Series(scores, dtype=float).dropna()
+    if validos.empty or ordenados is None or len(ordenados) == 0:
+        return pd.Series(dtype=int)
+    percentis = np.searchsorted(ordenados, validos.to_numpy(), side="right") / len(ordenados)
+    return pd.Series(_rating_de_percentil(percentis), index=validos.index)
+
+
+def ratings_percentil(scores):
+    # Percentil dentro dos próprios scores
+    return ratings_contra_distribuicao(scores, np.sort(pd.Series(scores, dtype=float).dropna().to_numpy()))
+
+
+def _caminho_distribuicao(data_pregao):
+    return os.path.join(DIRETORIO_RS, f"{data_pregao}.npy")
+
+
+def registrar_distribuicao(data_pregao, scores, minimo=MIN_TICKERS_DISTRIBUICAO):
+    ordenados = np.sort(pd.Series(scores).dropna().to_numpy(dtype=float))
+    if len(ordenados) == 0 or len(ordenados) < minimo:
+        return False
+    with _trava:
+        _distribuicoes[data_pregao] = ordenados
+    try:
+        os.makedirs(DIRETORIO_RS, exist_ok=True)
+        temporario = f"{_caminho_distribuicao(data_pregao)}.{os.getpid()}.tmp.npy"
+        np.save(temporario, ordenados)
+        os.replace(temporario, _caminho_distribuicao(data_pregao))
+    except OSError as e:
+        print(f"Erro ao salvar distribuição de RS de {data_pregao}: {e}")
+    return True
+
+
+def obter_distribuicao(data_pregao=None, max_sessoes=None):
+    # Sem data exata, usa a distribuição mais recente até data_pregao; com
+    # max_sessoes, só se ela for de no máximo max_sessoes pregões antes
+    with _trava:
+        if data_pregao in _distribuicoes:
+            return _distribuicoes[data_pregao]
+
+    disponiveis = set(_distribuicoes)
+    if os.path.isdir(DIRETORIO_RS):
+        disponiveis |= {f[:-4] for f in os.listdir(DIRETORIO_RS) if f.endswith(".npy") and ".tmp" not in f}
+    candidatas = sorted(d for d in disponiveis if data_pregao is None or d <= data_pregao)
+    if not candidatas:
+        return None
+
+    escolhida = candidatas[-1]
+    if max_sessoes is not None and data_pregao is not None and np.busday_count(escolhida, data_pregao) > max_sessoes:
+        return None
+    with _trava:
+        if escolhida not in _distribuicoes:
+            try:
+                _distribuicoes[escolhida] = np.load(_caminho_distribuicao(escolhida))
+            except OSError:
+                return None
+        return _distribuicoes[escolhida]
+
+
+def rating_por_distribuicao(score, data_pregao, max_sessoes=MAX_SESSOES_DISTRIBUICAO):
+    # Percentil contra a distribuição do pregão (ou de até max_sessoes antes); None sem ela
+    if score is None or pd.isna(score):
+        return None
+    ordenados = obter_distribuicao(data_pregao, max_sessoes)
+    if ordenados is None:
+        return None
+    percentil = np.searchsorted(ordenados, score, side="right") / len(ordenados)
+    return int(_rating_de_percentil(percentil))
+
+
+__all__ = [
+    "MAX_SESSOES_DISTRIBUICAO",
+    "score_rs",
+    "scores_rs_painel",
+    "ratings_percentil",
+    "ratings_contra_distribuicao",
+    "registrar_distribuicao",
+    "obter_distribuicao",
+    "rating_por_distribuicao",
+]
@@ -0,0 +1,317 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from . import calcular_rs_rating
+from .benchmark import BENCHMARK_PADRAO, obter_benchmark_por_nome
+from .cache import guardar_indicadores, obter_indicadores
+from .colunas import COLUNAS_INDICADORES, garantir_colunas
+from .data import baixar_ticker, carregar_historico
+from .finviz import buscar_screener
+from .panel import alinhar_painel, montar_painel, visao_ticker
+from .pipeline import aplicar_etapas, filtrar_painel, montar_etapas
+from .profiling import ETAPA_TICKER, PerfilScan, ativar_perfil, trecho
+from .rs import (
+    MAX_SESSOES_DISTRIBUICAO, obter_distribuicao, rating_por_distribuicao, ratings_contra_distribuicao,
+    ratings_percentil, registrar_distribuicao, score_rs, scores_rs_painel,
+)
+from .snapshot import eh_universo_completo, filtrar_snapshot, informar_stderr, obter_snapshot
+from .workers import CHAMADAS_POR_SEGUNDO_PADRAO, WORKERS_PADRAO, criar_limitador, executar_em_paralelo, usar_limitador
+
+
+# --- Motor do screener sem Streamlit ---
+# Mesmo fluxo da página (Finviz -> histórico -> indicadores -> filtros em etapas),
+# usado pela página, por jobs agendados e pela linha de comando:
+#   python -m Screener.scan --filters preset.json --saida resultado.parquet
+
+# Opções do RS Rating; a primeira é o padrão da página e da CLI
+MODOS_RS = ["Tabela vs benchmark", "Percentil do universo"]
+
+# Mesmas chaves dos filtros salvos no Firebase pela página, mais os ajustes do scan
+PRESET_PADRAO = {
+    "performance": "Any",
+    "volume": "Over 300K",
+    "change": "Any",
+    "highlow": "Any",
+    "sma20": "Any",
+    "sma50": "Any",
+    "sma200": "Any",
+    "sinal": "Nenhum",
+    "ordenamento": False,
+    "sma200_crescente": False,
+    "mostrar_vcp": False,
+    "candles_vcp": 1,
+    "base_plana": False,
+    "amplitude_base": 20,
+    "threshold": 0.07,
+    "dias_breakout": 20,
+    "lookback": 5,
+    "modo_rs": MODOS_RS[0],
+    "benchmark": BENCHMARK_PADRAO,
+}
+
+_CAMPOS_FINVIZ = {
+    "change": "Change",
+    "highlow": "52-Week High/Low",
+    "sma20": "20-Day Simple Moving Average",
+    "sma50": "50-Day Simple Moving Average",
+    "sma200": "200-Day Simple Moving Average",
+}
+
+
+def carregar_preset(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        preset = json.load(f)
+    desconhecidas = set(preset) - set(PRESET_PADRAO)
+    if desconhecidas:
+        raise ValueError(f"Chaves desconhecidas no preset: {', '.join(sorted(desconhecidas))}")
+    return {**PRESET_PADRAO, **preset}
+
+
+def filtros_finviz(preset):
+    # Mesmo filters_dict que a página monta a partir dos widgets
+    filters_dict = {
+        "Performance": preset["performance"],
+        "Average Volume": preset["volume"],
+    }
+    for chave, campo in _CAMPOS_FINVIZ.items():
+        if preset[chave] and preset[chave] != "Any":
+            filters_dict[campo] = preset[chave]
+    return filters_dict
+
+
+def etapas_do_preset(preset):
+    return montar_etapas(
+        ordenamento_mm=preset["ordenamento"], sma200_crescente=preset["sma200_crescente"],
+        sinal=preset["sinal"], lookback=preset["lookback"], mostrar_vcp=preset["mostrar_vcp"],
+        candles_vcp=preset["candles_vcp"], base_plana=preset["base_plana"], amplitude_base=preset["amplitude_base"],
+    )
+
+
+def _ratings_rs(scores, ordenados):
+    # Sem distribuição de referência do dia, o percentil fica restrito aos tickers escaneados
+    if ordenados is None:
+        return ratings_percentil(scores).to_dict()
+    return ratings_contra_distribuicao(scores, ordenados).to_dict()
+
+
+def preparar_universo(tickers, etapas, length=20, momentum_threshold=0.07, snapshot=None, universo_completo=False,
+                      verificar_cancelamento=None):
+    # Histórico + etapas vetorizadas no universo inteiro. Devolve
+    # (painel dos aprovados ou None, ratings de RS do universo, tickers a analisar, descartes por etapa);
+    # tickers sem histórico em lote seguem para a análise individual.
+    # Com o snapshot diário (Screener.snapshot), as etapas que ele cobre rodam na
+    # tabela pronta e só os aprovados têm o histórico carregado; quem não está na
+    # tabela vai para a análise individual, com todas as etapas.
+    # universo_completo: tickers são o universo sem filtros (eh_universo_completo);
+    # só então a distribuição de RS do dia é registrada para as outras páginas.
+    # Os ratings de RS são percentis contra a distribuição do universo completo do
+    # pregão nos dois caminhos (com e sem snapshot), não contra os tickers filtrados.
+    # verificar_cancelamento: chamado entre as fases (ex.: JobScan.verificar_cancelamento)
+    verificar = verificar_cancelamento or (lambda: None)
+    fora_do_painel, ratings_snapshot, descartes_snapshot = [], {}, {}
+    if snapshot is not None:
+        tabela = snapshot["tabela"]
+        aprovados, descartes_snapshot = filtrar_snapshot(tabela, tickers, etapas)
+        distribuicao = np.sort(tabela["RS Score"].dropna().to_numpy(dtype=float))
+        ratings_snapshot = _ratings_rs(tabela["RS Score"].reindex(aprovados), distribuicao)
+        fora_do_painel = [t for t in tickers if t not in tabela.index]
+        tickers = aprovados
+        etapas = [e for e in etapas if e.teste_snapshot is None]
+
+    verificar()
+    with trecho("Histórico em lote"):
+        dados_tickers = carregar_historico(tickers) if tickers else {}
+    verificar()
+    if not dados_tickers:
+        return None, ratings_snapshot, list(tickers) + fora_do_painel, descartes_snapshot
+
+    with trecho("Indicadores (painel)"):
+        painel = alinhar_painel(montar_painel(dados_tickers))
+        verificar()
+
+        if snapshot is None:
+            # Score de RS do universo numa passada
+            scores_universo = scores_rs_painel(painel)
+            data_pregao = pd.Timestamp(painel["_datas"][-1].max()).strftime("%Y-%m-%d")
+            if universo_completo:
+                registrar_distribuicao(data_pregao, scores_universo)
+            ratings_universo = _ratings_rs(scores_universo, obter_distribuicao(data_pregao, MAX_SESSOES_DISTRIBUICAO))
+        else:
+            ratings_universo = ratings_snapshot
+
+        # Cada etapa calcula só as colunas de que precisa e só para quem passou nas
+        # anteriores; o resto dos indicadores fica para os que sobraram
+        painel, descartes = filtrar_painel(painel, etapas, length, momentum_threshold)
+        verificar()
+        garantir_colunas(painel, COLUNAS_INDICADORES, length, momentum_threshold)
+    tickers_analise = list(painel["Close"].columns) + [t for t in tickers if t not in dados_tickers] + fora_do_painel
+    return painel, ratings_universo, tickers_analise, {**descartes_snapshot, **descartes}
+
+
+def dados_ticker(ticker, painel, etapas, length=20, momentum_threshold=0.07):
+    # DataFrame com os indicadores do ticker, ou None se reprovar em alguma etapa.
+    # Os aprovados ficam no cache de indicadores (Screener.cache) para as outras páginas.
+    # O download individual espera o limitador ativo (Screener.workers.usar_limitador).
+    if painel is not None and ticker in painel["Close"].columns:
+        with trecho("Indicadores"):
+            df = visao_ticker(painel, ticker)
+            if aplicar_etapas(df, etapas, length, momentum_threshold, so_nao_vetorizadas=True):
+                return None
+            return guardar_indicadores(ticker, df, length, momentum_threshold)
+
+    with trecho("Download por ticker"):
+        df_bruto = baixar_ticker(ticker)
+    with trecho("Indicadores"):
+        df = obter_indicadores(ticker, df_bruto, length, momentum_threshold)
+        if df.empty or aplicar_etapas(df, etapas, length, momentum_threshold):
+            return None
+    return df
+
+
+def rating_rs(df, modo_rs, benchmark=None, ratings_universo=None, ticker=None):
+    # RS do ticker no modo escolhido; devolve (rating ou NaN, modo usado).
+    # No percentil, usa os ratings do scan (ratings_universo) ou, fora do scan, a
+    # distribuição do pregão da última barra; sem ela, cai na tabela vs benchmark
+    if modo_rs == "Percentil do universo":
+        if ratings_universo is not None:
+            return ratings_universo.get(ticker, np.nan), modo_rs
+        rating = rating_por_distribuicao(score_rs(df["Close"]), pd.Timestamp(df.index[-1]).strftime("%Y-%m-%d"))
+        if rating is not None:
+            return rating, modo_rs
+    if benchmark is None:
+        return np.nan, "Tabela vs benchmark"
+    rating = calcular_rs_rating(df, rs_ref=benchmark["rs_ref"])
+    return (np.nan if rating is None else rating), "Tabela vs benchmark"
+
+
+def _distancia(preco, referencia):
+    return round((preco - referencia) / preco * 100, 2) if preco else np.nan
+
+
+def linha_resultado(ticker, df, rs_rating):
+    # Valores numéricos (sem formatação) para CSV/Parquet
+    garantir_colunas(df, ["VCP"])
+    preco = df["Close"].iloc[-1]
+    return {
+        "Ticker": ticker,
+        "Data": pd.Timestamp(df.index[-1]).strftime("%Y-%m-%d"),
+        "Preco": round(float(preco), 4),
+        "RS Rating": rs_rating,
+        "Momentum": bool(df["momentum_up"].iloc[-1]),
+        "Breakout": bool(df["rompe_resistencia"].iloc[-1]),
+        "VCP": bool(df["VCP"].iloc[-1]),
+        "Dist % SMA20": _distancia(preco, df["SMA20"].iloc[-1]),
+        "Dist % SMA50": _distancia(preco, df["SMA50"].iloc[-1]),
+        "Dist % SMA200": _distancia(preco, df["SMA200"].iloc[-1]),
+        "Dist % Máx52s": _distancia(preco, df["High"].rolling(252).max().iloc[-1]),
+        "Dist % Mín52s": _distancia(preco, df["Low"].rolling(252).min().iloc[-1]),
+    }
+
+
+def rodar_scan(preset, workers=WORKERS_PADRAO, taxa_yahoo=CHAMADAS_POR_SEGUNDO_PADRAO, usar_snapshot=True, informar=print,
+               perfil=None):
+    # perfil (Screener.profiling.PerfilScan): recebe os tempos por etapa e por ticker
+    if perfil is not None:
+        with ativar_perfil(perfil), trecho("Scan (total)"):
+            return rodar_scan(preset, workers, taxa_yahoo, usar_snapshot, informar)
+
+    preset = {**PRESET_PADRAO, **preset}
+    length, threshold = preset["dias_breakout"], preset["threshold"]
+
+    tickers_df, do_cache = buscar_screener(filtros_finviz(preset))
+    if tickers_df is None or tickers_df.empty or "Ticker" not in tickers_df.columns:
+        informar("Nenhum ticker retornado com os filtros selecionados.")
+        return pd.DataFrame()
+    tickers = tickers_df["Ticker"].tolist()
+    informar(f"{len(tickers)} ativos do Finviz{' (cache)' if do_cache else ''}.")
+
+    etapas = etapas_do_preset(preset)
+    snapshot = obter_snapshot(length, threshold) if usar_snapshot else None
+    if snapshot is not None:
+        informar(f"Usando o snapshot de sinais de {snapshot['data_pregao']}.")
+    painel, ratings_universo, tickers_analise, descartes = preparar_universo(
+        tickers, etapas, length, threshold, snapshot, universo_completo=eh_universo_completo(filtros_finviz(preset)))
+    if descartes:
+        informar("Descartados: " + ", ".join(f"{nome}: {n}" for nome, n in descartes.items()))
+
+    benchmark = obter_benchmark_por_nome(preset["benchmark"]) if preset["modo_rs"] != "Percentil do universo" else None
+    limitar = criar_limitador(taxa_yahoo)
+
+    def analisar(ticker):
+        with usar_limitador(limitar), trecho(ETAPA_TICKER, ticker=ticker):
+            df = dados_ticker(ticker, painel, etapas, length, threshold)
+            if df is None:
+                return None
+            rs, _ = rating_rs(df, preset["modo_rs"], benchmark, ratings_universo, ticker)
+            return linha_resultado(ticker, df, rs)
+
+    linhas = []
+    for ticker, linha, erro in executar_em_paralelo(analisar, tickers_analise, max_workers=workers):
+        if erro is not None:
+            informar(f"Erro com {ticker}: {erro}")
+        elif linha is not None:
+            linhas.append(linha)
+
+    informar(f"{len(linhas)} ativos aprovados de {len(tickers)}.")
+    if not linhas:
+        return pd.DataFrame()
+    return pd.DataFrame(linhas).sort_values("RS Rating", ascending=False, na_position="last").reset_index(drop=True)
+
+
+def salvar_resultado(df, caminho):
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    if caminho.lower().endswith(".parquet"):
+        df.to_parquet(caminho, index=False)
+    else:
+        df.to_csv(caminho, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Screener.scan", description="Roda o screener sem o Streamlit.")
+    parser.add_argument("--filters", help="preset JSON (mesmas chaves dos filtros salvos na página)")
+    parser.add_argument("--saida", default=f"scan_{datetime.now():%Y%m%d}.csv", help="arquivo .csv ou .parquet")
+    parser.add_argument("--workers", type=int, default=WORKERS_PADRAO)
+    parser.add_argument("--taxa-yahoo", type=int, default=CHAMADAS_POR_SEGUNDO_PADRAO)
+    parser.add_argument("--sem-snapshot", action="store_true", help="calcula os sinais ao vivo mesmo com snapshot do dia")
+    parser.add_argument("--perfil", help="grava o perfil de tempo do scan (JSON) neste arquivo")
+    args = parser.parse_args(argv)
+
+    try:
+        preset = carregar_preset(args.filters) if args.filters else dict(PRESET_PADRAO)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    informar = informar_stderr
+    perfil = PerfilScan() if args.perfil else None
+    df = rodar_scan(preset, workers=args.workers, taxa_yahoo=args.taxa_yahoo,
+                    usar_snapshot=not args.sem_snapshot, informar=informar, perfil=perfil)
+    salvar_resultado(df, args.saida)
+    informar(f"Resultado salvo em {args.saida}")
+    if perfil is not None:
+        with open(args.perfil, "w", encoding="utf-8") as f:
+            f.write(perfil.exportar_json())
+        informar(f"Perfil salvo em {args.perfil}")
+    return 0
+
+
+__all__ = [
+    "MODOS_RS",
+    "PRESET_PADRAO",
+    "carregar_preset",
+    "filtros_finviz",
+    "etapas_do_preset",
+    "preparar_universo",
+    "dados_ticker",
+    "rating_rs",
+    "linha_resultado",
+    "rodar_scan",
+    "salvar_resultado",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import argparse
+import os
+import pickle
+import sys
+import threading
+import numpy as np
+import pandas as pd
+from .benchmark import FUSO_MERCADO, HORA_FECHAMENTO
+from .colunas import COLUNAS_INDICADORES, garantir_colunas
+from .data import carregar_historico
+from .finviz import buscar_screener, chave_filtros
+from .panel import alinhar_painel, montar_painel
+from .pipeline import montar_etapas
+from .rs import ratings_percentil, registrar_distribuicao, scores_rs_painel
+
+
+# --- Snapshot diário de sinais do universo ---
+# Os sinais do screener só dependem de dados de fechamento: um job depois do
+# pregão calcula tudo para o universo inteiro e grava uma tabela compacta
+# (um ticker por linha). O scan interativo filtra essa tabela e só carrega
+# histórico dos aprovados. Agendar após o fechamento, por exemplo:
+#   30 17 * * 1-5  cd /app && python -m Screener.snapshot
+DIRETORIO_SNAPSHOT = os.environ.get("SCREENER_SNAPSHOT_DIR", os.path.join(".cache", "snapshot"))
+# O volume mínimo da página é "Over 300K": qualquer busca dela é subconjunto deste universo
+UNIVERSO_PADRAO = {"Average Volume": "Over 300K"}
+
+_snapshot = {}
+_trava = threading.Lock()
+
+
+def eh_universo_completo(filters_dict):
+    # Só o universo sem filtros além do padrão serve de distribuição de RS do dia
+    return chave_filtros(filters_dict) == chave_filtros(UNIVERSO_PADRAO)
+
+
+def ultimo_pregao_fechado(agora=None):
+    # Data do último pregão já encerrado (dias úteis; feriados caem no fallback ao vivo)
+    agora = agora if agora is not None else pd.Timestamp.now(tz=FUSO_MERCADO)
+    hoje = agora.tz_localize(None).normalize()
+    if hoje.dayofweek < 5 and agora >= agora.normalize() + HORA_FECHAMENTO:
+        return hoje.strftime("%Y-%m-%d")
+    return (hoje - pd.offsets.BDay(1)).strftime("%Y-%m-%d")
+
+
+def _barras_desde(sinal):
+    # Barras desde a última ocorrência (0 = última barra); NaN se nunca ocorreu.
+    # Com as barras alinhadas pelo fim, .iloc[-k:].any() equivale a barras < k.
+    invertido = np.asarray(sinal, dtype=bool)[::-1]
+    return np.where(invertido.any(axis=0), invertido.argmax(axis=0), np.nan)
+
+
+def calcular_snapshot(painel, length=20, momentum_threshold=0.07):
+    # painel: saída de alinhar_painel para o universo inteiro
+    garantir_colunas(painel, COLUNAS_INDICADORES + ["VCP"], length, momentum_threshold)
+    colunas = painel["Close"].columns
+    n_barras = painel["_validos"].sum(axis=0)
+
+    # As etapas do pipeline são a definição dos filtros booleanos
+    etapas = {e.nome: e for e in montar_etapas(ordenamento_mm=True, sma200_crescente=True)}
+    scores = scores_rs_painel(painel)
+    tabela = pd.DataFrame({
+        "Data": pd.to_datetime(painel["_datas"][-1]),
+        "Preco": painel["Close"].iloc[-1].to_numpy(),
+        "Barras": n_barras,
+        "SMA200 crescente": np.asarray(etapas["SMA200 crescente"].teste(painel), dtype=bool),
+        "Médias ordenadas": np.asarray(etapas["Médias ordenadas"].teste(painel), dtype=bool),
+        "Barras desde momentum": _barras_desde(painel["momentum_up"]),
+        "Barras desde rompimento": _barras_desde(painel["rompe_resistencia"]),
+        "Barras desde VCP": _barras_desde(painel["VCP"]),
+        "RS Score": scores.to_numpy(),
+    }, index=colunas)
+    tabela["RS Percentil"] = ratings_percentil(scores).reindex(colunas)
+    tabela.index.name = "Ticker"
+    return tabela[n_barras > 0]
+
+
+def _caminho_snapshot(data_pregao):
+    return os.path.join(DIRETORIO_SNAPSHOT, f"sinais_{data_pregao}.pkl")
+
+
+def gerar_snapshot(universo=UNIVERSO_PADRAO, length=20, momentum_threshold=0.07, informar=print):
+    tickers_df, _ = buscar_screener(universo, validade_seg=0)
+    if tickers_df is None or tickers_df.empty or "Ticker" not in tickers_df.columns:
+        informar("Universo vazio, snapshot não gerado.")
+        return None
+    tickers = tickers_df["Ticker"].tolist()
+    informar(f"Universo: {len(tickers)} ativos.")
+
+    dados = carregar_historico(tickers)
+    painel = alinhar_painel(montar_painel(dados))
+    tabela = calcular_snapshot(painel, length, momentum_threshold)
+    data_pregao = tabela["Data"].max().strftime("%Y-%m-%d")
+    # Distribuição de RS do universo completo para o RS por percentil das outras páginas
+    registrar_distribuicao(data_pregao, tabela["RS Score"])
+
+    snapshot = {
+        "data_pregao": data_pregao,
+        "gerado_em": pd.Timestamp.now(tz=FUSO_MERCADO),
+        "length": length,
+        "momentum_threshold": momentum_threshold,
+        "universo": dict(universo),
+        "tabela": tabela,
+    }
+    os.makedirs(DIRETORIO_SNAPSHOT, exist_ok=True)
+    temporario = f"{_caminho_snapshot(data_pregao)}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as f:
+        pickle.dump(snapshot, f)
+    os.replace(temporario, _caminho_snapshot(data_pregao))
+    with _trava:
+        _snapshot[data_pregao] = snapshot
+    informar(f"Snapshot de {data_pregao} salvo com {len(tabela)} ativos.")
+    return snapshot
+
+
+def obter_snapshot(length=20, momentum_threshold=0.07, data_pregao=None):
+    # Snapshot do último pregão fechado, se existir e tiver os mesmos parâmetros;
+    # None manda o scan para o cálculo ao vivo
+    data_pregao = data_pregao or ultimo_pregao_fechado()
+    with _trava:
+        snapshot = _snapshot.get(data_pregao)
+    if snapshot is None:
+        try:
+            with open(_caminho_snapshot(data_pregao), "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        with _trava:
+            _snapshot[data_pregao] = snapshot
+    if snapshot["length"] != length or snapshot["momentum_threshold"] != momentum_threshold:
+        return None
+    return snapshot
+
+
+def filtrar_snapshot(tabela, tickers, etapas):
+    # Aplica as etapas que sabem ler o snapshot. Devolve (aprovados, descartes por etapa);
+    # tickers fora da tabela não entram em nenhum dos dois.
+    tabela = tabela.reindex([t for t in tickers if t in tabela.index])
+    descartes = {}
+    for etapa in etapas:
+        if etapa.teste_snapshot is None:
+            continue
+        aprovados = etapa.teste_snapshot(tabela).to_numpy(dtype=bool)
+        descartes[etapa.nome] = int((~aprovados).sum())
+        tabela = tabela[aprovados]
+    return list(tabela.index), descartes
+
+
+def informar_stderr(mensagem):
+    # Progresso das CLIs (snapshot e scan) vai para o stderr; o stdout fica livre
+    print(mensagem, file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m Screener.snapshot", description="Gera o snapshot de sinais do universo.")
+    parser.add_argument("--length", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.07)
+    args = parser.parse_args(argv)
+    return 0 if gerar_snapshot(length=args.length, momentum_threshold=args.threshold, informar=informar_stderr) else 1
+
+
+__all__ = [
+    "UNIVERSO_PADRAO",
+    "eh_universo_completo",
+    "ultimo_pregao_fechado",
+    "calcular_snapshot",
+    "gerar_snapshot",
+    "obter_snapshot",
+    "filtrar_snapshot",
+    "informar_stderr",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+
+# --- Sinal de VCP em todas as barras ---
+JANELA_VCP = 20
+
+
+def sinal_vcp(dados, janela=JANELA_VCP):
+    # Mesmas condições de detectar_vcp, avaliadas em cada barra de uma vez:
+    # o trecho "anterior" ([-40:-20]) é a janela móvel atual deslocada de 20.
+    # dados: DataFrame de um ticker ou painel de calcular_indicadores_painel
+    # (campo -> DataFrame datas × tickers); devolve Series/DataFrame booleano.
+    if "Volume" not in dados:
+        return dados["Close"].notna() & False
+
+    highs, lows, closes, volumes = dados["High"], dados["Low"], dados["Close"], dados["Volume"]
+
+    # min_periods=1 reproduz o max()/mean() das fatias, que ignoram NaN
+    def recente(serie, agregacao):
+        return getattr(serie.rolling(janela, min_periods=1), agregacao)()
+
+    max_rec, min_rec = recente(highs, "max"), recente(lows, "min")
+    vol_rec = recente(volumes, "mean")
+    range_rec = recente(highs - lows, "mean")
+    sma50 = closes.rolling(50).mean()
+
+    sinal = (
+        (max_rec.shift(janela) > max_rec)
+        & (min_rec.shift(janela) < min_rec)
+        & (vol_rec.shift(janela) > vol_rec)
+        & (range_rec.shift(janela) > range_rec)
+        & (closes >= sma50 * 0.97)
+    )
+
+    # detectar_vcp exige ao menos 2 janelas de histórico
+    posicao = np.arange(len(sinal))
+    if isinstance(sinal, pd.DataFrame):
+        posicao = posicao[:, None]
+    return sinal & (posicao >= 2 * janela - 1)
+
+
+def vcp_recente(dados, candles, janela=JANELA_VCP):
+    # VCP em algum dos últimos `candles` candles
+    return sinal_vcp(dados, janela).iloc[-candles:].any()
+
+
+__all__ = [
+    "sinal_vcp",
+    "vcp_recente",
+]
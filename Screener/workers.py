@@ -0,0 +1,88 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from .profiling import trecho
+
+
+# --- Execução paralela da análise por ticker ---
+WORKERS_PADRAO = 8
+CHAMADAS_POR_SEGUNDO_PADRAO = 5
+
+_limitador_atual = contextvars.ContextVar("limitador_yahoo", default=None)
+
+
+def criar_limitador(chamadas_por_segundo):
+    # Espaça as chamadas de rede de todos os workers em um intervalo mínimo comum
+    if not chamadas_por_segundo:
+        return lambda: None
+
+    intervalo = 1.0 / chamadas_por_segundo
+    trava = threading.Lock()
+    proxima = [time.monotonic()]
+
+    def limitar():
+        with trava:
+            agora = time.monotonic()
+            espera = proxima[0] - agora
+            proxima[0] = max(agora, proxima[0]) + intervalo
+        if espera > 0:
+            with trecho("Espera do limitador Yahoo"):
+                time.sleep(espera)
+
+    return limitar
+
+
+@contextmanager
+def usar_limitador(limitar):
+    # Buscas de rede feitas neste contexto (e nas threads de executar_em_paralelo)
+    # esperam o limitador; acertos de cache não passam por ele
+    token = _limitador_atual.set(limitar)
+    try:
+        yield limitar
+    finally:
+        _limitador_atual.reset(token)
+
+
+def aguardar_limitador():
+    # Chamar logo antes de uma busca de rede de fato
+    limitar = _limitador_atual.get()
+    if limitar is not None:
+        limitar()
+
+
+def executar_em_paralelo(funcao, itens, max_workers=WORKERS_PADRAO):
+    # Gera (item, resultado, erro) na ordem de conclusão, na thread de quem chama.
+    # As funções rodam fora da thread do Streamlit: não podem chamar st.*.
+    # Cada item roda numa cópia do contexto de quem chama (perfil do scan, Screener.profiling).
+    itens = list(itens)
+    if max_workers <= 1:
+        for item in itens:
+            try:
+                yield item, funcao(item), None
+            except Exception as e:
+                yield item, None, e
+        return
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(contextvars.copy_context().run, funcao, item): item for item in itens}
+        try:
+            for futuro in as_completed(futuros):
+                item = futuros[futuro]
+                erro = futuro.exception()
+                yield item, (None if erro else futuro.result()), erro
+        finally:
+            # Se o consumidor parar (st.stop, rerun), não inicia o que ainda está na fila
+            for futuro in futuros:
+                futuro.cancel()
+
+
+__all__ = [
+    "criar_limitador",
+    "usar_limitador",
+    "aguardar_limitador",
+    "executar_em_paralelo",
+    "WORKERS_PADRAO",
+    "CHAMADAS_POR_SEGUNDO_PADRAO",
+]
@@ -1,33 +1,39 @@
     #st.title("Dashboard de Análise Técnica")
 import streamlit as st
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from finvizfinance.screener.overview import Overview
-import plotly.graph_objects as go
-import plotly.express as px
-import time
-from plotly.subplots import make_subplots
-from datetime import datetime, timedelta, timezone, date
-import pyrebase
-import firebase_admin
-from firebase_admin import credentials, auth as admin_auth, db
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from cryptography.hazmat.primitives import serialization
+from datetime import datetime, timedelta, timezone
 from streamlit_autorefresh import st_autorefresh
-import io
-import sys
-from contextlib import redirect_stdout, redirect_stderr
 import re
-from finvizfinance.screener.overview import Overview
-import requests
 import hashlib
 import json
 from streamlit_javascript import st_javascript
 from firebase_admin import credentials, auth as admin_auth, db
 import firebase_admin
+from Screener.data import carregar_historico, baixar_ticker
+from Screener.vcp import sinal_vcp
+from Screener.metadata import obter_nome
+from Screener.finviz import buscar_screener
+from Screener.jobs import submeter_job, obter_job, jobs_do_dono, cancelar_job
+from Screener.scan import preparar_universo, dados_ticker, rating_rs, MODOS_RS, PRESET_PADRAO
+from Screener.snapshot import obter_snapshot, eh_universo_completo
+from Screener.cache import obter_indicadores
+from Screener.core import (
+    get_earnings_info_detalhado,
+    classificar_tendencia,
+    gerar_comentario,
+    calcular_pivot_points,
+    get_quarterly_growth_table_yfinance,
+    highlight_niveis,
+    inserir_preco_no_meio,
+    plot_ativo,
+)
+from Screener.panel import montar_painel, calcular_indicadores_painel, visao_ticker
+from Screener.colunas import garantir_colunas
+from Screener.pipeline import montar_etapas
+from Screener.workers import criar_limitador, usar_limitador, executar_em_paralelo, WORKERS_PADRAO, CHAMADAS_POR_SEGUNDO_PADRAO
+from Screener.benchmark import BENCHMARKS, BENCHMARK_PADRAO, obter_benchmark_por_nome
+from Screener.profiling import ETAPA_TICKER, ativar_perfil, trecho
 st.set_page_config(layout="wide")
 
 # Inicializa Firebase Admin se ainda não foi inicializado
@@ -100,434 +106,21 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-
 st.markdown("""
     <div style="text-align: center; margin-top: -20px; margin-bottom: 20px;">
         <img src="https://i.ibb.co/1tCRXfWv/404aabba-df44-4fc5-9c02-04d5b56108b9.png" width="120">
     </div>
 """, unsafe_allow_html=True)
 
-# --- Função de earnings detalhado ---
-def get_earnings_info_detalhado(ticker):
-    try:
-        ticker_obj = yf.Ticker(ticker)
-        calendar = ticker_obj.calendar
-
-        if isinstance(calendar, dict) or isinstance(calendar, pd.Series):
-            earnings = calendar.get("Earnings Date", None)
-
-            # Se for uma lista de datas, pegamos a primeira futura
-            if isinstance(earnings, list) and earnings:
-                earnings = earnings[0]
-            if isinstance(earnings, (pd.Timestamp, datetime, date)):
-                earnings_date = pd.to_datetime(earnings).tz_localize("America/New_York") if pd.to_datetime(earnings).tzinfo is None else pd.to_datetime(earnings)
-                now = pd.Timestamp.now(tz="America/New_York")
-                delta = (earnings_date - now).days
-                data_str = earnings_date.strftime('%d %b %Y')
-                if delta >= 0:
-                    return f" {data_str} (em {delta}d)", earnings_date, delta
-                else:
-                    return f"Último: {data_str} (há {-delta}d)", earnings_date, delta
-
-        return "Indisponível", None, None
-    except Exception as e:
-        return f"Erro: {e}", None, None
-    
-
-def calcular_rs_rating(df_ativo, df_bench, ticker=None, log_ativo=False):
-    df_ativo = df_ativo.sort_index().copy()
-    df_bench = df_bench.sort_index().copy()
-
-    def calc_perf(df, dias):
-        if len(df) > dias:
-            return df['Close'].iloc[-1] / df['Close'].iloc[-dias]
-        else:
-            return np.nan
-
-    perf_ativo = {
-        "63": calc_perf(df_ativo, 63),
-        "126": calc_perf(df_ativo, 126),
-        "189": calc_perf(df_ativo, 189),
-        "252": calc_perf(df_ativo, 252),
-    }
-
-    perf_bench = {
-        "63": calc_perf(df_bench, 63),
-        "126": calc_perf(df_bench, 126),
-        "189": calc_perf(df_bench, 189),
-        "252": calc_perf(df_bench, 252),
-    }
-
-    if any(np.isnan(list(perf_ativo.values()))) or any(np.isnan(list(perf_bench.values()))):
-        return None
-
-    rs_stock = 0.4 * perf_ativo["63"] + 0.2 * perf_ativo["126"] + 0.2 * perf_ativo["189"] + 0.2 * perf_ativo["252"]
-    rs_ref   = 0.4 * perf_bench["63"] + 0.2 * perf_bench["126"] + 0.2 * perf_bench["189"] + 0.2 * perf_bench["252"]
-    total_rs_score = (rs_stock / rs_ref) * 100
-
-    # Tabela de faixas baseada na curva do script original
-    thresholds = [
-        (198.0, 99),
-        (120.0, 90),
-        (100.0, 70),
-        (91.5, 50),
-        (81.0, 30),
-        (53.5, 10),
-        (25.0, 1),
-    ]
-
-    for i in range(len(thresholds) - 1):
-        upper, rating_upper = thresholds[i]
-        lower, rating_lower = thresholds[i + 1]
-        if lower <= total_rs_score < upper:
-            rating_final = round(rating_lower + (rating_upper - rating_lower) * (total_rs_score - lower) / (upper - lower))
-            if log_ativo and ticker:
-                print(f"Ticker: {ticker} | RS Score: {total_rs_score:.2f} → Rating: {rating_final}")
-            return rating_final
-
-    rating_final = 99 if total_rs_score >= thresholds[0][0] else 1
-    if log_ativo and ticker:
-        print(f"Ticker: {ticker} | RS Score: {total_rs_score:.2f} → Rating: {rating_final}")
-    return rating_final
-
-
-
-@st.cache_data(ttl=3600)
-def carregar_spy():
-    df_spy = yf.download('^GSPC', period="18mo", interval="1d", progress=False)
-    if df_spy is not None and not df_spy.empty:
-        if isinstance(df_spy.columns, pd.MultiIndex):
-            df_spy.columns = df_spy.columns.droplevel(1)
-        return df_spy
-    else:
-        return None
-
-df_spy = carregar_spy()
-
-
-
-
-def plot_ativo(df, ticker, nome_empresa, vcp_detectado=False):
-    df = df.tail(150).copy()
-    if not isinstance(df.index, pd.DatetimeIndex):
-        df.index = pd.to_datetime(df.index)
-    df['index_str'] = df.index.strftime('%Y-%m-%d')
-
-    df['pct_change'] = df['Close'].pct_change() * 100
-    df['DataStr'] = df.index.strftime("%d %b")
-    df["previousClose"] = df["Close"].shift(1)
-    df["color"] = np.where(df["Close"] > df["previousClose"], "#2736e9", "#de32ae")
-    df["Percentage"] = df["Volume"] * 100 / df['Volume'].sum()
-
-    fig = make_subplots(
-        rows=3, cols=1,
-        row_heights=[0.6, 0.2, 0.2],
-        specs=[[{"type": "xy"}], [{"type": "xy"}], [{"type": "xy"}]],
-        vertical_spacing=0.02,
-        shared_xaxes=True
-    )
-
-    hovertext = df.apply(lambda row: f"{row['DataStr']}<br>Open: {row['Open']:.2f}<br>High: {row['High']:.2f}<br>Low: {row['Low']:.2f}<br>Close: {row['Close']:.2f}<br>Variação: {row['pct_change']:.2f}%" if pd.notna(row['pct_change']) else row['DataStr'], axis=1)
-
-   # Médias móveis (primeiro, para ficarem atrás)
-    fig.add_trace(go.Scatter(x=df['index_str'], y=df['SMA50'], mode='lines',
-                            line=dict(color='rgba(0, 153, 255, 0.42)', width=1), name='SMA50'), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df['index_str'], y=df['EMA20'], mode='lines',
-                            line=dict(color='rgba(0,255,0,0.4)', width=1), name='EMA20'), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df['index_str'], y=df['SMA150'], mode='lines',
-                            line=dict(color='rgba(255,165,0,0.4)', width=1), name='SMA150'), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df['index_str'], y=df['SMA200'], mode='lines',
-                            line=dict(color='rgba(253, 76, 76, 0.4)', width=1), name='SMA200'), row=1, col=1)
-
-    # OHLC (candles) por último para ficar por cima
-    fig.add_trace(go.Ohlc(
-        x=df['index_str'], open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'],
-        increasing_line_color="#2736e9", decreasing_line_color="#de32ae", line_width=2.5,
-        showlegend=False, text=hovertext, hoverinfo='text'), row=1, col=1)
-
     
 
-    df_up = df[df['momentum_up']]
-    df_rompe = df[df['rompe_resistencia']]
-    fig.add_trace(go.Scatter(x=df_up['index_str'], y=df_up['High'] * 1.03, mode='markers', marker=dict(symbol='diamond', color='violet', size=6), name='Momentum Up'), row=1, col=1)
-    fig.add_trace(go.Scatter(x=df_rompe['index_str'], y=df_rompe['High'] * 1.03, mode='markers', marker=dict(symbol='triangle-up', color='lime', size=6), name='Rompimento'), row=1, col=1)
-
-    if vcp_detectado:
-        last_index = df['index_str'].iloc[-1]
-        last_price = df['Close'].iloc[-1]
-        fig.add_trace(go.Scatter(x=[last_index], y=[last_price * 1.06], mode='markers', marker=dict(symbol='star-diamond', color='magenta', size=8), name='Padrão VCP', text=hovertext, hoverinfo='x+text'), row=1, col=1)
-
-    fig.add_trace(go.Bar(x=df['index_str'], y=df['Volume'], text=df['Percentage'], marker_line_color=df['color'], marker_color=df['color'], name="Volume", texttemplate="%{text:.2f}%", hoverinfo="x+y", textfont=dict(color="white")), row=2, col=1)
-    fig.add_trace(go.Bar(x=df['index_str'], y=df['momentum'], marker=dict(color=['rgba(23, 36, 131, 0.5)' if m > 0 else 'rgba(84, 14, 77, 0.50)' for m in df['momentum']], line=dict(width=0)), name='Momentum'), row=3, col=1)
-    fig.update_xaxes(showticklabels=False, row=2, col=1)
-    fig.update_xaxes(showticklabels=False, row=3, col=1)
-
-    pct_text = f" ({df['pct_change'].iloc[-1]:+.2f}%)"
-    fig.add_hline(y=df['Close'].iloc[-1], line=dict(color='rgba(128,128,128,0.5)', width=1, dash='dot'), row=1, col=1)
-    pct_price = df['Close'].iloc[-1]
-
-    fig.update_layout(
-    xaxis=dict(type='category'),
-    xaxis2=dict(type='category'),
-    xaxis3=dict(type='category'),
-    title=f"{ticker} - {nome_empresa} - {pct_price:.2f}{pct_text}",
-    template='plotly_dark',
-    height=900,
-    hovermode='x unified',
-    xaxis_rangeslider_visible=False,
-    yaxis=dict(title='', side='right', type='linear', showgrid=False, zeroline=False),
-    yaxis2=dict(side='right', showgrid=False, zeroline=False),
-    yaxis3=dict(side='right', showgrid=False, zeroline=False),
-    showlegend=False,  # ❌ desabilita a legenda
-    bargap=0.1
-)
-
-
-    # --- FLAT BASE (conforme já estava implementado) ---
-    zonas_flat = []
-    i = 0
-    while i < len(df) - 14:
-        max_candles = 90
-        min_candles = 14
-        j = i + min_candles
-
-        base_salva = None
-
-        while j < len(df) and (j - i) <= max_candles:
-            sub_df = df.iloc[i:j]
-            high = sub_df['High'].max()
-            low = sub_df['Low'].min()
-            diff_pct = (high - low) / high * 100
-
-            if diff_pct > 20:
-                break
-
-            if (j - i) >= min_candles:
-                inicio = sub_df['index_str'].iloc[0]
-                fim = sub_df['index_str'].iloc[-1]
-                resistencia = round(high, 2)
-                suporte = round(low, 2)
-                duracao = j - i
-                base_salva = (inicio, fim, resistencia, suporte, duracao)
-
-            j += 1
-
-        if base_salva:
-            zonas_flat.append(base_salva)
-            i = j
-        else:
-            i += 1
-
-    for inicio, fim, resistencia, suporte, duracao in zonas_flat:
-        fig.add_trace(go.Scatter(x=[inicio, inicio, fim, fim], y=[suporte, resistencia, resistencia, suporte], fill="toself", fillcolor="rgba(255, 255, 255, 0)", line=dict(color="rgba(0,0,0,0)"), hoverinfo="skip", showlegend=False), row=1, col=1)
-        fig.add_trace(go.Scatter(x=[inicio, fim], y=[resistencia, resistencia], mode="lines", line=dict(color="green", width=2, dash="dot"), hoverinfo="skip", showlegend=False), row=1, col=1)
-        fig.add_trace(go.Scatter(x=[inicio, fim], y=[suporte, suporte], mode="lines", line=dict(color="green", width=2, dash="dot"), hoverinfo="skip", showlegend=False), row=1, col=1)
-        variacao_pct = ((resistencia - suporte) / resistencia) * 100
-        fig.add_annotation(x=inicio, y=resistencia, text=f"{resistencia:.2f} | {variacao_pct:.1f}% | {duracao} d ", showarrow=False, font=dict(color="green", size=10), bgcolor="rgba(255, 255, 255, 0)", yanchor="bottom", xanchor="left")
-        # Anotação inferior: suporte
-        fig.add_annotation(x=inicio, y=suporte,text=f"{suporte:.2f}",showarrow=False,font=dict(color="green", size=10),bgcolor="rgba(255, 255, 255, 0)",yanchor="top", xanchor="left")
-
-    try:
-        earnings_df = yf.Ticker(ticker).quarterly_financials.T
-        earnings_dates = [d.strftime('%Y-%m-%d') for d in earnings_df.index]
-        print("Datas earnings:", earnings_dates)
-        print("Datas no gráfico:", df['index_str'].tolist())
-
-
-        for date in earnings_dates:
-            if date in df['index_str'].values:
-                for date in earnings_dates:
-                    if date in df['index_str'].values:
-                        fig.add_shape(
-                            type="line",
-                            x0=date, x1=date,
-                            yref="paper", y0=0, y1=1,
-                            line=dict(color="rgba(128,128,128,0.5)", dash="dot", width=1),
-                        )
-                        fig.add_annotation(
-                            x=date, y=1,
-                            xref="x", yref="paper",
-                            text="", showarrow=False,
-                            font=dict(color="rgba(128,128,128,0.5)", size=10),
-                            xanchor="left"
-                        )
-
-    except Exception as e:
-        print("Erro ao adicionar marcações de earnings:", e)
-
-    return fig
-
-
-
 
+# Benchmark do RS: carregado uma vez por pregão e compartilhado entre sessões
+benchmark = obter_benchmark_por_nome(st.session_state.get("benchmark_rs", BENCHMARK_PADRAO))
 
 
 # ---------------------- FUNÇÕES DE INDICADORES ----------------------
 
-def pine_linreg(series, length):
-    def linreg_last(x):
-        idx = np.arange(length)
-        slope, intercept = np.polyfit(idx, x, 1)
-        return intercept + slope * (length - 1)
-    return series.rolling(length).apply(linreg_last, raw=True)
-
-def calcular_indicadores(df, length=20, momentum_threshold=0.07):
-    df = df.dropna(subset=['Open', 'High', 'Low', 'Close'])
-    df = df[(df['High'] > df['Low']) & (df['Open'] != df['Close'])]
-
-    df['High20'] = df['High'].rolling(length).max().shift(1)
-    df['Low20'] = df['Low'].rolling(length).min()
-    
-    df['SMA20'] = df['Close'].rolling(20).mean()
-    df['SMA50'] = df['Close'].rolling(50).mean()
-    df['SMA150'] = df['Close'].rolling(150).mean()
-    df['SMA200'] = df['Close'].rolling(200).mean()
-    df['EMA20'] = df['Close'].ewm(span=20, adjust=False).mean()
-    
-    centro = ((df['High20'] + df['Low20']) / 2 + df['Close'].rolling(length).mean()) / 2
-    df['linreg_close'] = pine_linreg(df['Close'], length)
-    df['momentum'] = df['linreg_close'] - centro
-    df['momentum_up'] = (df['momentum'].shift(1) <= 0) & (df['momentum'] > momentum_threshold)
-    df['rompe_resistencia'] = df['Close'] > df['High20']
-    df['suporte'] = df['Low'].rolling(length).min()
-    return df
-
-
-def detectar_vcp(df):
-    if 'Volume' not in df.columns or len(df) < 40:
-        return False
-
-    closes = df['Close']
-    highs = df['High']
-    lows = df['Low']
-    volumes = df['Volume']
-    sma50 = closes.rolling(50).mean()
-
-    # 1. Dois pivôs descendentes
-    max1 = highs[-40:-20].max()
-    max2 = highs[-20:].max()
-    if pd.isna(max1) or pd.isna(max2) or not (max1 > max2):
-        return False
-
-    min1 = lows[-40:-20].min()
-    min2 = lows[-20:].min()
-    if pd.isna(min1) or pd.isna(min2) or not (min1 < min2):
-        return False
-
-    # 2. Volume médio geral caindo
-    vol_ant = volumes[-40:-20].mean()
-    vol_rec = volumes[-20:].mean()
-    if pd.isna(vol_ant) or pd.isna(vol_rec) or not (vol_ant > vol_rec):
-        return False
-
-    # 3. Range (amplitude) caindo
-    range_ant = (highs[-40:-20] - lows[-40:-20]).mean()
-    range_rec = (highs[-20:] - lows[-20:]).mean()
-    if pd.isna(range_ant) or pd.isna(range_rec) or not (range_ant > range_rec):
-        return False
-
-    # 4. Preço ao menos na média de 50
-    if pd.isna(sma50.iloc[-1]) or closes.iloc[-1] < sma50.iloc[-1] * 0.97:
-        return False
-
-    return True
-
-
-def calcular_pivot_points(df):
-    high = df['High'].iloc[-2]
-    low = df['Low'].iloc[-2]
-    close = df['Close'].iloc[-2]
-    PP = (high + low + close) / 3
-    R1 = 2 * PP - low
-    S1 = 2 * PP - high
-    R2 = PP + (R1 - S1)
-    S2 = PP - (R1 - S1)
-    R3 = high + 2 * (PP - low)
-    S3 = low - 2 * (high - PP)
-    return PP, [S1, S2, S3], [R1, R2, R3]
-
-def classificar_tendencia(close):
-    x = np.arange(len(close))
-    slope, _ = np.polyfit(x, close, 1)
-    if slope > 0.05:
-        return "Alta"
-    elif slope < -0.05:
-        return "Baixa"
-    else:
-        return "Lateral"
-
-
-
-# --- Função de análise IA aprimorada ---
-def gerar_comentario(df,tendencia, vcp):
-    comentario = "📊 Ativo em zona de observação técnica"
-
-    sinais = []
-    if df['momentum_up'].iloc[-1]:
-        sinais.append("Momentum")
-    if df['rompe_resistencia'].iloc[-1]:
-        sinais.append("Rompimento")
-    if vcp:
-        sinais.append("Padrão VCP")
-
-    if sinais:
-        comentario += f"\n📈 Sinais técnicos: {', '.join(sinais)}"
-
-    return comentario
-
-
-def get_quarterly_growth_table_yfinance(ticker):
-    ticker_obj = yf.Ticker(ticker)
-    df = ticker_obj.quarterly_financials.T
-
-    if df.empty or "Total Revenue" not in df.columns or "Net Income" not in df.columns:
-        return None
-
-    df = df[["Total Revenue", "Net Income"]].dropna()
-    df.sort_index(ascending=False, inplace=True)
-
-    rows = []
-    for i in range(5):  # agora inclui 5 trimestres
-        try:
-            atual = df.iloc[i]
-            trimestre_data = df.index[i].date()
-            receita_atual = atual["Total Revenue"]
-            lucro_atual = atual["Net Income"]
-
-            receita_pct = None
-            lucro_pct = None
-            if i + 4 < len(df):
-                receita_ant = df.iloc[i + 4]["Total Revenue"]
-                lucro_ant = df.iloc[i + 4]["Net Income"]
-                if receita_ant:
-                    receita_pct = (receita_atual - receita_ant) / receita_ant * 100
-                if lucro_ant:
-                    lucro_pct = (lucro_atual - lucro_ant) / abs(lucro_ant) * 100
-
-            margem = (lucro_atual / receita_atual) * 100 if receita_atual else None
-
-            def fmt_pct(val):
-                if val is None:
-                    return ""
-                emoji = " 🚀" if val > 18 else ""
-                return f"{val:+.1f}%{emoji}"
-
-            rows.append({
-                "Trimestre": trimestre_data.strftime("%b %Y"),
-                "Receita (B)": f"${receita_atual / 1e9:.2f}B",
-                "Receita YoY": fmt_pct(receita_pct),
-                "Lucro (B)": f"${lucro_atual / 1e9:.2f}B",
-                "Lucro YoY": fmt_pct(lucro_pct),
-                "Margem (%)": f"{margem:.1f}%" if margem is not None else ""
-            })
-        except Exception:
-            continue
-
-    df_final = pd.DataFrame(rows).set_index("Trimestre")
-    return df_final
-
-
-
 
 with st.expander("Expandir/Minimizar Filtros", expanded=True):
     col1, col2, col3, col4 = st.columns(4)
@@ -556,7 +149,10 @@ with st.expander("Expandir/Minimizar Filtros", expanded=True):
                     "sma200": st.session_state.get("filtro_sma200", "Any"),
                     "ordenamento": st.session_state.get("ordenamento", False),
                     "sma200_crescente": st.session_state.get("sma200_crescente", False),
-                    "mostrar_vcp": st.session_state.get("mostrar_vcp", False)
+                    "mostrar_vcp": st.session_state.get("mostrar_vcp", False),
+                    "candles_vcp": st.session_state.get("candles_vcp", 1),
+                    "base_plana": st.session_state.get("base_plana", False),
+                    "amplitude_base": st.session_state.get("amplitude_base", 20)
                 }
 
                 uid = st.session_state.user["localId"]  # ou como estiver salvo seu user ID
@@ -597,7 +193,10 @@ with st.expander("Expandir/Minimizar Filtros", expanded=True):
                     "filtro_sma200": filtro_data["sma200"],
                     "ordenamento": filtro_data.get("ordenamento", False),
                     "sma200_crescente": filtro_data.get("sma200_crescente", False),
-                    "mostrar_vcp": filtro_data.get("mostrar_vcp", False)
+                    "mostrar_vcp": filtro_data.get("mostrar_vcp", False),
+                    "candles_vcp": filtro_data.get("candles_vcp", 1),
+                    "base_plana": filtro_data.get("base_plana", False),
+                    "amplitude_base": filtro_data.get("amplitude_base", 20)
                 })
                   # 🔒 Salva o filtro carregado para permitir exclusão posterior
                 st.session_state.filtro_a_excluir = opcao_selecionada_para_carregar
@@ -632,7 +231,10 @@ with st.expander("Expandir/Minimizar Filtros", expanded=True):
                 "filtro_sma200": "Any",
                 "ordenamento": False,
                 "sma200_crescente": False,
-                "mostrar_vcp": False
+                "mostrar_vcp": False,
+                "candles_vcp": 1,
+                "base_plana": False,
+                "amplitude_base": 20
                 # Also reset any other state variables related to filter inputs if necessary
             })
             st.success("Filtros de tela limpos. Selecione novos valores.")
@@ -647,6 +249,12 @@ with st.expander("Expandir/Minimizar Filtros", expanded=True):
         threshold = st.slider("⚡ Limite de momentum", 0.01, 0.2, 0.07, key="threshold_momentum") # Added key
         dias_breakout = st.slider("📈 Breakout da máxima dos últimos X dias", 5, 252, 20, key="dias_breakout") # Added key
         lookback = st.slider("📊 Candles recentes analisados", 3, 10, 5, key="lookback_candles") # Added key
+        workers_scan = st.slider("🧵 Ativos analisados em paralelo", 1, 32, WORKERS_PADRAO, key="workers_scan")
+        taxa_yahoo = st.slider("⏱️ Limite de requisições/s ao Yahoo", 1, 20, CHAMADAS_POR_SEGUNDO_PADRAO, key="taxa_yahoo")
+        graficos_sob_demanda = st.checkbox("🖼️ Gráficos sob demanda (tabela primeiro)", value=st.session_state.get("graficos_sob_demanda", True), key="graficos_sob_demanda")
+        usar_snapshot = st.checkbox("🗂️ Usar sinais do último fechamento (snapshot)", value=st.session_state.get("usar_snapshot", True), key="usar_snapshot")
+        modo_rs = st.selectbox("💪 RS Rating", MODOS_RS, index=MODOS_RS.index(PRESET_PADRAO["modo_rs"]), key="modo_rs")
+        st.selectbox("📊 Benchmark do RS", list(BENCHMARKS), index=list(BENCHMARKS).index(BENCHMARK_PADRAO), key="benchmark_rs")
 
     with col3:
         performance = st.selectbox("📈 Performance", [ 'Any', 'Today Up', 'Today Down', 'Today -15%', 'Today -10%', 'Today -5%', 'Today +5%', 'Today +10%', 'Today +15%',
@@ -676,6 +284,9 @@ with st.expander("Expandir/Minimizar Filtros", expanded=True):
         ordenamento_mm = st.checkbox("🖐 EMA20 > SMA50 > SMA150 > SMA200", value=st.session_state.get("ordenamento", False), key="ordenamento")
         sma200_crescente = st.checkbox("📈 SMA200 maior que há 30 dias", value=st.session_state.get("sma200_crescente", False), key="sma200_crescente")
         mostrar_vcp = st.checkbox("🔍 Mostrar apenas ativos com padrão VCP", value=st.session_state.get("mostrar_vcp", False), key="mostrar_vcp")
+        candles_vcp = st.slider("🕒 VCP nos últimos N candles", 1, 60, st.session_state.get("candles_vcp", 1), key="candles_vcp")
+        base_plana = st.checkbox("📦 Mostrar apenas ativos em base plana", value=st.session_state.get("base_plana", False), key="base_plana")
+        amplitude_base = st.slider("📏 Amplitude máxima da base (%)", 5, 30, st.session_state.get("amplitude_base", 20), key="amplitude_base")
 
     if "executar_busca" not in st.session_state:
         st.session_state.executar_busca = False
@@ -718,179 +329,57 @@ if current_sma200_filter and current_sma200_filter != "Any":
 filtros_aplicados_str_legivel = f"Sinal: {st.session_state.get('filtro_sinal', 'Nenhum')}, Perf.: {filters_dict.get('Performance', '')}, Volume: {filters_dict.get('Average Volume', '')}"
 
 
-def inserir_preco_no_meio(niveis: list, preco: float) -> pd.DataFrame:
-    df = pd.DataFrame(niveis)
-    df["Valor"] = df["Valor"].map(lambda x: float(f"{x:.2f}"))
-    df["DistânciaReal"] = (df["Valor"] - preco) / preco
-    df["Distância"] = (df["DistânciaReal"] * 100).map("{:+.2f}%".format)
-    df["Valor"] = df["Valor"].map("{:.2f}".format)
-    df.drop(columns=["DistânciaReal"], inplace=True)
-    df = df.dropna(how="any")
-
-    df_temp = df.copy()
-    df_temp["Valor_float"] = df_temp["Valor"].astype(float)
-
-    inserido = False
-    linhas_ordenadas = []
-
-    for _, row in df_temp.sort_values(by="Valor_float", ascending=False).iterrows():
-        if not inserido and float(row["Valor"]) < preco:
-            linhas_ordenadas.append({
-                "Nível": "💰 Preço Atual",
-                "Valor": f"{preco:.2f}",
-                "Distância": "{:+.2f}%".format(0)
-            })
-            inserido = True
-        linhas_ordenadas.append(row[["Nível", "Valor", "Distância"]].to_dict())
-
-    if not inserido:
-        linhas_ordenadas.append({
-            "Nível": "💰 Preço Atual",
-            "Valor": f"{preco:.2f}",
-            "Distância": "{:+.2f}%".format(0)
-        })
-
-    df_final = pd.DataFrame(linhas_ordenadas).set_index("Nível")
-    return df_final
-
-
-
-
 if "recarregar_tickers" in st.session_state:
     tickers = st.session_state.pop("recarregar_tickers")
+    # Mesmo modo de RS da busca salva (buscas antigas não guardavam: usa o selecionado)
+    modo_rs_recarga = st.session_state.pop("recarregar_modo_rs", None) or modo_rs
+    modos_usados = set()
     st.session_state.recomendacoes = []
+    analises_recarga = {}
 
     progress_recarregar = st.progress(0)
     status_text_recarregar = st.empty()
 
-    def highlight_niveis(row):
-        nivel = row.name
-        if "Preço Atual" in nivel:
-            return ["background-color: #fff3b0; font-weight: bold;"] * len(row)
-        elif "🔺" in nivel:
-            return ["color: #1f77b4; font-weight: bold;"] * len(row)
-        elif "🔻" in nivel:
-            return ["color: #2ca02c; font-weight: bold;"] * len(row)
-        elif any(tag in nivel for tag in ["🟣", "📏", "📈", "📉"]):
-            return ["color: #9467bd; font-style: italic;"] * len(row)
-        return [""] * len(row)
 
+    with st.spinner(f"📥 Baixando histórico de {len(tickers)} ativos..."):
+        dados_tickers = carregar_historico(tickers)
+        painel = calcular_indicadores_painel(montar_painel(dados_tickers), dias_breakout, threshold) if dados_tickers else None
 
     for i, ticker in enumerate(tickers):
         status_text_recarregar.text(f"🔁 Recarregando {ticker} ({i+1}/{len(tickers)})...")
         try:
-            df = yf.download(ticker, period="18mo", interval="1d", progress=False)
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.droplevel(1)
-            df = calcular_indicadores(df, dias_breakout, threshold)
+            if painel is not None and ticker in dados_tickers:
+                df = visao_ticker(painel, ticker)
+            else:
+                df = obter_indicadores(ticker, baixar_ticker(ticker), dias_breakout, threshold)
 
             try:
-                rs_rating = calcular_rs_rating(df, df_spy)
+                df["RS_Rating"], modo_usado = rating_rs(df, modo_rs_recarga, benchmark)
+                modos_usados.add(modo_usado)
             except Exception as e:
                 st.warning(f"{ticker} com erro no RS Rating: {e}")
                 continue
 
-            df["RS_Rating"] = rs_rating if rs_rating is not None else np.nan
-
-            vcp_detectado = detectar_vcp(df)
-            nome = yf.Ticker(ticker).info.get("shortName", ticker)
+            df['VCP'] = sinal_vcp(df)
+            vcp_detectado = bool(df['VCP'].iloc[-1])
+            nome = obter_nome(ticker)
             tendencia = classificar_tendencia(df['Close'].tail(20))
             comentario = gerar_comentario(df,tendencia, vcp_detectado)
             earnings_str, _, _ = get_earnings_info_detalhado(ticker)
 
-            with st.container():
-                st.subheader(f"{ticker} - {nome}")
-                # Botão de Favoritar sem loop/rerun
-                
-                col1, col2 = st.columns([3, 2])
-                with col1:
-                    with st.spinner(f"📊 Carregando gráfico de {ticker}..."):
-                        fig = plot_ativo(df, ticker, nome, vcp_detectado)
-                        st.plotly_chart(fig, use_container_width=True, key=f"plot_reload_{ticker}")
-                with col2:
-                    st.markdown(comentario)
-                    st.markdown(f"📅 **Resultado:** {earnings_str}")
-
-                    rs_val = df["RS_Rating"].iloc[-1] if "RS_Rating" in df.columns else None
-                    if rs_val is not None and not pd.isna(rs_val):
-                        st.markdown(f"💪 RS Rating (1 a 99): **{int(rs_val)}**")
-                    else:
-                        st.markdown("💪 RS Rating: ❌ Não disponível")
-
-                    preco = df["Close"].iloc[-1]
-
-                    dist_sma20 = (preco - df["SMA20"].iloc[-1]) / preco * 100
-                    dist_sma50 = (preco - df["SMA50"].iloc[-1]) / preco * 100
-                    dist_sma200 = (preco - df["SMA200"].iloc[-1]) / preco * 100
-                    dist_max52 = (preco - df["High"].rolling(252).max().iloc[-1]) / preco * 100
-                    dist_min52 = (preco - df["Low"].rolling(252).min().iloc[-1]) / preco * 100
-
-
-
-                    preco = df["Close"].iloc[-1]
-                    PP, suportes, resistencias = calcular_pivot_points(df)
-                    dists_resist = [(r, ((r - preco) / preco) * 100) for r in resistencias]
-                    dists_suportes = [(s, ((s - preco) / preco) * 100) for s in suportes]
-
-                    resist_ordenado = sorted([r for r in dists_resist if r[0] > preco], key=lambda x: x[0])[:3]
-                    suporte_ordenado = sorted([s for s in dists_suportes if s[0] < preco], key=lambda x: -x[0])[:3]
-
-                    niveis = []
-
-                    for i, (valor, _) in enumerate(resist_ordenado):
-                        niveis.append({"Nível": f"🔺 {i + 1}ª Resistência", "Valor": valor})
-
-                    for i, (valor, _) in enumerate(suporte_ordenado):
-                        niveis.append({"Nível": f"🔻 {i + 1}º Suporte", "Valor": valor})
-
-                    swing_high = df["High"].rolling(40).max().iloc[-1]
-                    swing_low = df["Low"].rolling(40).min().iloc[-1]
-                    retracao_382 = swing_high - (swing_high - swing_low) * 0.382
-                    retracao_618 = swing_high - (swing_high - swing_low) * 0.618
-
-                    indicadores = {
-                        "SMA 20": df["SMA20"].iloc[-1],
-                        "SMA 50": df["SMA50"].iloc[-1],
-                        "SMA 150": df["SMA150"].iloc[-1],
-                        "SMA 200": df["SMA200"].iloc[-1],
-                        "Máxima 52s": df["High"].rolling(252).max().iloc[-1],
-                        "Mínima 52s": df["Low"].rolling(252).min().iloc[-1],
-                        "Retração 38.2% (últ. 40d)": retracao_382,
-                        "Retração 61.8% (últ. 40d)": retracao_618
-                    }
-
-                    for nome_ind, valor in indicadores.items():
-                        if "SMA" in nome_ind:
-                            nivel_nome = f"🟣 {nome_ind}"
-                        elif "Retração" in nome_ind:
-                            nivel_nome = f"📏 {nome_ind}"
-                        elif "Máxima" in nome_ind:
-                            nivel_nome = f"📈 {nome_ind}"
-                        elif "Mínima" in nome_ind:
-                            nivel_nome = f"📉 {nome_ind}"
-                        else:
-                            nivel_nome = nome_ind
-                        niveis.append({"Nível": nivel_nome, "Valor": valor})
-
-                    df_niveis = inserir_preco_no_meio(niveis, preco)
-                    
-                    def highlight_niveis(row):
-                        nivel = row.name
-                        if "Preço Atual" in nivel:
-                            return ["background-color: #fff3b0; font-weight: bold;"] * len(row)
-                        elif "🔺" in nivel:
-                            return ["color: #1f77b4; font-weight: bold;"] * len(row)
-                        elif "🔻" in nivel:
-                            return ["color: #2ca02c; font-weight: bold;"] * len(row)
-                        elif any(tag in nivel for tag in ["🟣", "📏", "📈", "📉"]):
-                            return ["color: #9467bd; font-style: italic;"] * len(row)
-                        return [""] * len(row)
-
-                    styled_table = df_niveis.style.apply(highlight_niveis, axis=1)
-                    st.dataframe(styled_table, use_container_width=True, height=565)
-                    df_resultado = get_quarterly_growth_table_yfinance(ticker)
-                    
-                    
+            # Gráfico e histórico trimestral ficam para renderizar_resultado, como no scan
+            analises_recarga[ticker] = {
+                "df": df,
+                "nome": nome,
+                "vcp": vcp_detectado,
+                "tendencia": tendencia,
+                "comentario": comentario,
+                "earnings": earnings_str,
+                "fig": None,
+                "crescimento": None,
+            }
+
+            rs_val = df["RS_Rating"].iloc[-1] if "RS_Rating" in df.columns else None
             preco = df["Close"].iloc[-1]
             dist_sma20 = (preco - df["SMA20"].iloc[-1]) / preco * 100
             dist_sma50 = (preco - df["SMA50"].iloc[-1]) / preco * 100
@@ -899,7 +388,6 @@ if "recarregar_tickers" in st.session_state:
             dist_min52 = (preco - df["Low"].rolling(252).min().iloc[-1]) / preco * 100
 
 
-
             st.session_state.recomendacoes.append({
                 "Ticker": ticker,
                 "Empresa": nome,
@@ -916,203 +404,220 @@ if "recarregar_tickers" in st.session_state:
             })
         except Exception as e:
             st.warning(f"Erro ao recarregar {ticker}: {e}")
-            progress_recarregar.progress(min((i + 1) / max(1, len(tickers)), 1.0))
+        progress_recarregar.progress(min((i + 1) / max(1, len(tickers)), 1.0))
 
     status_text_recarregar.empty()
     progress_recarregar.empty()
+    if modos_usados - {modo_rs_recarga}:
+        st.info("💪 Sem distribuição recente do universo para parte dos ativos: o RS Rating deles é a tabela vs benchmark.")
+    # Fica na sessão: a seleção de linhas da tabela reexecuta a página
+    st.session_state.recarga = {"recomendacoes": list(st.session_state.recomendacoes), "analises": analises_recarga}
+
+
+# Cartão de um ativo aprovado no scan. No modo sob demanda o scan não monta
+# gráfico nem histórico trimestral: eles são feitos aqui, só para o que for aberto.
+def renderizar_resultado(ticker, analise, prefixo_chave="plot"):
+    df = analise["df"]
+    nome = analise["nome"]
+    comentario = analise["comentario"]
+    earnings_str = analise["earnings"]
+    if analise.get("fig") is None:
+        with st.spinner(f"📊 Carregando gráfico de {ticker}..."):
+            analise["fig"] = plot_ativo(df, ticker, nome, analise["vcp"])
+            analise["crescimento"] = get_quarterly_growth_table_yfinance(ticker)
+
+    with st.container():
+        st.subheader(f"{ticker} - {nome}")
+        col1, col2 = st.columns([3, 2])
+
+        with col1:
+            with trecho("Render (st.plotly_chart)"):
+                st.plotly_chart(analise["fig"], use_container_width=True, key=f"{prefixo_chave}_{ticker}")
+
+        with col2:
+            st.markdown(comentario)
+            st.markdown(f"📅 **Resultado:** {earnings_str}")
+
+            rs_val = df["RS_Rating"].iloc[-1] if "RS_Rating" in df.columns else None
+            if rs_val is not None and not pd.isna(rs_val):
+                st.markdown(f"💪 RS Rating (1 a 99): **{int(rs_val)}**")
+            else:
+                st.markdown("💪 RS Rating: ❌ Não disponível")
 
+            preco = df["Close"].iloc[-1]
+            PP, suportes, resistencias = calcular_pivot_points(df)
+            dists_resist = [(r, ((r - preco) / preco) * 100) for r in resistencias]
+            dists_suportes = [(s, ((s - preco) / preco) * 100) for s in suportes]
+
+            resist_ordenado = sorted([r for r in dists_resist if r[0] > preco], key=lambda x: x[0])[:3]
+            suporte_ordenado = sorted([s for s in dists_suportes if s[0] < preco], key=lambda x: -x[0])[:3]
+
+            niveis = []
+
+            for i, (valor, _) in enumerate(resist_ordenado):
+                niveis.append({"Nível": f"🔺 {i + 1}ª Resistência", "Valor": valor})
+
+            for i, (valor, _) in enumerate(suporte_ordenado):
+                niveis.append({"Nível": f"🔻 {i + 1}º Suporte", "Valor": valor})
+
+            swing_high = df["High"].rolling(40).max().iloc[-1]
+            swing_low = df["Low"].rolling(40).min().iloc[-1]
+            retracao_382 = swing_high - (swing_high - swing_low) * 0.382
+            retracao_618 = swing_high - (swing_high - swing_low) * 0.618
+
+            indicadores = {
+                "SMA 20": df["SMA20"].iloc[-1],
+                "SMA 50": df["SMA50"].iloc[-1],
+                "SMA 150": df["SMA150"].iloc[-1],
+                "SMA 200": df["SMA200"].iloc[-1],
+                "Máxima 52s": df["High"].rolling(252).max().iloc[-1],
+                "Mínima 52s": df["Low"].rolling(252).min().iloc[-1],
+                "Retração 38.2% (últ. 40d)": retracao_382,
+                "Retração 61.8% (últ. 40d)": retracao_618
+            }
 
+            for nome_ind, valor in indicadores.items():
+                if "SMA" in nome_ind:
+                    nivel_nome = f"🟣 {nome_ind}"
+                elif "Retração" in nome_ind:
+                    nivel_nome = f"📏 {nome_ind}"
+                elif "Máxima" in nome_ind:
+                    nivel_nome = f"📈 {nome_ind}"
+                elif "Mínima" in nome_ind:
+                    nivel_nome = f"📉 {nome_ind}"
+                else:
+                    nivel_nome = nome_ind
+                niveis.append({"Nível": nivel_nome, "Valor": valor})
 
+            df_niveis = inserir_preco_no_meio(niveis, preco)
 
 
+            styled_table = df_niveis.style.apply(highlight_niveis, axis=1)
+            st.dataframe(styled_table, use_container_width=True, height=565)
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-if st.session_state.get("executar_busca", False):
-    st.session_state.recomendacoes = []
-
-    status_text = st.empty()
-    progress_bar = st.progress(0)
-    f = io.StringIO()
-
-    with redirect_stdout(f), redirect_stderr(f):
-        with st.spinner("Buscando ativos..."):
-            screener = Overview()
-            screener.set_filter(filters_dict=filters_dict)
-            tickers_df = screener.screener_view()
-
-            if tickers_df is None or tickers_df.empty or 'Ticker' not in tickers_df.columns:
-                st.warning("⚠️ Nenhum ticker retornado com os filtros selecionados.")
-                st.stop()
-
-    log_output = f.getvalue()
-    matches = re.findall(r'loading page.*?\[(.*?)\].*?(\d+)/(\d+)', log_output)
-    st.info(f"🔎 Filtros Aplicados: {filters_dict}")
-
-    if matches:
-        current, total = map(int, matches[-1][1:])
-        percent = current / total
-        progress_bar.progress(percent)
+            df_resultado = analise["crescimento"]
+            if df_resultado is not None:
+                st.markdown("📊 **Histórico Trimestral (YoY)**")
+                st.table(df_resultado)
+            else:
+                st.warning("❌ Histórico de crescimento YoY não disponível.")
+
+
+# Busca recarregada do histórico: tabela primeiro e cartões pelo mesmo renderizar_resultado do scan
+if st.session_state.get("recarga") and st.session_state.recarga["recomendacoes"]:
+    recarga = st.session_state.recarga
+    st.subheader("🔁 Busca recarregada")
+    df_recarga = pd.DataFrame(recarga["recomendacoes"])
+    if graficos_sob_demanda:
+        st.caption("Selecione uma ou mais linhas para abrir o gráfico e os níveis do ativo.")
+        selecao_recarga = st.dataframe(df_recarga, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row", key="tabela_recarga")
+        tickers_recarga = [df_recarga.iloc[linha]["Ticker"] for linha in selecao_recarga.selection.rows]
     else:
-        status_text.text("✅ Ativos carregados.")
+        st.dataframe(df_recarga, use_container_width=True)
+        tickers_recarga = list(df_recarga["Ticker"])
+    for ticker_sel in tickers_recarga:
+        if ticker_sel in recarga["analises"]:
+            renderizar_resultado(ticker_sel, recarga["analises"][ticker_sel], prefixo_chave="plot_reload")
+
+
+# Corpo do scan: roda numa thread do gerenciador de jobs (Screener.jobs), fora
+# do ciclo de reruns da página. Nada de st.* aqui: progresso, avisos e
+# resultados parciais ficam no job e a página só os lê.
+def executar_scan(job, p):
+    job.definir_etapa("Buscando ativos no Finviz...")
+    # Mesmo filtro nos últimos minutos (de qualquer usuário) não consulta o Finviz de novo
+    tickers_df, finviz_do_cache = buscar_screener(p["filters_dict"])
+    if tickers_df is None or tickers_df.empty or 'Ticker' not in tickers_df.columns:
+        job.avisar("⚠️ Nenhum ticker retornado com os filtros selecionados.")
+        return
+    if finviz_do_cache:
+        job.informar("♻️ Lista de ativos reaproveitada de uma busca recente com os mesmos filtros.")
 
     tickers = tickers_df['Ticker'].tolist()
-    st.success(f"✅ {len(tickers)} ativos carregados.")
-
-    progress = st.progress(0)
-    status_text = st.empty()
+    job.informar(f"✅ {len(tickers)} ativos carregados.")
+    job.verificar_cancelamento()
+
+    # Histórico local + download agrupado apenas do que falta, RS do universo e
+    # filtros vetorizados em etapas (mesmo motor da linha de comando, Screener.scan)
+    job.definir_etapa(f"📥 Baixando histórico e calculando indicadores de {len(tickers)} ativos...")
+    etapas = montar_etapas(**p["filtros_etapas"])
+    dias_breakout, threshold = p["dias_breakout"], p["threshold"]
+    # Snapshot do último fechamento: as etapas rodam na tabela pronta do universo
+    snapshot = obter_snapshot(dias_breakout, threshold) if p["usar_snapshot"] else None
+    if snapshot is not None:
+        job.informar(f"🗂️ Sinais do fechamento de {snapshot['data_pregao']} (snapshot); gráficos com dados atuais.")
+    painel, ratings_universo, tickers_analise, descartes = preparar_universo(
+        tickers, etapas, dias_breakout, threshold, snapshot, universo_completo=eh_universo_completo(p["filters_dict"]),
+        verificar_cancelamento=job.verificar_cancelamento)
+    if descartes:
+        job.informar("⚡ Descartados antes da análise: " + ", ".join(f"{nome_etapa}: {n}" for nome_etapa, n in descartes.items()))
+    job.verificar_cancelamento()
+
+    limitar_yahoo = criar_limitador(p["taxa_yahoo"])
+    benchmark_scan = p["benchmark"]
+
+    # Roda em threads do pool; avisos voltam no resultado. Só as buscas de rede de
+    # fato (metadados e histórico fora do cache) esperam o limitador do Yahoo
+    def analisar_ticker(ticker):
+        with usar_limitador(limitar_yahoo), trecho(ETAPA_TICKER, ticker=ticker):
+            return analisar(ticker)
+
+    def analisar(ticker):
+        avisos = []
+        df = dados_ticker(ticker, painel, etapas, dias_breakout, threshold)
+        if df is None:
+            return {"aprovado": False, "avisos": avisos}
 
-    for i, ticker in enumerate(tickers):
-        status_text.text(f"🔍 Analisando {ticker} ({i+1}/{len(tickers)})...")
-      
         try:
-            df = yf.download(ticker, period="18mo", interval="1d", progress=False)
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.droplevel(1)
-            df = calcular_indicadores(df, dias_breakout, threshold)
-            try:
-                df['RS_Rating'] = calcular_rs_rating(df, df_spy)
-            except Exception as e:
-                st.warning(f"⚠️ Erro ao calcular RS Rating para {ticker}: {e}")
-                df['RS_Rating'] = np.nan
-
-            if ordenamento_mm and not (df['EMA20'].iloc[-1] > df['SMA50'].iloc[-1] > df['SMA150'].iloc[-1] > df['SMA200'].iloc[-1]):
-                continue
-
-            if sma200_crescente and (len(df) < 30 or df['SMA200'].iloc[-1] <= df['SMA200'].iloc[-30]):
-                continue
-
-            momentum_cond = df['momentum_up'].iloc[-lookback:].any()
-            breakout_cond = df['rompe_resistencia'].iloc[-lookback:].any()
-            ambos_cond = momentum_cond and breakout_cond
-
-            vcp_detectado = detectar_vcp(df)
-            if mostrar_vcp and not vcp_detectado:
-                continue
-
-            match sinal:
-                case "Momentum": cond = momentum_cond
-                case "Breakout": cond = breakout_cond
-                case "Momentum + Breakout": cond = ambos_cond
-                case "Nenhum": cond = True
+            df['RS_Rating'], _ = rating_rs(df, p["modo_rs"], benchmark_scan, ratings_universo, ticker)
+        except Exception as e:
+            avisos.append(f"⚠️ Erro ao calcular RS Rating para {ticker}: {e}")
+            df['RS_Rating'] = np.nan
+
+        # Sinal de VCP barra a barra: a última barra equivale a detectar_vcp
+        garantir_colunas(df, ["VCP"])
+        vcp_detectado = bool(df['VCP'].iloc[-1])
+
+        nome = obter_nome(ticker)
+        tendencia = classificar_tendencia(df['Close'].tail(20))
+        comentario = gerar_comentario(df, tendencia, vcp_detectado)
+        earnings_str, _, _ = get_earnings_info_detalhado(ticker)
+        fig = df_resultado = None
+        if not p["graficos_sob_demanda"]:
+            fig = plot_ativo(df, ticker, nome, vcp_detectado)
+            df_resultado = get_quarterly_growth_table_yfinance(ticker)
+
+        return {
+            "aprovado": True,
+            "avisos": avisos,
+            "df": df,
+            "nome": nome,
+            "vcp": vcp_detectado,
+            "tendencia": tendencia,
+            "comentario": comentario,
+            "earnings": earnings_str,
+            "fig": fig,
+            "crescimento": df_resultado,
+        }
+
+    # Resultados chegam na ordem em que terminam; o cancelamento interrompe o
+    # gerador, que descarta o que ainda estava na fila do pool
+    job.definir_etapa("🔍 Analisando...", total=len(tickers_analise))
+    for ticker, analise, erro in executar_em_paralelo(analisar_ticker, tickers_analise, max_workers=p["workers_scan"]):
+        job.avancar(ticker)
+        if job.cancelado:
+            break
 
-            if not cond:
+        try:
+            if erro is not None:
+                raise erro
+            for aviso in analise["avisos"]:
+                job.avisar(aviso)
+            if not analise["aprovado"]:
                 continue
 
-            nome = yf.Ticker(ticker).info.get("shortName", ticker)
-
-            
-            tendencia = classificar_tendencia(df['Close'].tail(20))
-            comentario = gerar_comentario(df, tendencia, vcp_detectado)
-            earnings_str, _, _ = get_earnings_info_detalhado(ticker)
-
-            with st.container():
-                st.subheader(f"{ticker} - {nome}")
-                col1, col2 = st.columns([3, 2])
-
-                with col1:
-                    with st.spinner(f"📊 Carregando gráfico de {ticker}..."):
-                        fig = plot_ativo(df, ticker, nome, vcp_detectado)
-                        st.plotly_chart(fig, use_container_width=True, key=f"plot_{ticker}")
-
-                with col2:
-                    st.markdown(comentario)
-                    st.markdown(f"📅 **Resultado:** {earnings_str}")
-
-                    rs_val = df["RS_Rating"].iloc[-1] if "RS_Rating" in df.columns else None
-                    if rs_val is not None and not pd.isna(rs_val):
-                        st.markdown(f"💪 RS Rating (1 a 99): **{int(rs_val)}**")
-                    else:
-                        st.markdown("💪 RS Rating: ❌ Não disponível")
-
-                    preco = df["Close"].iloc[-1]
-                    PP, suportes, resistencias = calcular_pivot_points(df)
-                    dists_resist = [(r, ((r - preco) / preco) * 100) for r in resistencias]
-                    dists_suportes = [(s, ((s - preco) / preco) * 100) for s in suportes]
-
-                    resist_ordenado = sorted([r for r in dists_resist if r[0] > preco], key=lambda x: x[0])[:3]
-                    suporte_ordenado = sorted([s for s in dists_suportes if s[0] < preco], key=lambda x: -x[0])[:3]
-
-                    niveis = []
-
-                    for i, (valor, _) in enumerate(resist_ordenado):
-                        niveis.append({"Nível": f"🔺 {i + 1}ª Resistência", "Valor": valor})
-
-                    for i, (valor, _) in enumerate(suporte_ordenado):
-                        niveis.append({"Nível": f"🔻 {i + 1}º Suporte", "Valor": valor})
-
-                    swing_high = df["High"].rolling(40).max().iloc[-1]
-                    swing_low = df["Low"].rolling(40).min().iloc[-1]
-                    retracao_382 = swing_high - (swing_high - swing_low) * 0.382
-                    retracao_618 = swing_high - (swing_high - swing_low) * 0.618
-
-                    indicadores = {
-                        "SMA 20": df["SMA20"].iloc[-1],
-                        "SMA 50": df["SMA50"].iloc[-1],
-                        "SMA 150": df["SMA150"].iloc[-1],
-                        "SMA 200": df["SMA200"].iloc[-1],
-                        "Máxima 52s": df["High"].rolling(252).max().iloc[-1],
-                        "Mínima 52s": df["Low"].rolling(252).min().iloc[-1],
-                        "Retração 38.2% (últ. 40d)": retracao_382,
-                        "Retração 61.8% (últ. 40d)": retracao_618
-                    }
-
-                    for nome_ind, valor in indicadores.items():
-                        if "SMA" in nome_ind:
-                            nivel_nome = f"🟣 {nome_ind}"
-                        elif "Retração" in nome_ind:
-                            nivel_nome = f"📏 {nome_ind}"
-                        elif "Máxima" in nome_ind:
-                            nivel_nome = f"📈 {nome_ind}"
-                        elif "Mínima" in nome_ind:
-                            nivel_nome = f"📉 {nome_ind}"
-                        else:
-                            nivel_nome = nome_ind
-                        niveis.append({"Nível": nivel_nome, "Valor": valor})
-
-                    df_niveis = inserir_preco_no_meio(niveis, preco)
-
-                    def highlight_niveis(row):
-                        nivel = row.name
-                        if "Preço Atual" in nivel:
-                            return ["background-color: #fff3b0; font-weight: bold;"] * len(row)
-                        elif "🔺" in nivel:
-                            return ["color: #1f77b4; font-weight: bold;"] * len(row)
-                        elif "🔻" in nivel:
-                            return ["color: #2ca02c; font-weight: bold;"] * len(row)
-                        elif any(tag in nivel for tag in ["🟣", "📏", "📈", "📉"]):
-                            return ["color: #9467bd; font-style: italic;"] * len(row)
-                        return [""] * len(row)
-
-                    styled_table = df_niveis.style.apply(highlight_niveis, axis=1)
-                    st.dataframe(styled_table, use_container_width=True, height=565)
-
-                    df_resultado = get_quarterly_growth_table_yfinance(ticker)
-                    if df_resultado is not None:
-                        st.markdown("📊 **Histórico Trimestral (YoY)**")
-                        st.table(df_resultado)
-                    else:
-                        st.warning("❌ Histórico de crescimento YoY não disponível.")
-
-
-
-
+            df = analise["df"]
+            rs_val = df["RS_Rating"].iloc[-1] if "RS_Rating" in df.columns else None
             preco = df["Close"].iloc[-1]
             dist_sma20 = (preco - df["SMA20"].iloc[-1]) / preco * 100
             dist_sma50 = (preco - df["SMA50"].iloc[-1]) / preco * 100
@@ -1120,71 +625,175 @@ if st.session_state.get("executar_busca", False):
             dist_max52 = (preco - df["High"].rolling(252).max().iloc[-1]) / preco * 100
             dist_min52 = (preco - df["Low"].rolling(252).min().iloc[-1]) / preco * 100
 
-            st.session_state.recomendacoes.append({
+            job.adicionar_resultado(ticker, {
                 "Ticker": ticker,
-                "Empresa": nome,
-                "Tendência": tendencia,
-                "Comentário": comentario,
-                "Earnings": earnings_str,
+                "Empresa": analise["nome"],
+                "Tendência": analise["tendencia"],
+                "Comentário": analise["comentario"],
+                "Earnings": analise["earnings"],
                 "RS Rating": int(rs_val) if rs_val is not None and not pd.isna(rs_val) else "N/A",
                 "Dist % SMA20": f"{dist_sma20:+.1f}%",
                 "Dist % SMA50": f"{dist_sma50:+.1f}%",
                 "Dist % SMA200": f"{dist_sma200:+.1f}%",
                 "Dist % Máx52s": f"{dist_max52:+.1f}%",
                 "Dist % Mín52s": f"{dist_min52:+.1f}%",
-                "Filtros": filtros_aplicados_str_legivel
-            })
+                "Filtros": p["filtros_legivel"]
+            }, analise)
 
         except Exception as e:
-            st.warning(f"Erro com {ticker}: {e}")
+            job.avisar(f"Erro com {ticker}: {e}")
+
+
+def salvar_historico_busca(recomendacoes, p):
+    tickers_limpos = [r["Ticker"] for r in recomendacoes if "Ticker" in r]
+    if not tickers_limpos:
+        st.warning("⚠️ Nenhum ticker válido para salvar. Operação cancelada.")
+        return
+
+    def limpar_chave_firebase(s: str) -> str:
+        return re.sub(r'[.$#\[\]/]', '_', s)
+
+    filtros_serializaveis = {limpar_chave_firebase(str(k)): str(v) for k, v in p["filters_dict"].items()}
+    agora = datetime.now(timezone(timedelta(hours=-3)))
+    timestamp = agora.strftime("%Y%m%d-%H%M")
+    filtros_aplicados_str = p["filtros_aplicados_str"]
+    hash_id = hashlib.md5(filtros_aplicados_str.encode()).hexdigest()[:8]
+    nome_firebase_safe = f"{timestamp}_{hash_id}"
+
+    busca_ref = db.reference(f"historico_buscas/{uid}/{nome_firebase_safe}")
+
+    payload = {
+        "tickers": tickers_limpos,
+        "filtros": filtros_serializaveis,
+        "nome_exibicao": filtros_aplicados_str,
+        "modo_rs": p["modo_rs"],
+    }
 
-        progress.progress(min((i + 1) / len(tickers), 1.0))
+    json.dumps(payload)  # validação
+    busca_ref.set(payload)
+    st.success("✅ Histórico salvo com sucesso!")
 
-    status_text.empty()
-    progress.empty()
+
+if st.session_state.get("executar_busca", False):
+    st.session_state.executar_busca = False
+    params_scan = {
+        "filters_dict": dict(filters_dict),
+        "filtros_etapas": dict(
+            ordenamento_mm=ordenamento_mm, sma200_crescente=sma200_crescente, sinal=sinal, lookback=lookback,
+            mostrar_vcp=mostrar_vcp, candles_vcp=candles_vcp, base_plana=base_plana, amplitude_base=amplitude_base,
+        ),
+        "dias_breakout": dias_breakout,
+        "threshold": threshold,
+        "taxa_yahoo": taxa_yahoo,
+        "workers_scan": workers_scan,
+        "modo_rs": modo_rs,
+        "benchmark": benchmark,
+        "graficos_sob_demanda": graficos_sob_demanda,
+        "usar_snapshot": usar_snapshot,
+        "filtros_legivel": filtros_aplicados_str_legivel,
+        "filtros_aplicados_str": f"{st.session_state.get('filtro_sinal', '')} | {st.session_state.get('filtro_performance', '')} | {st.session_state.get('filtro_volume', '')}",
+    }
+    try:
+        st.session_state.job_scan = submeter_job(executar_scan, params_scan, dono=uid)
+        st.session_state.pop("recarga", None)
+    except RuntimeError as e:
+        st.error(str(e))
+
+# Sessão nova (ex.: navegador reconectou): retoma o scan mais recente do usuário
+if "job_scan" not in st.session_state:
+    jobs_usuario = jobs_do_dono(uid)
+    if jobs_usuario:
+        st.session_state.job_scan = jobs_usuario[0].id
+
+job = obter_job(st.session_state.get("job_scan"))
+if job is not None:
+    estado_job = job.instantaneo()
+    # O job guarda o modo de exibição com que foi submetido (figuras prontas ou não)
+    sob_demanda_job = job.params["graficos_sob_demanda"]
+    st.info(f"🔎 Filtros Aplicados: {job.params['filters_dict']}")
+    for mensagem in estado_job["mensagens"]:
+        st.caption(mensagem)
+
+    if job.ativo:
+        # Reexecuta a página periodicamente só enquanto o job estiver rodando
+        st_autorefresh(interval=1500, key=f"poll_scan_{job.id}")
+        col_prog, col_cancel = st.columns([5, 1])
+        with col_prog:
+            st.progress(job.progresso(), text=estado_job["etapa"])
+        with col_cancel:
+            if st.button("⏹️ Cancelar busca", key=f"cancelar_{job.id}"):
+                cancelar_job(job.id)
+                st.rerun()
+    elif estado_job["estado"] == "cancelado":
+        st.warning(f"⏹️ Busca cancelada ({estado_job['concluidos']}/{estado_job['total']} ativos analisados).")
+    elif estado_job["estado"] == "erro":
+        st.error(f"❌ Erro na busca: {estado_job['erro']}")
+
+    for aviso in estado_job["avisos"]:
+        st.warning(aviso)
+
+    st.session_state.recomendacoes = estado_job["resultados"]
+    st.session_state.analises_scan = estado_job["analises"]
 
     if st.session_state.recomendacoes:
         st.subheader("📋 Tabela Final dos Ativos Selecionado")
         df_final = pd.DataFrame(st.session_state.recomendacoes)
-        st.dataframe(df_final, use_container_width=True)
+        if sob_demanda_job:
+            # Tabela resumida primeiro, gráfico só das linhas selecionadas
+            st.caption("Selecione uma ou mais linhas para abrir o gráfico e os níveis do ativo.")
+            selecao = st.dataframe(df_final, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="multi-row", key=f"tabela_resultados_{job.id}")
+            tickers_exibidos = [df_final.iloc[linha]["Ticker"] for linha in selecao.selection.rows]
+        else:
+            st.dataframe(df_final, use_container_width=True)
+            tickers_exibidos = list(df_final["Ticker"])
         st.download_button("⬇️ Baixar CSV", df_final.to_csv(index=False).encode(), file_name="recomendacoes_ia.csv")
 
-        # SALVA HISTÓRICO APÓS CONCLUSÃO
-        try:
-            tickers_limpos = [r["Ticker"] for r in st.session_state.recomendacoes if "Ticker" in r]
-            if not tickers_limpos:
-                st.warning("⚠️ Nenhum ticker válido para salvar. Operação cancelada.")
-            else:
-                def limpar_chave_firebase(s: str) -> str:
-                    return re.sub(r'[.$#\[\]/]', '_', s)
-
-                filtros_serializaveis = {limpar_chave_firebase(str(k)): str(v) for k, v in filters_dict.items()}
-                agora = datetime.now(timezone(timedelta(hours=-3)))
-                timestamp = agora.strftime("%Y%m%d-%H%M")
-                filtros_aplicados_str = f"{st.session_state.get('filtro_sinal', '')} | {st.session_state.get('filtro_performance', '')} | {st.session_state.get('filtro_volume', '')}"
-                hash_id = hashlib.md5(filtros_aplicados_str.encode()).hexdigest()[:8]
-                nome_firebase_safe = f"{timestamp}_{hash_id}"
-
-                uid = st.session_state.user["localId"]
-                busca_ref = db.reference(f"historico_buscas/{uid}/{nome_firebase_safe}")
-
-                payload = {
-                    "tickers": tickers_limpos,
-                    "filtros": filtros_serializaveis,
-                    "nome_exibicao": filtros_aplicados_str
-                }
-
-                json.dumps(payload)  # validação
-                busca_ref.set(payload)
-                st.success("✅ Histórico salvo com sucesso!")
+        # O primeiro render de cada ticker entra no perfil do job (inclusive gráficos
+        # montados sob demanda); os reruns do autorefresh não somam de novo
+        renderizados = job.extras.setdefault("tickers_renderizados", set())
+        for ticker_sel in tickers_exibidos:
+            if ticker_sel not in st.session_state.analises_scan:
+                continue
+            if ticker_sel in renderizados:
+                renderizar_resultado(ticker_sel, st.session_state.analises_scan[ticker_sel])
+                continue
+            renderizados.add(ticker_sel)
+            with ativar_perfil(job.perfil), trecho("Render do resultado", ticker=ticker_sel):
+                renderizar_resultado(ticker_sel, st.session_state.analises_scan[ticker_sel])
 
+    # SALVA HISTÓRICO APÓS CONCLUSÃO (uma vez por job)
+    if estado_job["estado"] == "concluido" and st.session_state.recomendacoes and not job.extras.get("historico_salvo"):
+        job.extras["historico_salvo"] = True
+        try:
+            salvar_historico_busca(st.session_state.recomendacoes, job.params)
         except Exception as e:
             st.error(f"❌ Erro ao salvar histórico: {e}")
-        finally:
-            st.session_state.executar_busca = False
-    else:
-        # Nenhuma recomendação = reset mesmo assim
-        st.session_state.executar_busca = False
+
+    # Onde o tempo do scan foi gasto (só administradores)
+    if st.session_state.get("is_admin"):
+        with st.expander("⏱️ Perfil de tempo do scan"):
+            resumo_perfil = job.perfil.resumo()
+            st.caption("Tempos inclusivos: cada etapa contém as etapas internas. p50/p95 por ticker somam as chamadas de cada ticker.")
+            st.dataframe(pd.DataFrame([
+                {
+                    "Etapa": etapa,
+                    "Chamadas": info["chamadas"],
+                    "Total (s)": round(info["total_s"], 2),
+                    "Tickers": info["tickers"],
+                    "p50 por ticker (ms)": None if info["p50_ms"] is None else round(info["p50_ms"], 1),
+                    "p95 por ticker (ms)": None if info["p95_ms"] is None else round(info["p95_ms"], 1),
+                }
+                for etapa, info in resumo_perfil["etapas"].items()
+            ]), use_container_width=True, hide_index=True)
+            if resumo_perfil["mais_lentos"]:
+                st.markdown("**🐢 Tickers mais lentos**")
+                st.dataframe(pd.DataFrame([
+                    {"Ticker": item["ticker"], "Total (s)": round(item["total_s"], 2),
+                     **{etapa: round(segundos, 3) for etapa, segundos in item["etapas"].items()}}
+                    for item in resumo_perfil["mais_lentos"]
+                ]), use_container_width=True, hide_index=True)
+            st.download_button("⬇️ Exportar perfil (JSON)", job.perfil.exportar_json(),
+                               file_name=f"perfil_scan_{job.id}.json", mime="application/json")
 
 
 with st.expander("🕓 Histórico de Buscas"):
@@ -1215,6 +824,7 @@ with st.expander("🕓 Histórico de Buscas"):
         with col_h1:
             if st.button("🔁 Recarregar gráficos dessa busca"):
                 st.session_state.recarregar_tickers = tickers_antigos
+                st.session_state.recarregar_modo_rs = historico[busca_selecionada].get("modo_rs")
                 st.rerun()
 
         with col_h2:
@@ -1225,16 +835,3 @@ with st.expander("🕓 Histórico de Buscas"):
                     st.rerun()
                 except Exception as e:
                     st.error(f"Erro ao excluir histórico: {e}")
-
-
-__all__ = [
-    "calcular_indicadores",
-    "detectar_vcp",
-    "classificar_tendencia",
-    "gerar_comentario",
-    "get_earnings_info_detalhado",
-    "calcular_pivot_points",
-    "get_quarterly_growth_table_yfinance",
-    "highlight_niveis",
-    "plot_ativo"
-]
@@ -1,12 +1,17 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 from cryptography.hazmat.primitives import serialization
 import re
 from datetime import datetime, date
 from firebase_admin import credentials, auth as admin_auth, db
 import firebase_admin
 from streamlit_javascript import st_javascript
+from streamlit_autorefresh import st_autorefresh
+from Screener.quotes import obter_cotacoes, acompanhar_cotacoes, cotacoes_desde, VALIDADE_COTACOES_SEG, INTERVALO_AO_VIVO_SEG
+from Screener.portfolio import (
+    COLUNAS_PLANO, plano_numerico, recalcular_plano, montar_plano, aplicar_compra_real,
+    plano_para_registro, formatar_plano, montar_carteira, agregados_carteira,
+)
 
 
 # Inicializa Firebase Admin se ainda não foi inicializado
@@ -52,37 +57,26 @@ simulacoes_salvas = ref.get()
 
 if "simulacoes" not in st.session_state:
     st.session_state.simulacoes = simulacoes_salvas if simulacoes_salvas else []
-# Recalcula $ STOP e $ RISCO de todas simulações carregadas
-def recalcular_riscos(sim):
-    tabela_df = pd.DataFrame(sim["tabela"])
-    pl_total = sim["pl_total"]
-    risco_acumulado = 0.0
-
-    for i, row in tabela_df.iterrows():
-        try:
-            preco = float(str(row["ADD"]).replace("$", "").replace(",", ""))
-            qtd = float(str(row["QTD"]).replace(" UN", "").replace(",", ""))
-            stop_pct = float(str(row["STOP"]).replace("%", "").strip())
-        except:
-            continue
-
-        stop_price = preco * (1 - stop_pct / 100)
-        risco_valor = (preco - stop_price) * qtd
-        risco_pct_pl = -risco_valor / pl_total * 100 if pl_total else 0
+# Grava o plano na simulação; a versão identifica o plano no cache de métricas
+# (metricas_carteira) sem serializar a tabela a cada rerun
+def gravar_plano(sim, plano):
+    sim["tabela"] = plano_para_registro(plano)
+    sim["versao_plano"] = sim.get("versao_plano", 0) + 1
 
-        tabela_df.at[i, "$ STOP"] = f"$ {stop_price:.2f}"
-        tabela_df.at[i, "$ RISCO"] = f"$ {-risco_valor:.2f}"
-        tabela_df.at[i, "RISCO"] = f"{risco_pct_pl:.2f}% PL"
 
-    sim["tabela"] = tabela_df.to_dict(orient="list")
+# Recalcula $ STOP, $ RISCO, RISCO e ACUM. RISCO do plano (numérico) da simulação
+def recalcular_riscos(sim):
+    gravar_plano(sim, recalcular_plano(plano_numerico(sim["tabela"]), sim["pl_total"]))
     return sim
 
-# Reprocessa todas simulações ao carregar
-for i in range(len(st.session_state.simulacoes)):
-    sim = st.session_state.simulacoes[i]
-    if "tabela" in sim:
-        sim = recalcular_riscos(sim)
-        st.session_state.simulacoes[i] = sim
+# Converte uma vez por sessão os planos carregados (inclusive os antigos, salvos como texto)
+if not st.session_state.get("planos_numericos"):
+    for i in range(len(st.session_state.simulacoes)):
+        sim = st.session_state.simulacoes[i]
+        if "tabela" in sim:
+            sim = recalcular_riscos(sim)
+            st.session_state.simulacoes[i] = sim
+    st.session_state.planos_numericos = True
 
 
 st.markdown("""
@@ -111,17 +105,6 @@ st.markdown("""
 
 
 
-@st.cache_data(ttl=10)
-def get_preco_atual(ticker):
-    import yfinance as yf
-    try:
-        return yf.Ticker(ticker).history(period="1d")["Close"].iloc[-1]
-    except:
-        return None
-
-
-
-
 def limpar_chaves_invalidas(obj, path="root"):
     if isinstance(obj, dict):
         novo = {}
@@ -190,14 +173,11 @@ if 'edit_index' in st.session_state:
 
     # Pré-carrega valores das etapas
     try:
+        plano = plano_numerico(sim["tabela"]).fillna(0.0)
         for i, nome in enumerate(["COMPRA INICIAL", "COMPRA 2", "COMPRA 3"]):
-            subida = float(sim["tabela"]["% PARA COMPRA"][i].replace('%', ''))
-            stop = float(sim["tabela"]["STOP"][i].replace('%', ''))
-            pct_pl = float(sim["tabela"]["% PL COMPRA"][i].replace('%', ''))
-
-            st.session_state[f"subida{i}"] = subida
-            st.session_state[f"stop{i}"] = stop
-            st.session_state[f"pct_pl{i}"] = pct_pl
+            st.session_state[f"subida{i}"] = float(plano["% PARA COMPRA"][i])
+            st.session_state[f"stop{i}"] = float(plano["STOP"][i])
+            st.session_state[f"pct_pl{i}"] = float(plano["% PL COMPRA"][i])
     except:
         pass
 
@@ -313,39 +293,19 @@ with st.expander("Expandir/Minimizar Planejamento", expanded=expanded_planning):
             })
 
     # 🔁 Gerar tabela ao vivo com base nos dados preenchidos
-    linhas = []
     cotacao = st.session_state.cotacao_live
     pl_total = st.session_state.pl_total_live
 
-    for i, nome in enumerate(["COMPRA INICIAL", "COMPRA 2", "COMPRA 3"]):
-        subida = st.session_state.get(f"subida{i}", [0.0, 4.0, 10.0][i])
-        pct_pl = st.session_state.get(f"pct_pl{i}", [8.0, 6.0, 6.0][i])
-        stop_pct = st.session_state.get(f"stop{i}", [8.0, 8.0, 10.0][i])
-
-        preco = cotacao * (1 + subida / 100)
-        valor = pl_total * (pct_pl / 100)
-        qtd = valor / preco if preco else 0
-        stop_preco = preco * (1 - stop_pct / 100)
-        risco_valor = (preco - stop_preco) * qtd
-        risco_pct_pl = -risco_valor / pl_total * 100 if pl_total else 0
-
-        linhas.append([
-            nome,
-            f"${preco:.2f}",
-            f"{subida:.2f}%" if i > 0 else "Compra Inicial",
-            f"${valor:,.2f}",
-            f"{pct_pl:.2f}%",
-            f"{int(qtd)} UN",
-            f"{stop_pct:.2f}%",
-            f"$ {stop_preco:.2f}",
-            f"{risco_pct_pl:.2f}% PL",
-            f"$ {-risco_valor:.2f}"
-        ])
-
-    df_preview = pd.DataFrame(linhas, columns=[
-        "Etapa", "ADD", "% PARA COMPRA", "COMPRA PL", "% PL COMPRA",
-        "QTD", "STOP", "$ STOP", "RISCO", "$ RISCO"
-    ])
+    etapas_preview = [
+        {
+            "nome": nome,
+            "subida_pct": st.session_state.get(f"subida{i}", [0.0, 4.0, 10.0][i]),
+            "pct_pl": st.session_state.get(f"pct_pl{i}", [8.0, 6.0, 6.0][i]),
+            "stop_pct": st.session_state.get(f"stop{i}", [8.0, 8.0, 10.0][i]),
+        }
+        for i, nome in enumerate(["COMPRA INICIAL", "COMPRA 2", "COMPRA 3"])
+    ]
+    df_preview = formatar_plano(montar_plano(cotacao, pl_total, etapas_preview))[COLUNAS_PLANO]
 
     st.markdown("### 📋 Planejamento de Compras (Pré-visualização)")
     st.dataframe(df_preview, use_container_width=True, hide_index=True)
@@ -402,45 +362,16 @@ with st.expander("Expandir/Minimizar Planejamento", expanded=expanded_planning):
                 st.session_state.keep_open_idx = st.session_state.edit_index
 
             preco_final = st.session_state.cotacao_live * (1 + st.session_state.venda_pct_live / 100)
-            total_valor = 0
-            total_unidades = 0
-            linhas = []
-
-            for i, compra in enumerate(compra_data):
-                preco = st.session_state.cotacao_live * (1 + compra["subida_pct"] / 100)
-                valor = st.session_state.pl_total_live * (compra["pct_pl"] / 100)
-                unidades = valor / preco
-                stop_preco = preco * (1 - compra["stop_pct"] / 100)
-                risco_valor = (preco - stop_preco) * unidades
-                risco_pct_pl = -risco_valor / st.session_state.pl_total_live * 100
-
-                linhas.append([
-                    compra["nome"],
-                    f"${preco:.2f}",
-                    f"{compra['subida_pct']:.2f}%" if i > 0 else "Compra Inicial",
-                    f"${valor:,.2f}",
-                    f'{compra["pct_pl"]:.2f}%',
-                    f"{int(unidades)} UN",
-                    f'{compra["stop_pct"]:.2f}%',
-                    f"$ {stop_preco:.2f}",
-                    f"{risco_pct_pl:.2f}% PL",
-                    f"$ {-risco_valor:.2f}",
-                ])
-
-                total_valor += valor
-                total_unidades += unidades
+            plano = montar_plano(st.session_state.cotacao_live, st.session_state.pl_total_live, compra_data)
+            total_valor = float(plano["COMPRA PL"].sum())
+            total_unidades = float((plano["COMPRA PL"] / plano["ADD"]).sum())
 
             lucro = preco_final * total_unidades - total_valor
             lucro_pct = lucro / total_valor * 100
             lpl_pct = lucro / st.session_state.pl_total_live * 100
 
-            df_tabela = pd.DataFrame(linhas, columns=[
-                "Etapa", "ADD", "% PARA COMPRA", "COMPRA PL", "% PL COMPRA",
-                "QTD", "STOP", "$ STOP", "RISCO", "$ RISCO"
-            ])
-
             preco_inicial = st.session_state.cotacao_live
-            qtd_inicial = int(df_tabela["QTD"][0].replace(" UN", "")) if "QTD" in df_tabela.columns else 0
+            qtd_inicial = int(plano["QTD"][0]) if len(plano) else 0
             valor_inicial = preco_inicial * qtd_inicial
 
             nova_simulacao = {
@@ -455,7 +386,7 @@ with st.expander("Expandir/Minimizar Planejamento", expanded=expanded_planning):
                 "lpl_pct": lpl_pct,
                 "total_valor": total_valor,
                 "total_unidades": total_unidades,
-                "tabela": df_tabela.to_dict(),
+                "tabela": plano_para_registro(plano),
                 "quantidade_restante": int(total_unidades),
                 "risco_maximo_pct": st.session_state.get("risco_maximo_pct", 1.0),
                 # REGISTRO AUTOMÁTICO DA COMPRA INICIAL
@@ -488,14 +419,11 @@ with st.expander("Expandir/Minimizar Planejamento", expanded=expanded_planning):
 st.markdown("---")
 st.subheader("📈 Operações em Aberto")
 
-if st.button("🔄 Atualizar preços"):
-    st.cache_data.clear()
-    st.rerun()
-
-for idx, sim in enumerate(st.session_state.simulacoes):
+# P&L, progresso até o alvo e faixa de compra de uma posição no preço atual
+def metricas_posicao(sim, valor_atual):
     preco_medio = sim.get("preco_medio", 0)
     preco_final = sim.get("preco_final", 0)
-    valor_atual = get_preco_atual(sim["nome"]) or sim.get("preco_medio", 0)
+    qtd_real = sim.get("quantidade_real", 0)
 
     progresso_pct = (valor_atual / preco_medio - 1) * 100 if preco_medio else 0
     progresso_ate_meta = ((valor_atual - preco_medio) / (preco_final - preco_medio)) * 100 if (preco_final - preco_medio) else 0
@@ -503,20 +431,15 @@ for idx, sim in enumerate(st.session_state.simulacoes):
         progresso_ate_meta *= 2  # Multiplica por 2 se o lucro for negativo
     restante_para_meta = ((preco_final - valor_atual) / valor_atual) * 100 if valor_atual else 0
 
-    cor_progresso = "#28a745" if progresso_pct >= 0 else "#dc3545"
-    icone_progresso = "🔼" if progresso_pct >= 0 else "🔽"
-
     alerta = ""
     aviso_proxima = ""
     sinal_proxima = ""
 
     try:
-        tabela_df = pd.DataFrame(sim["tabela"])
-        preco_2_pct = float(tabela_df[tabela_df["Etapa"].str.startswith("COMPRA 2")]["% PARA COMPRA"].iloc[0].replace('%',''))
+        plano = plano_numerico(sim["tabela"])
+        preco_2_pct = plano.loc[plano["Etapa"].str.startswith("COMPRA 2"), "% PARA COMPRA"].dropna().iloc[0]
         preco_2 = sim["cotacao"] * (1 + preco_2_pct / 100)
-
-        linha_compra3 = tabela_df[tabela_df["Etapa"].str.startswith("COMPRA 3")].iloc[0]
-        preco_3 = float(str(linha_compra3["ADD"]).replace("$", "").replace(",", ""))
+        preco_3 = plano.loc[plano["Etapa"].str.startswith("COMPRA 3"), "ADD"].dropna().iloc[0]
 
         if valor_atual < preco_2:
             alerta = "🟢 Em faixa da COMPRA INICIAL"
@@ -546,6 +469,85 @@ for idx, sim in enumerate(st.session_state.simulacoes):
         destaque_cor = "#fff3cd"
         aviso_proxima = ""
 
+    return {
+        "valor_atual": valor_atual,
+        "progresso_pct": progresso_pct,
+        "progresso_ate_meta": progresso_ate_meta,
+        "restante_para_meta": restante_para_meta,
+        "cor_progresso": "#28a745" if progresso_pct >= 0 else "#dc3545",
+        "icone_progresso": "🔼" if progresso_pct >= 0 else "🔽",
+        "alerta": alerta,
+        "aviso_proxima": aviso_proxima,
+        "sinal_proxima": sinal_proxima,
+        "destaque_cor": destaque_cor,
+        "valor_investido": preco_medio * qtd_real,
+        "valor_mercado": valor_atual * qtd_real,
+    }
+
+
+# Métricas de todas as posições. Ficam na sessão e só são recalculadas para
+# as posições cujo preço (ou versão do plano, ver gravar_plano) mudou desde o último rerun.
+def metricas_carteira(simulacoes, cotacoes):
+    anteriores = st.session_state.get("metricas_carteira", {})
+    atuais = {}
+    resultado = []
+    for sim in simulacoes:
+        valor_atual = cotacoes.get(sim["nome"]) or sim.get("preco_medio", 0)
+        assinatura = (
+            sim["nome"], valor_atual, sim.get("preco_medio", 0), sim.get("preco_final", 0),
+            sim.get("quantidade_real", 0), sim.get("cotacao"), sim.get("versao_plano", 0),
+        )
+        metricas = anteriores.get(assinatura) or metricas_posicao(sim, valor_atual)
+        atuais[assinatura] = metricas
+        resultado.append(metricas)
+    st.session_state.metricas_carteira = atuais
+    return resultado
+
+
+# Cotações: uma busca em lote por intervalo (Screener.quotes), lida por todas as
+# seções abaixo. No modo ao vivo uma thread consulta as posições abertas e a
+# página (recarregada pelo st_autorefresh) recebe só os preços que mudaram.
+col_atualizar, col_ao_vivo, col_intervalo = st.columns([1, 1, 1])
+with col_atualizar:
+    atualizar_precos = st.button("🔄 Atualizar preços")
+with col_ao_vivo:
+    ao_vivo = st.checkbox("⚡ Modo ao vivo", key="carteira_ao_vivo")
+with col_intervalo:
+    opcoes_intervalo = [5, 15, 30, 60]
+    intervalo_ao_vivo = st.selectbox("Intervalo (s)", opcoes_intervalo, index=opcoes_intervalo.index(INTERVALO_AO_VIVO_SEG),
+                                     key="carteira_intervalo", disabled=not ao_vivo)
+
+tickers_abertos = [sim["nome"] for sim in st.session_state.simulacoes]
+cotacoes = st.session_state.setdefault("cotacoes_carteira", {})
+if ao_vivo and not atualizar_precos:
+    st_autorefresh(interval=intervalo_ao_vivo * 1000, key="carteira_autorefresh")
+    acompanhar_cotacoes(tickers_abertos, intervalo_ao_vivo)
+    versao, mudancas = cotacoes_desde(st.session_state.get("versao_cotacoes", 0), set(tickers_abertos))
+    st.session_state.versao_cotacoes = versao
+    cotacoes.update(mudancas)
+    # Posição nova ou publicada antes da versão que esta sessão já viu
+    faltando = [t for t in tickers_abertos if t not in cotacoes]
+    if faltando:
+        cotacoes.update(obter_cotacoes(faltando))
+else:
+    cotacoes.update(obter_cotacoes(tickers_abertos, validade_seg=0 if atualizar_precos else VALIDADE_COTACOES_SEG))
+
+metricas_sims = metricas_carteira(st.session_state.simulacoes, cotacoes)
+
+for idx, sim in enumerate(st.session_state.simulacoes):
+    preco_final = sim.get("preco_final", 0)
+    metricas = metricas_sims[idx]
+    valor_atual = metricas["valor_atual"]
+    progresso_pct = metricas["progresso_pct"]
+    progresso_ate_meta = metricas["progresso_ate_meta"]
+    restante_para_meta = metricas["restante_para_meta"]
+    cor_progresso = metricas["cor_progresso"]
+    icone_progresso = metricas["icone_progresso"]
+    alerta = metricas["alerta"]
+    aviso_proxima = metricas["aviso_proxima"]
+    sinal_proxima = metricas["sinal_proxima"]
+    destaque_cor = metricas["destaque_cor"]
+
     
         # 🔍 Etapa atual (para inline)
     etapas_executadas = [c["etapa"] for c in sim.get("compras_reais", [])]
@@ -570,20 +572,8 @@ for idx, sim in enumerate(st.session_state.simulacoes):
 
         
 
-        # Carrega a tabela como DataFrame
-        tabela_df = pd.DataFrame(sim["tabela"])
-
-        # Garante presença de todas colunas esperadas
-        colunas_desejadas = [
-            "Etapa", "ADD", "% PARA COMPRA", "COMPRA PL", "% PL COMPRA",
-            "QTD", "STOP", "$ STOP", "RISCO", "$ RISCO"
-        ]
-        for col in colunas_desejadas:
-            if col not in tabela_df.columns:
-                tabela_df[col] = np.nan  # ou "" se preferir string vazia
-
-        # Exibe a tabela com as colunas na ordem correta
-        st.dataframe(tabela_df[colunas_desejadas], use_container_width=True, hide_index=True)
+        # Plano numérico formatado só para exibição, com as colunas na ordem correta
+        st.dataframe(formatar_plano(plano_numerico(sim["tabela"]))[COLUNAS_PLANO], use_container_width=True, hide_index=True)
 
         risco_maximo_valor = sim["pl_total"] * (sim.get("risco_maximo_pct", 1.0) / 100)
         risco_maximo_pct = sim.get("risco_maximo_pct", 1.0)
@@ -671,39 +661,12 @@ for idx, sim in enumerate(st.session_state.simulacoes):
                                 # Atualizar também a tabela da simulação com os dados editados
                                 etapa = c.get("etapa", "Inicial")
                                 etapa_nome = "COMPRA INICIAL" if etapa == "Inicial" else f"COMPRA {etapa}"
-                                tabela_df = pd.DataFrame(sim["tabela"])
-                                idx_linha = tabela_df[tabela_df["Etapa"].str.startswith(etapa_nome)].index
-
-                                if not idx_linha.empty:
-                                    i_tabela = idx_linha[0]
-                                    preco_real = novo_preco
-                                    qtd_real = nova_qtd
-                                    valor_real = preco_real * qtd_real
-                                    pct_pl_real = (valor_real / sim["pl_total"]) * 100
-                                    preco_inicial = sim["cotacao"]
-                                    subida_pct_real = (preco_real / preco_inicial - 1) * 100
-
-                                    try:
-                                        stop_pct = float(str(tabela_df.at[i_tabela, "STOP"]).replace("%", ""))
-                                    except:
-                                        stop_pct = 8.0
-
-                                    stop_price = preco_real * (1 - stop_pct / 100)
-
-                                    # Atualiza os dados na tabela
-                                    tabela_df.at[i_tabela, "Etapa"] = f"{etapa_nome} - Real"
-                                    tabela_df.at[i_tabela, "ADD"] = f"${preco_real:.2f}"
-                                    tabela_df.at[i_tabela, "QTD"] = f"{int(qtd_real)} UN"
-                                    tabela_df.at[i_tabela, "COMPRA PL"] = f"${valor_real:,.2f}"
-                                    tabela_df.at[i_tabela, "% PL COMPRA"] = f"{pct_pl_real:.2f}%"
-                                    tabela_df.at[i_tabela, "% PARA COMPRA"] = f"{subida_pct_real:.2f}%"
-                                    # Só altera o STOP se a etapa não for "Inicial"
-                                    if etapa != "Inicial":
-                                        tabela_df.at[i_tabela, "$ STOP"] = f"$ {stop_price:.2f}"
-                                        tabela_df.at[i_tabela, "STOP"] = f"{stop_pct:.2f}%"
-
-
-                                    sim["tabela"] = tabela_df.to_dict(orient="list")
+                                # Só altera o STOP se a etapa não for "Inicial"
+                                plano = aplicar_compra_real(
+                                    plano_numerico(sim["tabela"]), etapa_nome, novo_preco, nova_qtd,
+                                    sim["pl_total"], sim["cotacao"], atualizar_stop=etapa != "Inicial",
+                                )
+                                gravar_plano(sim, plano)
 
 
                                 total_qtd = sum([compra["qtd"] for compra in sim["compras_reais"]])
@@ -767,40 +730,6 @@ for idx, sim in enumerate(st.session_state.simulacoes):
                         st.warning("⚠️ Nenhuma ação disponível para venda.")
 
                 with col_compra:
-                    def recalcular_riscos(sim):
-                        tabela_df = pd.DataFrame(sim["tabela"])
-                        pl_total = sim["pl_total"]
-
-                        risco_acumulado = 0.0
-
-                        for i, row in tabela_df.iterrows():
-                            try:
-                                preco = float(str(row["ADD"]).replace("$", "").replace(",", ""))
-                                qtd = float(str(row["QTD"]).replace(" UN", "").replace(",", ""))
-                                try:
-                                    stop_str = str(row["STOP"]).replace("%", "").strip()
-                                    stop_pct = float(stop_str) if stop_str not in ["", "None", "nan"] else 0.0
-                                except:
-                                    stop_pct = 0.0
-                            except:
-                                continue
-
-                            stop_price = preco * (1 - stop_pct / 100)
-                            risco_valor = (preco - stop_price) * qtd
-
-                            # Risco individual
-                            risco_pct_pl = -risco_valor / pl_total * 100 if pl_total else 0
-                            tabela_df.at[i, "RISCO"] = f"{risco_pct_pl:.2f}% PL"
-                            tabela_df.at[i, "$ RISCO"] = f"$ {-risco_valor:.2f}"
-
-                            # Risco acumulado
-                            risco_acumulado += risco_valor
-                            risco_pct_pl_acum = -risco_acumulado / pl_total * 100 if pl_total else 0
-                            tabela_df.at[i, "ACUM. RISCO"] = f"{risco_pct_pl_acum:.2f}% PL"
-
-                        sim["tabela"] = tabela_df.to_dict(orient="list")
-                        return sim
-
                     with st.form(f"form_add_compra_{idx}", clear_on_submit=True):
                         st.markdown("### ➕ Registrar Compra Real")
                         etapa = st.selectbox("Etapa da compra", ["2", "3"], key=f"etapa_compra_{idx}")
@@ -818,11 +747,9 @@ for idx, sim in enumerate(st.session_state.simulacoes):
                         if etapa == "2":
                             preco2 = preco_compra
                             qtd2 = qtd_compra
-                            tabela_df = pd.DataFrame(sim["tabela"])
-                            try:
-                                stop2_pct = float(tabela_df[tabela_df["Etapa"] == "COMPRA 2"]["STOP"].values[0].replace("%", ""))
-                            except:
-                                stop2_pct = 8.0
+                            plano = plano_numerico(sim["tabela"])
+                            stops2 = plano.loc[plano["Etapa"] == "COMPRA 2", "STOP"].dropna()
+                            stop2_pct = float(stops2.iloc[0]) if not stops2.empty else 8.0
                             stop2_price = preco2 * (1 - stop2_pct / 100)
                             risco2 = (preco2 - stop2_price) * qtd2
                             risco_max_total = sim["pl_total"] * (st.session_state.get("risco_maximo_pct", 1.0) / 100)
@@ -835,25 +762,25 @@ for idx, sim in enumerate(st.session_state.simulacoes):
                                 if risco_max_inicial > 0:
                                     novo_stop1 = preco1 - (risco_max_inicial / qtd1)
                                     novo_stop1_pct = (preco1 - novo_stop1) / preco1 * 100
-                                    tabela_df.loc[tabela_df["Etapa"] == "COMPRA INICIAL", "STOP"] = f"{novo_stop1_pct:.2f}%"
-                                    sim["tabela"] = tabela_df.to_dict(orient="list")
+                                    plano.loc[plano["Etapa"] == "COMPRA INICIAL", "STOP"] = novo_stop1_pct
+                                    gravar_plano(sim, plano)
                             st.success(f"📉 Stop da COMPRA INICIAL pode ser {novo_stop1_pct:.2f}% ({novo_stop1:.2f}) para manter risco ≤ 1% do PL")
 
                         if etapa == "3":
-                            tabela_df = pd.DataFrame(sim["tabela"])
+                            plano = plano_numerico(sim["tabela"])
                             try:
                                 preco1 = next((c["preco"] for c in sim["compras_reais"] if c["etapa"] == "Inicial"), None)
                                 if preco1:
-                                    tabela_df.loc[tabela_df["Etapa"] == "COMPRA INICIAL", "STOP"] = f"{0:.2f}%"
+                                    plano.loc[plano["Etapa"] == "COMPRA INICIAL", "STOP"] = 0.0
                             except:
                                 pass
                             try:
                                 preco2 = next((c["preco"] for c in sim["compras_reais"] if c["etapa"] == "2"), None)
                                 if preco2:
-                                    tabela_df.loc[tabela_df["Etapa"] == "COMPRA 2", "STOP"] = f"{0:.2f}%"
+                                    plano.loc[plano["Etapa"] == "COMPRA 2", "STOP"] = 0.0
                             except:
                                 pass
-                            sim["tabela"] = tabela_df.to_dict(orient="list")
+                            gravar_plano(sim, plano)
                             st.success("🟢 Stops das COMPRA INICIAL e COMPRA 2 ajustados para breakeven após COMPRA 3.")
 
                         if st.form_submit_button("Registrar Compra"):
@@ -867,37 +794,12 @@ for idx, sim in enumerate(st.session_state.simulacoes):
                                 sim["compras_reais"] = []
                             sim["compras_reais"].append(nova_compra)
 
-                            etapa_nome = f"COMPRA {etapa}"
-                            tabela_df = pd.DataFrame(sim["tabela"])
-                            idx_linha = tabela_df[tabela_df["Etapa"] == etapa_nome].index
-
-                            if not idx_linha.empty:
-                                i = idx_linha[0]
-                                preco_real = preco_compra
-                                qtd_real = qtd_compra
-                                valor_real = preco_real * qtd_real
-                                pct_pl_real = (valor_real / sim["pl_total"]) * 100
-                                preco_inicial = sim["cotacao"]
-                                subida_pct_real = (preco_real / preco_inicial - 1) * 100
-
-                                try:
-                                    stop_pct_original = float(str(tabela_df.at[i, "STOP"]).replace("%", ""))
-                                except:
-                                    stop_pct_original = 8.0
-
-                                novo_stop_price = preco_real * (1 - stop_pct_original / 100)
-
-                                # ✅ Atualiza todos os campos da linha da tabela
-                                tabela_df.at[i, "Etapa"] = f"{etapa_nome} - Real"
-                                tabela_df.at[i, "ADD"] = f"${preco_real:.2f}"
-                                tabela_df.at[i, "QTD"] = f"{int(qtd_real)} UN"
-                                tabela_df.at[i, "COMPRA PL"] = f"${valor_real:,.2f}"
-                                tabela_df.at[i, "% PL COMPRA"] = f"{pct_pl_real:.2f}%"
-                                tabela_df.at[i, "% PARA COMPRA"] = f"{subida_pct_real:.2f}%"
-                                tabela_df.at[i, "$ STOP"] = f"$ {novo_stop_price:.2f}"
-                                tabela_df.at[i, "STOP"] = f"{stop_pct_original:.2f}%"
-
-                                sim["tabela"] = tabela_df.to_dict(orient="list")
+                            # ✅ Atualiza todos os campos da linha da etapa no plano
+                            plano = aplicar_compra_real(
+                                plano_numerico(sim["tabela"]), f"COMPRA {etapa}", preco_compra, qtd_compra,
+                                sim["pl_total"], sim["cotacao"],
+                            )
+                            gravar_plano(sim, plano)
 
                             # Atualiza totais e risco
                             total_qtd = sum([c["qtd"] for c in sim["compras_reais"]])
@@ -926,39 +828,13 @@ if "keep_open_idx" in st.session_state:
 #st.markdown("---")
 #st.subheader("📊 Indicadores Consolidado das Simulações")
 
-lucro_estimado_total = sum([sim.get("lucro", 0) for sim in st.session_state.simulacoes])
-total_risco_compras_reais = 0.0
-total_pct_pl_executado = 0.0
-total_pct_pl_planejado = 0.0
-
-for sim in st.session_state.simulacoes:
-    pl_total = sim["pl_total"]
-    tabela_df = pd.DataFrame(sim["tabela"])
-
-    # Risco e % executado
-    for compra in sim.get("compras_reais", []):
-        preco = compra["preco"]
-        qtd = compra["qtd"]
-        etapa = compra["etapa"]
-        etapa_nome = f"COMPRA {etapa}" if etapa in ["2", "3"] else "COMPRA INICIAL"
-        try:
-            linha = tabela_df[tabela_df["Etapa"] == etapa_nome].iloc[0]
-            stop_pct = float(str(linha["STOP"]).replace("%", ""))
-        except:
-            stop_pct = 8.0
-        stop_price = preco * (1 - stop_pct / 100)
-        risco = (preco - stop_price) * qtd
-        total_risco_compras_reais += risco
-        total_pct_pl_executado += (preco * qtd) / pl_total * 100
-
-    # Soma das % PL COMPRA da tabela
-    try:
-        total_pct_pl_planejado += sum([
-            float(str(p).replace("%", "")) for p in tabela_df["% PL COMPRA"]
-        ])
-    except:
-        pass
-
+# Risco e exposição da carteira: uma passada vetorizada sobre o modelo numérico por rerun
+agregados = agregados_carteira(montar_carteira(st.session_state.simulacoes))
+lucro_estimado_total = agregados["lucro_estimado_total"]
+total_risco_compras_reais = agregados["risco_compras_reais"]
+total_risco_operacao = agregados["risco_operacao"]  # Risco total planejado
+total_pct_pl_executado = agregados["pct_pl_executado"]
+total_pct_pl_planejado = agregados["pct_pl_planejado"]
 
 rr_ratio = lucro_estimado_total / total_risco_compras_reais if total_risco_compras_reais else 0
 qtd_simulacoes = len(st.session_state.simulacoes)
@@ -968,120 +844,13 @@ qtd_simulacoes = len(st.session_state.simulacoes)
 valor_investido_total = 0
 valor_mercado_total = 0
 
-for sim in st.session_state.simulacoes:
-    qtd_real = sim.get("quantidade_real", 0)
-    preco_medio = sim.get("preco_medio", 0)
-    valor_investido = preco_medio * qtd_real
-    valor_atual = get_preco_atual(sim["nome"]) or preco_medio
-    valor_mercado = valor_atual * qtd_real
-
-    valor_investido_total += valor_investido
-    valor_mercado_total += valor_mercado
+for metricas in metricas_sims:
+    valor_investido_total += metricas["valor_investido"]
+    valor_mercado_total += metricas["valor_mercado"]
 
 # Lucro/prejuízo real até o momento
 lucro_real = valor_mercado_total - valor_investido_total
 
-# Recalcula faixa com base no risco planejado e lucro estimado
-lucro_estimado_total = sum([sim.get("lucro", 0) for sim in st.session_state.simulacoes])
-risco_total = total_risco_compras_reais
-
-faixa_total = risco_total + lucro_estimado_total
-if faixa_total == 0:
-    faixa_total = 1
-
-# Calcula posição relativa atual entre -risco e +lucro
-progresso_pct = faixa_total / lucro_real
-posicao = 49 + progresso_pct
-posicao_pct = max(2, min(98, posicao))
-
-# Determina cor e sinal
-cor_valor = "#28a745" if lucro_real >= 0 else "#dc3545"
-sinal = "+" if lucro_real >= 0 else "-"
-
-# Recalcula faixa com base no risco planejado e lucro estimado
-lucro_estimado_total = sum([sim.get("lucro", 0) for sim in st.session_state.simulacoes])
-total_risco_compras_reais = 0.0  # Renomeado para maior clareza
-for sim in st.session_state.simulacoes:
-    pl_total = sim["pl_total"]
-    tabela_df = pd.DataFrame(sim["tabela"])
-    for compra in sim.get("compras_reais", []):
-        preco = compra["preco"]
-        qtd = compra["qtd"]
-        etapa = compra["etapa"]
-        etapa_nome = f"COMPRA {etapa}" if etapa in ["2", "3"] else "COMPRA INICIAL"
-        try:
-            linha = tabela_df[tabela_df["Etapa"] == etapa_nome].iloc[0]
-            stop_pct = float(str(linha["STOP"]).replace("%", ""))
-        except:
-            stop_pct = 8.0
-        stop_price = preco * (1 - stop_pct / 100)
-        risco = (preco - stop_price) * qtd
-        total_risco_compras_reais += risco
-
-faixa_total = total_risco_compras_reais + lucro_estimado_total
-if faixa_total == 0:
-    faixa_total = 1
-
-# Calcula a posição percentual do lucro real na faixa total
-posicao_pct = ((total_risco_compras_reais + lucro_real) / (2 * faixa_total)) * 100
-posicao_pct = max(0, min(100, posicao_pct))
-
-# Determina cor e sinal
-cor_valor = "#28a745" if lucro_real >= 0 else "#dc3545"
-sinal = "+" if lucro_real >= 0 else "-"
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-# Recalcula faixa com base no risco planejado e lucro estimado
-lucro_estimado_total = sum([sim.get("lucro", 0) for sim in st.session_state.simulacoes])
-total_risco_compras_reais = 0.0
-total_risco_operacao = 0.0  # Novo: Risco total planejado
-
-for sim in st.session_state.simulacoes:
-    pl_total = sim["pl_total"]
-    tabela_df = pd.DataFrame(sim["tabela"])
-
-    # Risco das compras REAIS
-    for compra in sim.get("compras_reais", []):
-        preco = compra["preco"]
-        qtd = compra["qtd"]
-        etapa = compra["etapa"]
-        etapa_nome = f"COMPRA {etapa}" if etapa in ["2", "3"] else "COMPRA INICIAL"
-        try:
-            linha = tabela_df[tabela_df["Etapa"] == etapa_nome + " - Real"].iloc[0]  # Busca a linha "Real"
-            stop_pct = float(str(linha["STOP"]).replace("%", ""))
-        except:
-            stop_pct = float(str(tabela_df[tabela_df["Etapa"] == etapa_nome]["STOP"].values[0]).replace("%", ""))
-        stop_price = preco * (1 - stop_pct / 100)
-        risco = (preco - stop_price) * qtd
-        total_risco_compras_reais += risco
-
-    # Risco total da OPERAÇÃO (planejado)
-    for i in range(len(tabela_df)):
-        try:
-            preco_str = str(tabela_df.loc[i, "ADD"]).replace("$", "").replace(",", "")
-            preco = float(preco_str)
-            qtd_str = str(tabela_df.loc[i, "QTD"]).replace(" UN", "").replace(",", "")
-            qtd = float(qtd_str)
-            stop_pct_str = str(tabela_df.loc[i, "STOP"]).replace("%", "")
-            stop_pct = float(stop_pct_str)
-            stop_price = preco * (1 - stop_pct / 100)
-            risco = (preco - stop_price) * qtd
-            total_risco_operacao += risco
-        except ValueError:
-            continue
-
 faixa_total = total_risco_operacao + lucro_estimado_total
 if faixa_total == 0:
     faixa_total = 1
@@ -1210,14 +979,9 @@ st.subheader("🏆 Ranking de Ativos por Progresso")
 
 ativos_progresso = []
 max_progresso_abs = 0  # Encontra o maior valor absoluto para normalizar
-for sim in st.session_state.simulacoes:
+for sim, metricas in zip(st.session_state.simulacoes, metricas_sims):
     nome = sim["nome"]
-    preco_medio = sim.get("preco_medio", 0)
-    preco_final = sim.get("preco_final", 0)
-    valor_atual = get_preco_atual(nome) or sim.get("preco_medio", 0)
-    progresso_ate_meta = ((valor_atual - preco_medio) / (preco_final - preco_medio)) * 100 if (preco_final - preco_medio) else 0
-    if progresso_ate_meta < 0:
-        progresso_ate_meta *= 2  # Multiplica por 2 se o lucro for negativo
+    progresso_ate_meta = metricas["progresso_ate_meta"]
     ativos_progresso.append({"nome": nome, "progresso": progresso_ate_meta})
     max_progresso_abs = max(max_progresso_abs, abs(progresso_ate_meta))
 
@@ -5,9 +5,7 @@ import numpy as np
 from streamlit_javascript import st_javascript
 from firebase_admin import credentials, auth as admin_auth, db
 import firebase_admin
-from Screener.indicators import (
-    calcular_indicadores,
-    detectar_vcp,
+from Screener.core import (
     avaliar_risco,
     classificar_tendencia,
     gerar_comentario,
@@ -17,6 +15,11 @@ from Screener.indicators import (
     highlight_niveis,
     plot_ativo
 )
+from Screener.data import carregar_ticker
+from Screener.cache import obter_indicadores
+from Screener.metadata import obter_nome
+from Screener.scan import rating_rs, PRESET_PADRAO
+from Screener.benchmark import BENCHMARK_PADRAO, obter_benchmark_por_nome
 
 
 
@@ -66,19 +69,18 @@ ticker_manual = st.text_input("Digite o ticker (ex: AAPL)").upper()
 if st.button("🔎 Carregar") and ticker_manual:
     with st.spinner("Carregando..."):
         try:
-            df = yf.download(ticker_manual, period="18mo", interval="1d", progress=False)
-            if isinstance(df.columns, pd.MultiIndex):
-                df.columns = df.columns.droplevel(1)
+            df = carregar_ticker(ticker_manual)
 
             dias_breakout = 20
             threshold = 0.07
 
-            df = calcular_indicadores(df, dias_breakout, threshold)
-            vcp_detectado = detectar_vcp(df)
-            nome = yf.Ticker(ticker_manual).info.get("shortName", ticker_manual)
+            # Reaproveita o cálculo de outra página/scan para a mesma última barra
+            df = obter_indicadores(ticker_manual, df, dias_breakout, threshold)
+            vcp_detectado = bool(df['VCP'].iloc[-1])
+            nome = obter_nome(ticker_manual)
             risco = avaliar_risco(df)
             tendencia = classificar_tendencia(df['Close'].tail(20))
-            comentario = gerar_comentario(df, risco, tendencia, vcp_detectado)
+            comentario = gerar_comentario(df, tendencia, vcp_detectado)
             earnings_str, _, _ = get_earnings_info_detalhado(ticker_manual)
 
             st.subheader(f"{ticker_manual} - {nome}")
@@ -92,6 +94,13 @@ if st.button("🔎 Carregar") and ticker_manual:
                 st.markdown(comentario)
                 st.markdown(f"📅 Resultado: {earnings_str}")
                 st.markdown(f"📉 Risco: `{risco}`")
+                # Mesmo modo de RS do Screener; sem distribuição recente do universo, a tabela vs benchmark
+                benchmark = obter_benchmark_por_nome(st.session_state.get("benchmark_rs", BENCHMARK_PADRAO))
+                rs_val, modo_rs = rating_rs(df, st.session_state.get("modo_rs", PRESET_PADRAO["modo_rs"]), benchmark)
+                if not pd.isna(rs_val):
+                    st.markdown(f"💪 RS Rating (1 a 99, {modo_rs.lower()}): **{int(rs_val)}**")
+                else:
+                    st.markdown("💪 RS Rating: ❌ Não disponível")
 
                 preco = df["Close"].iloc[-1]
                 PP, suportes, resistencias = calcular_pivot_points(df)
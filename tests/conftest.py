@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Screener import rs
+
+
+def serie_sintetica(semente, barras=300, fim="2024-12-31"):
+    # OHLCV em passeio aleatório geométrico, determinístico pela semente
+    rng = np.random.default_rng(semente)
+    datas = pd.bdate_range(end=fim, periods=barras)
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, barras)))
+    abertura = close * (1 + rng.normal(0, 0.005, barras))
+    amplitude = np.abs(rng.normal(0, 0.015, barras)) * close
+    return pd.DataFrame({
+        "Open": abertura,
+        "High": np.maximum(abertura, close) + amplitude,
+        "Low": np.minimum(abertura, close) - amplitude,
+        "Close": close,
+        "Volume": rng.integers(300_000, 5_000_000, barras).astype(float),
+    }, index=pd.DatetimeIndex(datas, name="Date"))
+
+
+def com_barras_invalidas(df, semente):
+    # Candles doji (Open == Close) e Highs faltando, que limpar_ohlc descarta
+    df = df.copy()
+    rng = np.random.default_rng(semente)
+    posicoes = rng.choice(len(df), len(df) // 30, replace=False)
+    metade = len(posicoes) // 2
+    df.iloc[posicoes[:metade], df.columns.get_loc("Open")] = df["Close"].iloc[posicoes[:metade]].to_numpy()
+    df.iloc[posicoes[metade:], df.columns.get_loc("High")] = np.nan
+    return df
+
+
+# --- Implementações antigas (baseline), referência dos testes de equivalência ---
+def pine_linreg_polyfit(series, length):
+    def linreg_ultimo(x):
+        idx = np.arange(length)
+        slope, intercept = np.polyfit(idx, x, 1)
+        return intercept + slope * (length - 1)
+    return series.rolling(length).apply(linreg_ultimo, raw=True)
+
+
+def calcular_indicadores_antigo(df, length=20, momentum_threshold=0.07):
+    df = df.dropna(subset=["Open", "High", "Low", "Close"])
+    df = df[(df["High"] > df["Low"]) & (df["Open"] != df["Close"])].copy()
+    df["High20"] = df["High"].rolling(length).max().shift(1)
+    df["Low20"] = df["Low"].rolling(length).min()
+    df["SMA20"] = df["Close"].rolling(20).mean()
+    df["SMA50"] = df["Close"].rolling(50).mean()
+    df["SMA150"] = df["Close"].rolling(150).mean()
+    df["SMA200"] = df["Close"].rolling(200).mean()
+    df["EMA20"] = df["Close"].ewm(span=20, adjust=False).mean()
+    centro = ((df["High20"] + df["Low20"]) / 2 + df["Close"].rolling(length).mean()) / 2
+    df["linreg_close"] = pine_linreg_polyfit(df["Close"], length)
+    df["momentum"] = df["linreg_close"] - centro
+    df["momentum_up"] = (df["momentum"].shift(1) <= 0) & (df["momentum"] > momentum_threshold)
+    df["rompe_resistencia"] = df["Close"] > df["High20"]
+    df["suporte"] = df["Low"].rolling(length).min()
+    return df
+
+
+@pytest.fixture
+def distribuicoes_isoladas(tmp_path, monkeypatch):
+    # Distribuições de RS num diretório temporário, sem as do processo
+    monkeypatch.setattr(rs, "DIRETORIO_RS", str(tmp_path / "rs"))
+    monkeypatch.setattr(rs, "_distribuicoes", {})
+    return tmp_path / "rs"
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from Screener.bases import base_plana_atual, detectar_bases_planas
+from conftest import serie_sintetica
+
+
+def bases_planas_laco_antigo(high, low, min_candles=14, max_candles=90, amplitude_max=20):
+    # Laço aninhado do plot_ativo antigo, devolvendo posições em vez das datas
+    zonas = []
+    i = 0
+    while i < len(high) - min_candles:
+        j = i + min_candles
+        base_salva = None
+        while j < len(high) and (j - i) <= max_candles:
+            maxima, minima = high[i:j].max(), low[i:j].min()
+            if (maxima - minima) / maxima * 100 > amplitude_max:
+                break
+            if (j - i) >= min_candles:
+                base_salva = (i, j - 1, maxima, minima, j - i)
+            j += 1
+        if base_salva:
+            zonas.append(base_salva)
+            i = j
+        else:
+            i += 1
+    return zonas
+
+
+@pytest.mark.parametrize("semente", range(4))
+@pytest.mark.parametrize("amplitude_max", [8, 20])
+def test_bases_planas_iguais_ao_laco_antigo(semente, amplitude_max):
+    df = serie_sintetica(semente, barras=400)
+    high, low = df["High"].to_numpy(), df["Low"].to_numpy()
+    esperado = bases_planas_laco_antigo(high, low, amplitude_max=amplitude_max)
+    obtido = detectar_bases_planas(high, low, amplitude_max=amplitude_max)
+    assert esperado
+    assert [z[:2] + z[4:] for z in obtido] == [z[:2] + z[4:] for z in esperado]
+    np.testing.assert_allclose([z[2:4] for z in obtido], [z[2:4] for z in esperado])
+
+
+def test_base_plana_atual_e_a_maior_base_terminando_no_ultimo_candle():
+    df = serie_sintetica(3, barras=400)
+    high, low = df["High"].to_numpy(), df["Low"].to_numpy()
+    for fim in range(30, len(df), 17):
+        base = base_plana_atual(high[:fim], low[:fim])
+        duracoes = [
+            d for d in range(14, min(90, fim) + 1)
+            if (high[fim - d:fim].max() - low[fim - d:fim].min()) / high[fim - d:fim].max() * 100 <= 20
+        ]
+        assert (base["duracao"] if base else None) == (max(duracoes) if duracoes else None)
+
+
+def test_serie_curta_nao_tem_base():
+    assert detectar_bases_planas([10.0] * 10, [9.9] * 10) == []
+    assert base_plana_atual([10.0] * 10, [9.9] * 10) is None
@@ -0,0 +1,74 @@
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+from Screener import data
+
+
+@pytest.fixture
+def historico_isolado(tmp_path, monkeypatch):
+    monkeypatch.setattr(data, "DIRETORIO_HISTORICO", str(tmp_path / "ohlcv"))
+    monkeypatch.setattr(data, "_sem_dados_antes", {})
+    return tmp_path / "ohlcv"
+
+
+def _yahoo_falso(monkeypatch, historicos):
+    # baixar_lote que corta o histórico completo de cada ticker no period pedido
+    pedidos = []
+
+    def baixar_lote(tickers, period="18mo", **kwargs):
+        pedidos.append((tuple(tickers), period))
+        inicio = data._inicio_periodo(period)
+        return {t: historicos[t][historicos[t].index >= inicio] for t in tickers if t in historicos}
+    monkeypatch.setattr(data, "baixar_lote", baixar_lote)
+    return pedidos
+
+
+def _ohlcv(barras):
+    datas = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=barras)
+    return pd.DataFrame({c: np.arange(barras, dtype=float) + 1 for c in data.COLUNAS_OHLCV}, index=datas)
+
+
+def test_period_maior_estende_o_historico_salvo(historico_isolado, monkeypatch):
+    pedidos = _yahoo_falso(monkeypatch, {"ANTIGO": _ohlcv(800), "NOVO": _ohlcv(100)})
+
+    curto = data.carregar_historico(["ANTIGO", "NOVO"], period="6mo")
+    longo = data.carregar_historico(["ANTIGO", "NOVO"], period="2y")
+
+    assert len(longo["ANTIGO"]) > len(curto["ANTIGO"])
+    assert longo["ANTIGO"].index[0] <= data._inicio_periodo("2y") + data.FOLGA_INICIO_PERIODO
+    assert len(data._ler_historico("ANTIGO")[0]) == len(longo["ANTIGO"])
+    assert len(longo["NOVO"]) == 100
+
+    # Ativo novo: o Yahoo já disse que não há nada antes, não baixa de novo
+    total = len(pedidos)
+    data.carregar_historico(["ANTIGO", "NOVO"], period="2y")
+    assert len(pedidos) == total
+
+
+def test_gravacoes_concorrentes_do_mesmo_ticker(historico_isolado):
+    df = _ohlcv(300)
+    erros = []
+
+    def gravar():
+        try:
+            for _ in range(20):
+                data._gravar_historico("AAA", df)
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=gravar) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not erros
+    pd.testing.assert_frame_equal(data._ler_historico("AAA")[0], df, check_freq=False)
+
+
+def test_falha_ao_gravar_nao_derruba_a_carga(historico_isolado, monkeypatch, capsys):
+    _yahoo_falso(monkeypatch, {"AAA": _ohlcv(300)})
+    monkeypatch.setattr(data.os, "replace", lambda *a: (_ for _ in ()).throw(OSError("disco cheio")))
+    resultado = data.carregar_historico(["AAA"], period="6mo")
+    assert not resultado["AAA"].empty
+    assert "disco cheio" in capsys.readouterr().out
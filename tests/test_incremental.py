@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Screener.colunas import COLUNAS_INDICADORES, garantir_colunas, limpar_ohlc
+from Screener.incremental import EstadoIndicadores
+from conftest import serie_sintetica
+
+
+@pytest.mark.parametrize("length", [5, 20, 60])
+def test_estado_incremental_igual_ao_recalculo(length):
+    df = serie_sintetica(length, barras=500)
+    colunas = ["Open", "High", "Low", "Close"] + COLUNAS_INDICADORES
+    esperado = garantir_colunas(limpar_ohlc(df), COLUNAS_INDICADORES, length, 0.07)
+
+    estado = EstadoIndicadores.a_partir_de(df.iloc[:300], length)
+    linhas = [estado.linha_atual()]
+    for data, barra in df.iloc[300:].iterrows():
+        barra = barra.to_dict()
+        # Cotação parcial do pregão antes da barra final do dia
+        parcial = barra["Close"] * 1.01
+        estado.atualizar(data, {**barra, "Close": parcial, "High": max(barra["High"], parcial)})
+        linha = estado.atualizar(data, barra)
+        if linha is not None:
+            linhas.append(linha)
+
+    obtido = pd.DataFrame(linhas)[colunas]
+    esperado = esperado[esperado.index >= df.index[299]][colunas]
+    assert len(obtido) == len(esperado)
+    for coluna in colunas:
+        np.testing.assert_allclose(obtido[coluna].to_numpy(dtype=float), esperado[coluna].to_numpy(dtype=float),
+                                   rtol=1e-9, atol=1e-9, err_msg=coluna)
+
+
+def test_estado_incremental_rejeita_length_menor_que_2():
+    with pytest.raises(ValueError):
+        EstadoIndicadores(length=1)
+
+
+def test_estado_incremental_descarta_barra_invalida():
+    df = serie_sintetica(7, barras=120)
+    estado = EstadoIndicadores.a_partir_de(df, 20)
+    data = df.index[-1] + pd.offsets.BDay(1)
+    # Doji (abertura igual ao fechamento) é descartado, como em limpar_ohlc
+    assert estado.atualizar(data, {"Open": 10.0, "High": 11.0, "Low": 9.0, "Close": 10.0, "Volume": 1e6}) is None
+    assert estado.linha_atual() is None
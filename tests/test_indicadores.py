@@ -0,0 +1,11 @@
+import pandas as pd
+from Screener.core import calcular_indicadores
+from conftest import calcular_indicadores_antigo, com_barras_invalidas, serie_sintetica
+
+
+def test_calcular_indicadores_igual_ao_antigo():
+    for semente in range(3):
+        df = com_barras_invalidas(serie_sintetica(semente, barras=400), semente)
+        esperado = calcular_indicadores_antigo(df)
+        obtido = calcular_indicadores(df)
+        pd.testing.assert_frame_equal(obtido[esperado.columns], esperado, check_dtype=False, rtol=1e-9)
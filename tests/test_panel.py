@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+from Screener.colunas import COLUNAS_INDICADORES, garantir_colunas
+from Screener.panel import alinhar_painel, calcular_indicadores_painel, montar_painel, visao_ticker
+from conftest import calcular_indicadores_antigo, com_barras_invalidas, serie_sintetica
+
+
+def test_visao_ticker_igual_ao_calculo_por_ticker():
+    # Históricos de tamanhos diferentes, alinhados pelo fim no painel
+    rng = np.random.default_rng(0)
+    dados = {
+        f"T{i}": com_barras_invalidas(serie_sintetica(i, barras=int(rng.integers(20, 400))), i)
+        for i in range(40)
+    }
+    resultado = calcular_indicadores_painel(montar_painel(dados))
+    for ticker, df in dados.items():
+        esperado = calcular_indicadores_antigo(df)
+        obtido = visao_ticker(resultado, ticker)
+        pd.testing.assert_frame_equal(obtido[esperado.columns], esperado, check_dtype=False, check_freq=False,
+                                      rtol=1e-9)
+
+
+def test_painel_alinhado_igual_ao_calculo_por_ticker():
+    dados = {f"T{i}": serie_sintetica(i, barras=250 + 10 * i) for i in range(10)}
+    painel = garantir_colunas(alinhar_painel(montar_painel(dados)), COLUNAS_INDICADORES)
+    for ticker, df in dados.items():
+        esperado = calcular_indicadores_antigo(df)
+        obtido = visao_ticker(painel, ticker)
+        pd.testing.assert_frame_equal(obtido[esperado.columns], esperado, check_dtype=False, check_freq=False,
+                                      check_names=False, rtol=1e-9)
+
+
+def test_montar_painel_alinha_tickers_pelo_fim():
+    dados = {"CURTO": serie_sintetica(1, barras=30), "LONGO": serie_sintetica(2, barras=90)}
+    painel = montar_painel(dados)
+    for ticker, df in dados.items():
+        fechamentos = painel["Close"][ticker].to_numpy()
+        validos = fechamentos[~np.isnan(fechamentos)]
+        np.testing.assert_array_equal(validos, df["Close"].to_numpy())
+        # A última barra de cada ticker fica na última linha do painel
+        assert fechamentos[-1] == df["Close"].iloc[-1]
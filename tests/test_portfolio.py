@@ -0,0 +1,141 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from Screener.portfolio import (
+    COLUNAS_PLANO, STOP_PADRAO_PCT, agregados_carteira, aplicar_compra_real, formatar_plano, montar_carteira,
+    montar_plano, plano_numerico, plano_para_registro, recalcular_plano,
+)
+
+COTACAO, PL = 28.87, 100000.0
+ETAPAS = [
+    {"nome": "COMPRA INICIAL", "subida_pct": 0.0, "pct_pl": 8.0, "stop_pct": 8.0},
+    {"nome": "COMPRA 2", "subida_pct": 4.0, "pct_pl": 6.0, "stop_pct": 8.0},
+    {"nome": "COMPRA 3", "subida_pct": 10.0, "pct_pl": 60.0, "stop_pct": 10.0},
+]
+
+
+def plano_texto_antigo(cotacao, pl_total, etapas):
+    # Linhas de texto como a página da Carteira gravava antes do modelo numérico
+    linhas = []
+    for i, etapa in enumerate(etapas):
+        preco = cotacao * (1 + etapa["subida_pct"] / 100)
+        valor = pl_total * etapa["pct_pl"] / 100
+        unidades = int(valor / preco)
+        stop = preco * (1 - etapa["stop_pct"] / 100)
+        risco = (preco - stop) * unidades
+        linhas.append([
+            etapa["nome"], f"${preco:.2f}", f"{etapa['subida_pct']:.2f}%" if i > 0 else "Compra Inicial",
+            f"${valor:,.2f}", f"{etapa['pct_pl']:.2f}%", f"{unidades} UN", f"{etapa['stop_pct']:.2f}%",
+            f"$ {stop:.2f}", f"{-risco / pl_total * 100:.2f}% PL", f"$ {-risco:.2f}",
+        ])
+    return pd.DataFrame(linhas, columns=COLUNAS_PLANO)
+
+
+@pytest.mark.parametrize("orient", ["dict", "list"])
+def test_plano_numerico_le_planos_antigos_em_texto(orient):
+    antigo = plano_texto_antigo(COTACAO, PL, ETAPAS)
+    plano = plano_numerico(antigo.to_dict(orient=orient))
+
+    assert plano["ADD"].dtype == float
+    assert np.isnan(plano.at[0, "% PARA COMPRA"])
+    assert plano["QTD"].tolist() == [277.0, 199.0, 1889.0]
+    assert plano["STOP"].tolist() == [8.0, 8.0, 10.0]
+    assert plano.at[2, "COMPRA PL"] == 60000.0
+    assert plano["$ RISCO"].tolist() == [float(v[2:]) for v in antigo["$ RISCO"]]
+    assert plano["ACUM. RISCO"].isna().all()
+
+
+def test_plano_novo_formata_igual_ao_texto_antigo():
+    antigo = plano_texto_antigo(COTACAO, PL, ETAPAS)
+    plano = montar_plano(COTACAO, PL, ETAPAS)
+    assert (formatar_plano(plano)[COLUNAS_PLANO].values == antigo.values).all()
+
+    # Ida e volta pelo registro do Firebase
+    registro = plano_para_registro(plano)
+    json.dumps(registro)
+    assert (formatar_plano(plano_numerico(registro))[COLUNAS_PLANO].values == antigo.values).all()
+
+
+def test_registro_preenche_stop_ausente_com_o_padrao():
+    plano = recalcular_plano(montar_plano(COTACAO, PL, ETAPAS).assign(STOP=[8.0, np.nan, 10.0]), PL)
+    registro = plano_numerico(plano_para_registro(plano))
+    assert registro.at[1, "STOP"] == STOP_PADRAO_PCT
+    assert registro.at[1, "$ STOP"] == pytest.approx(registro.at[1, "ADD"] * (1 - STOP_PADRAO_PCT / 100), rel=1e-6)
+    assert registro.at[1, "$ RISCO"] < 0
+    # Na carga, o recálculo dá à etapa o mesmo risco de um stop de 8% explícito
+    explicito = recalcular_plano(montar_plano(COTACAO, PL, ETAPAS).assign(STOP=[8.0, 8.0, 10.0]), PL)
+    np.testing.assert_allclose(recalcular_plano(registro, PL)["RISCO"], explicito["RISCO"], rtol=1e-6)
+
+
+def test_agregados_iguais_ao_laco_antigo():
+    antigo = plano_texto_antigo(COTACAO, PL, ETAPAS)
+    plano_b = aplicar_compra_real(montar_plano(COTACAO, PL, ETAPAS), "COMPRA 2", 30.5, 200, PL / 2, COTACAO)
+    simulacoes = [
+        {"nome": "A", "pl_total": PL, "lucro": 500.0, "tabela": antigo.to_dict(orient="list"),
+         "compras_reais": [{"etapa": "Inicial", "preco": 28.87, "qtd": 277}]},
+        {"nome": "B", "pl_total": PL / 2, "lucro": 200.0, "tabela": plano_para_registro(plano_b),
+         "compras_reais": [{"etapa": "Inicial", "preco": 28.87, "qtd": 277}, {"etapa": "2", "preco": 30.5, "qtd": 200}]},
+    ]
+
+    risco_compras = risco_operacao = exposicao = 0.0
+    for sim in simulacoes:
+        tabela = formatar_plano(plano_numerico(sim["tabela"]))
+        for compra in sim["compras_reais"]:
+            etapa = f"COMPRA {compra['etapa']}" if compra["etapa"] in ["2", "3"] else "COMPRA INICIAL"
+            linha = tabela[tabela["Etapa"] == etapa + " - Real"]
+            if linha.empty:
+                linha = tabela[tabela["Etapa"] == etapa]
+            stop = float(linha["STOP"].iloc[0].replace("%", ""))
+            risco_compras += compra["preco"] * stop / 100 * compra["qtd"]
+            exposicao += compra["preco"] * compra["qtd"] / sim["pl_total"] * 100
+        for _, linha in tabela.iterrows():
+            risco_operacao += (float(linha["ADD"].replace("$", "").replace(",", "")) * float(linha["STOP"][:-1]) / 100
+                               * float(linha["QTD"][:-3]))
+
+    agregados = agregados_carteira(montar_carteira(simulacoes))
+    assert agregados["risco_compras_reais"] == pytest.approx(risco_compras, rel=1e-9)
+    assert agregados["risco_operacao"] == pytest.approx(risco_operacao, rel=1e-4)
+    assert agregados["pct_pl_executado"] == pytest.approx(exposicao, rel=1e-9)
+    assert agregados["lucro_estimado_total"] == 700.0
+
+
+def test_plano_numerico_le_numeros_em_texto_e_formatos_antigos():
+    tabela = {
+        "Etapa": ["COMPRA INICIAL", "COMPRA 2", "COMPRA 3"],
+        "ADD": ["1e-05", "R$ 1.234,56", "$1,234.56"],
+        "STOP": ["8", "8.00%", None],
+        "$ RISCO": ["-1.5e+03", "$ -12.30", "-0.80% PL"],
+    }
+    plano = plano_numerico(tabela)
+    assert plano["ADD"].tolist() == [1e-05, 1234.56, 1234.56]
+    assert plano["STOP"].tolist()[:2] == [8.0, 8.0] and np.isnan(plano.at[2, "STOP"])
+    assert plano["$ RISCO"].tolist() == [-1500.0, -12.3, -0.8]
+
+
+def test_compra_real_substitui_a_linha_planejada():
+    plano = montar_plano(COTACAO, PL, ETAPAS)
+    real = aplicar_compra_real(plano, "COMPRA 2", 30.5, 200, PL, COTACAO)
+
+    assert real.at[1, "Etapa"] == "COMPRA 2 - Real"
+    assert real.at[1, "QTD"] == 200.0
+    assert real.at[1, "COMPRA PL"] == 30.5 * 200
+    assert real.at[1, "$ STOP"] == pytest.approx(30.5 * 0.92)
+    assert real.at[1, "% PARA COMPRA"] == pytest.approx((30.5 / COTACAO - 1) * 100)
+    # As outras etapas não mudam e o plano original fica intacto
+    pd.testing.assert_frame_equal(real.drop(index=1), plano.drop(index=1))
+    assert plano.at[1, "Etapa"] == "COMPRA 2"
+
+    mantido = aplicar_compra_real(plano, "COMPRA 2", 30.5, 200, PL, COTACAO, atualizar_stop=False)
+    assert mantido.at[1, "$ STOP"] == plano.at[1, "$ STOP"]
+    # Etapa inexistente devolve o plano sem alteração
+    pd.testing.assert_frame_equal(aplicar_compra_real(plano, "COMPRA 9", 30.5, 200, PL, COTACAO), plano)
+
+
+def test_recalcular_plano_acumula_o_risco():
+    plano = montar_plano(COTACAO, PL, ETAPAS)
+    risco = (plano["ADD"] - plano["ADD"] * (1 - plano["STOP"] / 100)) * plano["QTD"]
+    np.testing.assert_allclose(plano["$ RISCO"], -risco)
+    np.testing.assert_allclose(plano["ACUM. RISCO"], -risco.cumsum() / PL * 100)
+    # Sem PL o risco percentual é zero, sem divisão por zero
+    assert (recalcular_plano(plano, 0)["RISCO"] == 0).all()
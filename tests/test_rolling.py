@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Screener.rolling import pine_linreg
+from conftest import pine_linreg_polyfit, serie_sintetica
+
+
+@pytest.mark.parametrize("length", [2, 5, 20, 60])
+def test_pine_linreg_igual_ao_polyfit(length):
+    close = serie_sintetica(length, barras=400)["Close"]
+    close.iloc[[30, 31, 200]] = np.nan
+    pd.testing.assert_series_equal(pine_linreg(close, length), pine_linreg_polyfit(close, length),
+                                   check_names=False, rtol=1e-9)
+
+
+def test_pine_linreg_sem_barras_suficientes():
+    close = pd.Series([1.0, 2.0, 3.0])
+    assert pine_linreg(close, 5).isna().all()
+    # Reta perfeita: o valor no fim da janela é o próprio último ponto
+    reta = pd.Series(np.arange(30, dtype=float) * 2 + 1)
+    np.testing.assert_allclose(pine_linreg(reta, 10).iloc[9:], reta.iloc[9:], rtol=1e-9)
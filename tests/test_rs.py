@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+from Screener import scan
+from Screener.panel import alinhar_painel, montar_painel
+from Screener.rs import (
+    obter_distribuicao, rating_por_distribuicao, ratings_percentil, registrar_distribuicao, score_rs, scores_rs_painel,
+)
+from Screener.snapshot import calcular_snapshot
+from conftest import serie_sintetica
+
+
+def test_scan_com_e_sem_snapshot_dao_o_mesmo_rating(distribuicoes_isoladas, monkeypatch):
+    dados = {f"T{i:03d}": serie_sintetica(i) for i in range(320)}
+    monkeypatch.setattr(scan, "carregar_historico", lambda tickers: {t: dados[t] for t in tickers if t in dados})
+
+    # Job do snapshot: tabela do universo completo e distribuição do dia
+    tabela = calcular_snapshot(alinhar_painel(montar_painel(dados)))
+    data_pregao = tabela["Data"].max().strftime("%Y-%m-%d")
+    assert registrar_distribuicao(data_pregao, tabela["RS Score"])
+    distribuicao_dia = obter_distribuicao(data_pregao).copy()
+    snapshot = {"data_pregao": data_pregao, "tabela": tabela}
+
+    # Scan com filtros do Finviz: só uma parte do universo
+    filtrados = list(dados)[::7]
+    _, com_snapshot, _, _ = scan.preparar_universo(filtrados, [], snapshot=snapshot)
+    _, sem_snapshot, _, _ = scan.preparar_universo(filtrados, [], snapshot=None)
+
+    assert set(com_snapshot) == set(filtrados)
+    assert com_snapshot == sem_snapshot
+    assert com_snapshot == tabela["RS Percentil"].reindex(filtrados).astype(int).to_dict()
+    # O scan filtrado não substitui a distribuição do universo completo
+    np.testing.assert_array_equal(obter_distribuicao(data_pregao), distribuicao_dia)
+
+
+def test_scan_do_universo_completo_registra_a_distribuicao(distribuicoes_isoladas, monkeypatch):
+    dados = {f"T{i:03d}": serie_sintetica(i) for i in range(320)}
+    monkeypatch.setattr(scan, "carregar_historico", lambda tickers: {t: dados[t] for t in tickers if t in dados})
+
+    _, ratings, _, _ = scan.preparar_universo(list(dados)[:50], [], snapshot=None)
+    assert obter_distribuicao() is None
+    assert len(ratings) == 50
+
+    scan.preparar_universo(list(dados), [], snapshot=None, universo_completo=True)
+    assert len(obter_distribuicao()) == len(dados)
+
+
+def test_ratings_percentil_pela_fracao_de_scores_menores_ou_iguais():
+    rng = np.random.default_rng(0)
+    scores = pd.Series(rng.normal(1.0, 0.2, 500), index=[f"T{i}" for i in range(500)])
+    scores.iloc[[3, 7]] = np.nan
+    scores.iloc[10:20] = scores.iloc[9]  # empates ficam com o mesmo rating
+
+    ratings = ratings_percentil(scores)
+
+    validos = scores.dropna()
+    esperado = {t: int(np.clip(np.round((validos <= v).mean() * 99), 1, 99)) for t, v in validos.items()}
+    assert ratings.to_dict() == esperado
+    assert ratings[validos.idxmax()] == 99 and ratings[validos.idxmin()] == 1
+    assert ratings_percentil(pd.Series(dtype=float)).empty
+
+
+def test_scores_do_painel_iguais_ao_score_por_ticker():
+    dados = {f"T{i}": serie_sintetica(i, barras=200 + 30 * i) for i in range(6)}
+    scores = scores_rs_painel(alinhar_painel(montar_painel(dados)))
+    for ticker, df in dados.items():
+        esperado = score_rs(df["Close"])
+        if np.isnan(esperado):
+            assert np.isnan(scores[ticker])
+        else:
+            assert scores[ticker] == pytest.approx(esperado, rel=1e-12)
+
+
+def test_rating_rs_so_usa_distribuicao_recente(distribuicoes_isoladas):
+    df = serie_sintetica(1, fim="2024-12-31")
+    benchmark = {"rs_ref": 1.0}
+    scores = pd.Series(np.linspace(0.5, 2.0, 400))
+    assert registrar_distribuicao("2024-12-31", scores)
+
+    rating, modo = scan.rating_rs(df, "Percentil do universo", benchmark)
+    assert modo == "Percentil do universo"
+    assert rating == rating_por_distribuicao(score_rs(df["Close"]), "2024-12-31")
+
+    # Distribuição de dias antes: não vale para o pregão do ticker, cai na tabela
+    antigo = serie_sintetica(1, fim="2025-01-10")
+    assert rating_por_distribuicao(score_rs(antigo["Close"]), "2025-01-10") is None
+    rating, modo = scan.rating_rs(antigo, "Percentil do universo", benchmark)
+    assert modo == "Tabela vs benchmark"
+    assert rating == scan.calcular_rs_rating(antigo, rs_ref=1.0)
+
+    assert scan.rating_rs(df, "Tabela vs benchmark", None)[1] == "Tabela vs benchmark"
+    assert scan.rating_rs(df, "Percentil do universo", None, {"X": 70}, "X") == (70, "Percentil do universo")
@@ -0,0 +1,35 @@
+import warnings
+import numpy as np
+import pandas as pd
+import pytest
+from Screener.core import detectar_vcp
+from Screener.vcp import sinal_vcp, vcp_recente
+from conftest import serie_sintetica
+
+
+@pytest.mark.parametrize("semente", range(3))
+def test_sinal_vcp_igual_ao_detectar_vcp_em_cada_prefixo(semente):
+    df = serie_sintetica(semente, barras=300)
+    with warnings.catch_warnings():
+        # detectar_vcp fatia as Series por posição ([-40:-20])
+        warnings.simplefilter("ignore", FutureWarning)
+        esperado = np.array([detectar_vcp(df.iloc[:k]) for k in range(1, len(df) + 1)])
+    np.testing.assert_array_equal(sinal_vcp(df).to_numpy(), esperado)
+
+
+def test_sinal_vcp_no_painel_igual_por_ticker():
+    dados = {f"T{i}": serie_sintetica(i, barras=300) for i in range(3)}
+    painel = {campo: pd.DataFrame({t: df[campo] for t, df in dados.items()})
+              for campo in ["Open", "High", "Low", "Close", "Volume"]}
+    sinal = sinal_vcp(painel)
+    for ticker, df in dados.items():
+        np.testing.assert_array_equal(sinal[ticker].to_numpy(), sinal_vcp(df).to_numpy())
+
+
+def test_vcp_recente_olha_as_ultimas_barras():
+    df = serie_sintetica(1, barras=300)
+    sinal = sinal_vcp(df).to_numpy()
+    for candles in (1, 20, 60, 300):
+        assert vcp_recente(df, candles) == sinal[-candles:].any()
+    # Sem volume não há VCP
+    assert not sinal_vcp(df.drop(columns="Volume")).any()